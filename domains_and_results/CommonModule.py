@@ -1,7 +1,13 @@
 from copy import deepcopy, copy
 from typing import Any, Dict, List
 from enum import Enum
+import itertools
+import contextvars
+import contextlib
 import sys
+import types
+import dis
+import builtins
 
 ###############
 ## CONSTANTS ##
@@ -35,11 +41,24 @@ path = "/home/sshekhar/Desktop/HATPEHDA-concurrent/domains_and_results/"
 ## CLASSES ##
 #############
 ## Task ##
+def set_slots_state(obj, state):
+    """
+    __setstate__ of the classes with __slots__, objects pickled before they had slots give their __dict__
+    (fields which don't exist anymore are dropped)
+    """
+    if isinstance(state, tuple):
+        state = state[1]
+    if state != None:
+        cls = type(obj)
+        for name, value in state.items():
+            if hasattr(cls, name):
+                setattr(obj, name, value)
+
 class Task:
-    __ID = 0
+    # subclasses only add methods, the same layout allows Action.cast_PT2A to change __class__
+    __slots__ = ("id", "name", "parameters", "agent", "method_number", "is_abstract", "cost", "shared_resource")
     def __init__(self, name: str, parameters: list, is_abstract: bool, why, method_number: int, agent: str):
-        self.id = Task.__ID
-        Task.__ID += 1
+        self.id = get_context().new_task_id()
         self.name = name
         self.parameters = parameters
         self.agent = agent
@@ -52,12 +71,12 @@ class Task:
 
         # self.previous = None
         # self.next = []
-        self.current_plan_cost = -1.0
+
+    __setstate__ = set_slots_state
 
     def assign_next_id(self):
-        self.id = Task.__ID
-        Task.__ID += 1
-    
+        self.id = get_context().new_task_id()
+
     def __repr__(self):
         abs_str = "A" if self.is_abstract else "P"
         return "{}-{}{}-{}{}".format(self.id, self.agent, abs_str, self.name, self.parameters)
@@ -66,6 +85,7 @@ class Task:
         print(self)
 
 class AbstractTask(Task):
+    __slots__ = ()
     def __init__(self, name: str, parameters: list, why, method_number: int, agent: str):
         super().__init__(name, parameters, True, why, method_number, agent)
 
@@ -84,31 +104,67 @@ class RulesForSA:
     def is_rule_antecedent_applicable(self, rule_antecedent_consequent, w_state_to_keep):
         return self.rule_antecedent_consequent(rule_antecedent_consequent, w_state_to_keep)
 
+class ObservabilityRule:
+    """
+    {antecedent} => consequent: entries of a fluent that H observes in the designated state, see declare_observability_rules()
+    fluent: name of the observed fluent
+    keys: observed keys of the fluent, None for all of them (or for the whole value of a fluent which isn't a dict),
+        or function(state) returning the observed keys (e.g. the transparent boxes)
+    sub_keys: path of the observed value under each key, e.g. ("at_table",) for state.cube_at_table[cube]["at_table"]
+    antecedent: function(state), the rule applies only if it's true in the designated state (None for always)
+    copresence: the rule applies only if H and R are in the same context
+    """
+    def __init__(self, fluent, keys=None, sub_keys=(), antecedent=None, copresence=True):
+        self.fluent = fluent
+        self.keys = keys
+        self.sub_keys = tuple(sub_keys)
+        self.antecedent = antecedent
+        self.copresence = copresence
+
+    def is_applicable(self, state, copresent):
+        return (copresent or not self.copresence) and (self.antecedent == None or self.antecedent(state))
+
+    def get_paths(self, state):
+        """ Index paths (fluent, key, *sub_keys) of the entries observed in the designated state """
+        if self.keys == None:
+            data = state.read_fluent(self.fluent)
+            if not isinstance(data, dict):
+                return [(self.fluent,)]
+            keys = list(dict.keys(data))
+        elif callable(self.keys):
+            keys = self.keys(state)
+        else:
+            keys = self.keys
+        return [(self.fluent, key) + self.sub_keys for key in keys]
+
 class Method:
-    def __init__(self, AT_name, done_cond=None, pre_cond=None, decomp=None, multi_decomp=None, get_precond=None):
+    def __init__(self, AT_name, done_cond=None, pre_cond=None, decomp=None, multi_decomp=None, get_precond=None, reads=None, subtasks=None):
         self.AT_name = AT_name
         self.done_cond = done_cond
         self.pre_cond = pre_cond
         self.decomp = decomp
         self.multi_decomp = multi_decomp
         self.get_precond = get_precond
+        self.reads = reads          # fluents used by the functions above, see get_relevant_fluents()
+        self.subtasks = subtasks    # names of the tasks the decompositions can give
 
     def get_m_precond(self, state, AT):
-        return self.get_precond(state, AT.agent, *AT.parameters) if self.get_precond!=None else None
+        return self.get_precond(get_state_view(state), AT.agent, *AT.parameters) if self.get_precond!=None else None
 
     def is_done(self, state, AT):
-        return self.done_cond(state, AT.agent, *AT.parameters) if self.done_cond!=None else False
+        return self.done_cond(get_state_view(state), AT.agent, *AT.parameters) if self.done_cond!=None else False
 
     def is_applicable(self, state, AT):
-        return self.pre_cond(state, AT.agent, *AT.parameters) if self.pre_cond!=None else True
+        return self.pre_cond(get_state_view(state), AT.agent, *AT.parameters) if self.pre_cond!=None else True
     
     def get_decomp(self, state, AT):
         if self.multi_decomp==None:
-            return [self.decomp(state, AT.agent, *AT.parameters)] if self.decomp!=None else [[]]
+            return [self.decomp(get_state_view(state), AT.agent, *AT.parameters)] if self.decomp!=None else [[]]
         else:
-            return self.multi_decomp(state, AT.agent, *AT.parameters)
+            return self.multi_decomp(get_state_view(state), AT.agent, *AT.parameters)
             
 class PrimitiveTask(Task):
+    __slots__ = ()
     def __init__(self, name: str, parameters: list, why, method_number: int, agent: str) -> None:
         super().__init__(name, parameters, False, why, method_number, agent)
     
@@ -116,7 +172,7 @@ class PrimitiveTask(Task):
         return "{}-{}PT-{}{}".format(self.id, self.agent, self.name, self.parameters)
 
 class Operator:
-    def __init__(self, PT_name, done_cond=None, pre_cond=None, effects=None, cost_function=None, shared_resource=None, get_effect=None):
+    def __init__(self, PT_name, done_cond=None, pre_cond=None, effects=None, cost_function=None, shared_resource=None, get_effect=None, reads=None):
         self.PT_name = PT_name
         self.done_cond = done_cond
         self.pre_cond = pre_cond
@@ -124,21 +180,22 @@ class Operator:
         self.cost_function = cost_function
         self.shared_resource = shared_resource
         self.get_effect = get_effect
+        self.reads = reads          # fluents used by the functions above, see get_relevant_fluents()
 
     def get_comm_act_effect(self, state, PT):
-        return self.get_effect(state, PT.agent, *PT.parameters) if self.get_effect!=None else None
+        return self.get_effect(get_state_view(state), PT.agent, *PT.parameters) if self.get_effect!=None else None
     
     def is_done(self, state, PT):
-        return self.done_cond(state, PT.agent, *PT.parameters) if self.done_cond!=None else False
+        return self.done_cond(get_state_view(state), PT.agent, *PT.parameters) if self.done_cond!=None else False
 
     def get_shared_resource(self, state, PT):
-        return self.shared_resource(state, PT.agent, *PT.parameters) if self.shared_resource!=None else None
+        return self.shared_resource(get_state_view(state), PT.agent, *PT.parameters) if self.shared_resource!=None else None
 
     def is_applicable(self, state, PT):
-        return self.pre_cond(state, PT.agent, *PT.parameters) if self.pre_cond!=None else True
+        return self.pre_cond(get_state_view(state), PT.agent, *PT.parameters) if self.pre_cond!=None else True
 
     def get_cost(self, state, PT):
-        return self.cost_function(state, PT.agent, *PT.parameters) if self.cost_function!=None else DEFAULT_ACTION_COST
+        return self.cost_function(get_state_view(state), PT.agent, *PT.parameters) if self.cost_function!=None else DEFAULT_ACTION_COST
 
     def apply_effects(self, state, agent: str, parameters):
         if self.effects!=None:
@@ -160,41 +217,17 @@ class Operator:
         # moreover, the agent must also be able to verify the above conditions in the world states it cannot distingusih with
         # take this out and write it in some other file
         # this check should not be part of the operator itself
-        check_done_cond = True
-        check_applicable_cond = True
-        for possible_world in selected_pair.possible_worlds_for_h:
-            possible_world_state = possible_world.state
-            # Check done-condition and pre-condition
-            if not self.is_done(possible_world_state, PT):
-                # print(bcolors.WARNING + " already done!" + bcolors.ENDC)
-                # return OpType.DONE
-                check_done_cond = False
-                break
-        for possible_world in selected_pair.possible_worlds_for_h:
-            possible_world_state = possible_world.state
-            if not self.is_applicable(possible_world_state, PT):
-                # print(bcolors.WARNING + " not applicable!" + bcolors.ENDC)
-                # return OpType.NOT_APPLICABLE
-                check_applicable_cond = False
-                break
-        
         # shashank - it is a quick fix (need to do it in a better way)
-        if PT.agent == "H" and check_done_cond and self.is_done(state, PT):
-        # if self.is_done(state, PT):
-            print(bcolors.WARNING + " already done!" + bcolors.ENDC)
-            return OpType.DONE
-        if PT.agent == "H" and (not check_applicable_cond or not self.is_applicable(state, PT)):
-        # if not self.is_applicable(state, PT):
-            print(bcolors.WARNING + " not applicable!" + bcolors.ENDC)
-            return OpType.NOT_APPLICABLE
-        
-        # shashank - it is a quick fix (need to do it in a better way)
-        # if check_done_cond and self.is_done(state, PT):
-        if PT.agent == "R" and self.is_done(state, PT):
+        # the conditions are evaluated once in the designated state and, for H, in each possible world
+        states = [state]
+        if PT.agent == "H":
+            states += [possible_world.state for possible_world in selected_pair.possible_worlds_for_h]
+        done, applicable = evaluate_conditions(self, states, PT)
+
+        if all(done):
             print(bcolors.WARNING + " already done!" + bcolors.ENDC)
             return OpType.DONE
-        # if not check_applicable_cond or not self.is_applicable(state, PT):
-        if PT.agent == "R" and not self.is_applicable(state, PT):
+        if not all(applicable):
             print(bcolors.WARNING + " not applicable!" + bcolors.ENDC)
             return OpType.NOT_APPLICABLE
 
@@ -223,7 +256,7 @@ class Operator:
         selected_pair_rem_worlds = []
         if("communicate" in PT.name):
             for world in selected_pair.possible_worlds_for_h:
-                if (self.get_effect(world.state, PT.agent, *PT.parameters) == self.get_effect(state, PT.agent, *PT.parameters)):
+                if (self.get_effect(get_state_view(world.state), PT.agent, *PT.parameters) == self.get_effect(get_state_view(state), PT.agent, *PT.parameters)):
                     selected_pair_rem_worlds.append(world)
 
             selected_pair.possible_worlds_for_h = selected_pair_rem_worlds
@@ -233,6 +266,7 @@ class Operator:
         return cost, shared_resource
 
 class Action(PrimitiveTask):
+    __slots__ = ()
     def __init__(self):
         self.cost = 0.0
         self.shared_resource = ""
@@ -288,9 +322,11 @@ class Action(PrimitiveTask):
         return "{}-{}A-{}{}".format(self.id, self.agent, self.name, self.parameters)
 
 class Trigger:
-    def __init__(self, pre_cond, decomp):
+    def __init__(self, pre_cond, decomp, reads=None, subtasks=None):
         self.pre_cond = pre_cond
         self.decomp = decomp
+        self.reads = reads          # see Method
+        self.subtasks = subtasks
 
 ## State ##
 class Fluent:
@@ -298,7 +334,196 @@ class Fluent:
         self.name = name
         self.is_dyn = is_dyn
 
+IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+def get_owned_copy(value):
+    """
+    Copy of a fluent value which can be changed without changing the shared one.
+    Dicts are copied one level at a time (see CowDict), other values which can be changed are deep-copied.
+    """
+    if type(value) in IMMUTABLE_TYPES:
+        return value
+    if type(value) is dict or type(value) is CowDict:
+        return CowDict(dict.items(value))
+    return deepcopy(value)
+
+class CowDict(dict):
+    """
+    Copy-on-write dict of a dynamic fluent. Its values may be shared with other states, they are copied
+    (get_owned_copy()) the first time they are accessed, and are then owned (their key is in owned).
+    Thus only the accessed path is copied and state.fluent[key][subkey] = v only changes this state.
+    peek() and dict.items() and the like give the values without copying them, to read only (see FluentView).
+    """
+    __slots__ = ("owned",)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owned = set()
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) in IMMUTABLE_TYPES or key in self.owned:
+            return value
+        value = get_owned_copy(value)
+        dict.__setitem__(self, key, value)
+        self.owned.add(key)
+        return value
+
+    def peek(self, key):
+        """ Value of the key without copying it, to read only """
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.owned.add(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.owned.discard(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        if len(self) == 0:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(dict.keys(self)))
+        return key, self.pop(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def values(self):
+        return [self[key] for key in dict.keys(self)]
+
+    def items(self):
+        return [(key, self[key]) for key in dict.keys(self)]
+
+    def copy(self):
+        return CowDict(dict.items(self))
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __reduce__(self):
+        return (CowDict, (dict(dict.items(self)),))
+
+def get_cow_copy(value):
+    """
+    Copy of a fluent value owned by a state, to be shared by a copy of this state: the parts the state still shares
+    (see CowDict) are shared, the ones it owns are copied and then shared too. The value itself isn't changed.
+    """
+    if type(value) in IMMUTABLE_TYPES:
+        return value
+    if type(value) is CowDict:
+        cp = CowDict.__new__(CowDict)
+        dict.update(cp, value)
+        for key in value.owned:
+            dict.__setitem__(cp, key, get_cow_copy(dict.__getitem__(value, key)))
+        cp.owned = set()
+        return cp
+    return deepcopy(value)
+
+def get_read_view(value):
+    """ Value read through a StateView: dicts are wrapped in a FluentView, other values are given as they are """
+    if isinstance(value, dict):
+        return FluentView(value)
+    return value
+
+class FluentView:
+    """ Read-only view of a dict fluent (or of a dict in it), its values are read without copying them (see CowDict) """
+    __slots__ = ("data", "get_item")
+    def __init__(self, data):
+        self.data = data
+        self.get_item = data.peek if isinstance(data, CowDict) else data.__getitem__
+
+    def __getitem__(self, key):
+        return get_read_view(self.get_item(key))
+
+    def get(self, key, default=None):
+        if key in self.data:
+            return get_read_view(self.get_item(key))
+        return default
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return [self[key] for key in self.data]
+
+    def items(self):
+        return [(key, self[key]) for key in self.data]
+
+    def __eq__(self, other):
+        if type(other) is FluentView:
+            other = other.data
+        return self.data == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.data)
+
+class StateView:
+    """
+    Read-only view of a state, given to the conditions, decompositions and costs of the methods and operators
+    (see get_state_view()) so that reading a dynamic fluent doesn't copy it (see CowDict).
+    """
+    __slots__ = ("state",)
+    def __init__(self, state):
+        object.__setattr__(self, "state", state)
+
+    def __getattr__(self, name):
+        fluent = self.state.fluents.get(name)
+        if fluent == None or not fluent.is_dyn:
+            return getattr(self.state, name)
+        return get_read_view(self.state.read_fluent(name))
+
+    def __setattr__(self, name, value):
+        raise Exception("State {} is read-only here, can't set {}".format(self.state.__name__, name))
+
+def get_state_view(state):
+    if type(state) is StateView:
+        return state
+    return StateView(state)
+
 class State:
+    """
+    Dynamic fluents are shared between a state and its copies until they are accessed:
+    they are then copied in the state one level at a time (see CowDict).
+    Copying a state doesn't change it: the parts it owns are copied once for the copy (see get_cow_copy()).
+    Conditions and decompositions read the state through a StateView, without copying it.
+    """
     def __init__(self, name):
         self.__name__ = name
         self.fluents = {}
@@ -318,15 +543,59 @@ class State:
         self.fluents[name] = fluent
         setattr(self, name, value)    
 
+    def __getattr__(self, name):
+        # only called for the attributes which aren't set, i.e. the dynamic fluents shared since the last copy
+        shared = self.__dict__.get("_shared")
+        if shared == None or not name in shared:
+            raise AttributeError(name)
+        value = get_owned_copy(shared.pop(name))
+        setattr(self, name, value)
+        return value
+
+    def read_fluent(self, name):
+        """ Value of the fluent without copying it if it is shared, to read only """
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return self._shared[name]
+
+    def set_shared_fluent(self, name, value):
+        """ Sets the fluent to a value shared with the copies of the state (see CowDict), which mustn't be changed in place """
+        self.__dict__.pop(name, None)
+        self.__dict__.setdefault("_shared", {})[name] = value
+
     def __deepcopy__(self, memo):
         cp = State(self.__name__)
+        cp._shared = dict(self.__dict__.get("_shared", {}))
         for f in self.fluents:
             cp.fluents[f] = self.fluents[f]
             if self.fluents[f].is_dyn:
-                setattr(cp,f,deepcopy(getattr(self,f)))
+                if f in self.__dict__:
+                    # owned by this state, which keeps it as it is
+                    cp._shared[f] = get_cow_copy(self.__dict__[f])
             else:
                 setattr(cp,f,getattr(self,f))
         return cp
+
+    def freeze(self):
+        """ Makes the state read-only, see FrozenState. It must not be shared with code which still changes it. """
+        for f in self.fluents:
+            if self.fluents[f].is_dyn and f in self.__dict__:
+                self.set_shared_fluent(f, self.__dict__[f])
+        self.__class__ = FrozenState
+
+class FrozenState(State):
+    """
+    State which can't change anymore (see freeze_agents()): its dynamic fluents are read through views (see StateView)
+    and setting a fluent raises an exception. Its copies are States which can change.
+    """
+    def __getattr__(self, name):
+        shared = self.__dict__.get("_shared")
+        if shared == None or not name in shared:
+            raise AttributeError(name)
+        return get_read_view(shared[name])
+
+    def __setattr__(self, name, value):
+        raise Exception("State {} is frozen, can't set {}".format(self.__name__, name))
             
 
 ## Agent ##
@@ -365,7 +634,7 @@ class Agent:
         #####################
         # Dynamic part
         # cp.state = deepcopy(self.state)
-        cp.agenda = copy(self.agenda)
+        cp.agenda = list(self.agenda)
         # cp.planned_actions = deepcopy(self.planned_actions)
 
         return cp
@@ -376,6 +645,11 @@ class Agent:
     def has_method_for(self, AT):
         return AT.name in self.methods
 
+class FrozenAgent(Agent):
+    """ Agent of frozen agents (see freeze_agents()), its agenda is a tuple. Its copies are Agents which can change. """
+    def __setattr__(self, name, value):
+        raise Exception("Agent {} is frozen, can't set {}".format(self.name, name))
+
 class Agents:
     def __init__(self):
         self.agents = {} # type: dict[str, Agent]
@@ -397,14 +671,47 @@ class Agents:
     def __delitem__(self, subscript):
         del self.agents[subscript]
 
+class FrozenAgents(Agents):
+    """ Agents which can't change anymore, see freeze_agents(). Its copies are Agents which can change. """
+    def __setitem__(self, subscript, item):
+        raise Exception("Agents are frozen, can't set {}".format(subscript))
+
+    def __delitem__(self, subscript):
+        raise Exception("Agents are frozen, can't delete {}".format(subscript))
+
+    def __setattr__(self, name, value):
+        raise Exception("Agents are frozen, can't set {}".format(name))
+
+    def __deepcopy__(self, memo):
+        cp = Agents()
+        cp.agents = deepcopy(self.agents, memo)
+        cp.state = deepcopy(self.state, memo)
+        return cp
+
+def freeze_agents(agents: Agents):
+    """
+    Makes the agents, e.g. a world kept in a WorldPool, read-only: changing their state or their agendas raises an exception.
+    The agents mustn't be shared with code which still changes them, deepcopy() them first.
+    """
+    for agent in agents.agents.values():
+        agent.agenda = tuple(agent.agenda)
+        agent.planned_actions = tuple(agent.planned_actions)
+        agent.__class__ = FrozenAgent
+    agents.state.freeze()
+    agents.__class__ = FrozenAgents
+
 ## Refinement ##
 class Decomposition:
+    # fields of AppliedDecomposition included, the same layout allows cast_Dec to change __class__
+    __slots__ = ("type", "subtasks", "new_agenda", "PT", "next_action", "end_agents")
     def __init__(self, subtasks, agenda=None):
         self.type = DecompType.OK
         self.subtasks = subtasks
         self.new_agenda = agenda
         self.PT = None if subtasks==[] else subtasks[0]
         self.next_action = None 
+
+    __setstate__ = set_slots_state
     
     def show(self):
         print(self)
@@ -425,7 +732,7 @@ class Decomposition:
         # checks if first task is primitive and has an operator
         first_task = self.subtasks[0]
         
-        if first_task.is_abstract==False and g_static_agents[agent_name].has_operator_for(first_task):
+        if first_task.is_abstract==False and get_context().static_agents[agent_name].has_operator_for(first_task):
             self.PT = self.subtasks[0]
             return True
         return False
@@ -433,18 +740,19 @@ class Decomposition:
     def first_task_is_PT_not_done(self, agent_name, state):
         # checks if first task is primitive, has an operator, is not done
         if self.first_task_is_PT_and_has_op(agent_name):
-            op = g_static_agents[agent_name].operators[self.subtasks[0].name]
+            op = get_context().static_agents[agent_name].operators[self.subtasks[0].name]
             return not op.is_done(state, self.PT)
         return False
     
     def first_task_is_PT_done(self, agent_name, state):
         # checks if first task is primitive, has an operator, is done
         if self.first_task_is_PT_and_has_op(agent_name):
-            op = g_static_agents[agent_name].operators[self.subtasks[0].name]
+            op = get_context().static_agents[agent_name].operators[self.subtasks[0].name]
             return op.is_done(state, self.PT)
         return False
 
 class AppliedDecomposition(Decomposition):
+    __slots__ = ()
     def __init__(self, new_agents):
         self.next_action = None
         self.end_agents = new_agents
@@ -508,21 +816,87 @@ class AppliedRefinement:
         print("]")
 
 
+#############
+## CONTEXT ##
+#############
+class ExplorationContext:
+    """
+    Domain, configuration and id counters of explorations, to run explorations of several domains in one process,
+    at the same time in several threads if each has its own context.
+    The init functions below and the planner use the current context (see get_context()), set for an exploration
+    by the context argument of explore(), explore_ANDOR() and resume_exploration() (ConcurrentModule) or by use_context().
+    Without one the explorations use the default context of the process.
+    A context runs one exploration at a time.
+    init_domain: initDomain function of a domain module, called in the context
+    """
+    def __init__(self, init_domain=None):
+        self.domain_name = ""
+        self.static_agents = Agents()
+        self.starting_agent = "R"
+        self.symmetric_objects = []         # classes of interchangeable objects, see declare_symmetric_objects()
+        self.symmetry_renamings = []        # renamings permuting the objects of each class, identity first
+        self.observability_rules = []       # what H observes in the designated state, see declare_observability_rules()
+        self.relevant_fluents = {}          # task names -> relevant fluents, for the static agents (emptied when they change)
+        self.relevance_scan = False         # see set_relevance_scan()
+        self.task_next_id = 0
+        self.step_next_id = 0
+        self.criteria = None                # criteria of the last computed metrics, to sort the steps
+        self.max_number_of_worlds_evaluated = 0
+        self.world_pool = None              # possible worlds of the exploration, see ConcurrentModule.WorldPool
+        if init_domain != None:
+            with use_context(self):
+                init_domain()
+
+    def new_task_id(self):
+        self.task_next_id += 1
+        return self.task_next_id - 1
+
+    def new_step_id(self):
+        self.step_next_id += 1
+        return self.step_next_id - 1
+
+g_default_context = ExplorationContext()
+g_current_context = contextvars.ContextVar("current_context", default=g_default_context)
+
+def get_context() -> ExplorationContext:
+    """ Context of the running thread (or asyncio task), see ExplorationContext """
+    return g_current_context.get()
+
+@contextlib.contextmanager
+def use_context(context: ExplorationContext):
+    """ `with use_context(context):` makes the context the current one in the running thread, None keeps the current one """
+    if context == None:
+        yield get_context()
+        return
+    token = g_current_context.set(context)
+    try:
+        yield context
+    finally:
+        g_current_context.reset(token)
+
+
 ##################################
 ## GLOBAL VARIABLES AND SETTERS ##
 ##################################
-g_domain_name=""
 def set_domain_name(dom_name):
-    global g_domain_name
-    g_domain_name = dom_name
-g_static_agents = Agents()
+    get_context().domain_name = dom_name
 g_other_agent_name={"H":"R", "R":"H"}
 g_wait_cost = {"R":0.0, "H":2.0}
 g_idle_cost = {"R":0.0, "H":0.0}
-g_starting_agent = "R"
 def set_starting_agent(agent):
-    global g_starting_agent
-    g_starting_agent = agent
+    get_context().starting_agent = agent
+def set_relevance_scan(val):
+    """
+    Lets get_relevant_fluents() find the fluents used by the methods, operators and triggers which don't declare them
+    (reads and subtasks) by scanning their code, and the code of the functions they call. The scan gives up, and every
+    fluent is then compared, on a function which isn't a plain function, uses a closure, imports a module, calls
+    anything but a plain function, a builtin or the planner, or reads fluents by name (getattr, vars, state.fluents,
+    read_fluent). It doesn't see the task names or fluent names computed at run time (e.g. "get_" + obj), which must
+    be declared instead.
+    """
+    context = get_context()
+    context.relevance_scan = val
+    context.relevant_fluents.clear()
 g_debug = False
 def set_debug(val):
     global g_debug
@@ -541,39 +915,101 @@ def set_view_gui(val):
 ## INIT FUNCTION ##
 ###################
 def declare_methods(agent, method_list):
-    if not g_static_agents.exist(agent):
-        g_static_agents.create_agent(agent)
+    context = get_context()
+    context.relevant_fluents.clear()
+    if not context.static_agents.exist(agent):
+        context.static_agents.create_agent(agent)
     for m in method_list:
-        if m.AT_name in g_static_agents[agent].methods:
-            g_static_agents[agent].methods[m.AT_name].append(m) 
+        if m.AT_name in context.static_agents[agent].methods:
+            context.static_agents[agent].methods[m.AT_name].append(m) 
         else:
-            g_static_agents[agent].methods[m.AT_name] = [m] 
+            context.static_agents[agent].methods[m.AT_name] = [m] 
 
 def declare_operators(agent, op_list):
-    if not g_static_agents.exist(agent):
-        g_static_agents.create_agent(agent)
+    context = get_context()
+    context.relevant_fluents.clear()
+    if not context.static_agents.exist(agent):
+        context.static_agents.create_agent(agent)
     for o in op_list:
-        g_static_agents[agent].operators[o.PT_name] = o
+        context.static_agents[agent].operators[o.PT_name] = o
 
 def set_state(state):
-    g_static_agents.state = state
+    context = get_context()
+    context.relevant_fluents.clear()
+    context.static_agents.state = state
+
+def declare_symmetric_objects(classes):
+    """
+    Declares classes of interchangeable objects (e.g. cubes of the same color), situations equal up to a
+    permutation of the objects of a class are then explored once (see ConcurrentModule.get_canonical_fingerprint()).
+    The whole problem (static fluents, agendas, methods) must be unchanged when they are permuted.
+    Each permutation is tried when fingerprinting a situation, classes must remain small.
+    """
+    context = get_context()
+    context.symmetric_objects = [list(c) for c in classes if len(c) > 1]
+    context.symmetry_renamings = []
+    if context.symmetric_objects == []:
+        return
+    for permutations in itertools.product(*[itertools.permutations(c) for c in context.symmetric_objects]):
+        renaming = {}
+        for c, permuted in zip(context.symmetric_objects, permutations):
+            for o, new_o in zip(c, permuted):
+                if o != new_o:
+                    renaming[o] = new_o
+        context.symmetry_renamings.append(renaming)
+
+def declare_observability_rules(rules):
+    """
+    Declares what H observes of the designated state (list of ObservabilityRule), used by the situation assessment:
+    a possible world differing from the designated state on an observed entry is refuted. Without rules H observes nothing.
+    """
+    get_context().observability_rules = list(rules)
+
+def get_observed_value(state, path):
+    """ Value at the index path (fluent, key, sub keys...) of the state, read without copying """
+    value = state.read_fluent(path[0])
+    for key in path[1:]:
+        value = dict.__getitem__(value, key) if isinstance(value, dict) else value[key]
+    return value
+
+def evaluate_conditions(element, states, task, with_done=True):
+    """
+    Done-condition and precondition of a method or an operator (element) for the task in each of the states,
+    e.g. the designated state and the possible worlds, evaluated in one pass and once per state.
+    Returns the lists (done, applicable) of booleans, done is all False if with_done is False.
+    """
+    done = []
+    applicable = []
+    for state in states:
+        done.append(element.is_done(state, task) if with_done else False)
+        applicable.append(element.is_applicable(state, task))
+    return done, applicable
+
+def get_object_classes(objects, attribute):
+    """ Groups the objects of a dict fluent by the value of one of their attributes, e.g. (state.color_cubes, "color") """
+    classes = {}
+    for o in sorted(objects):
+        classes.setdefault(objects[o][attribute], []).append(o)
+    return list(classes.values())
 
 def add_tasks(agent, tasks):
-    if not g_static_agents.exist(agent):
-        g_static_agents.create_agent(agent)
+    static_agents = get_context().static_agents
+    if not static_agents.exist(agent):
+        static_agents.create_agent(agent)
 
     for t in tasks:
-        if t[0] in g_static_agents[agent].methods:
-            g_static_agents[agent].agenda.append(AbstractTask(t[0], t[1:], None, 0, agent))
-        elif t[0] in g_static_agents[agent].operators:
-            g_static_agents[agent].agenda.append(PrimitiveTask(t[0], t[1:], None, 0, agent))
+        if t[0] in static_agents[agent].methods:
+            static_agents[agent].agenda.append(AbstractTask(t[0], t[1:], None, 0, agent))
+        elif t[0] in static_agents[agent].operators:
+            static_agents[agent].agenda.append(PrimitiveTask(t[0], t[1:], None, 0, agent))
         else:
             raise Exception("{} isn't known by agent {}".format(t[0], agent))
 
 def generate_begin_action():
-    if g_starting_agent == "R":
+    starting_agent = get_context().starting_agent
+    if starting_agent == "R":
         begin_agent = "H"
-    elif g_starting_agent == "H":
+    elif starting_agent == "H":
         begin_agent = "R"
         
     begin_action = Action.cast_PT2A(PrimitiveTask("BEGIN", [], None, 0, begin_agent), 0.0, None)
@@ -588,14 +1024,14 @@ def show_init():
     print("┌────────────────────────────────────────────────────────────────────────┐")
     print("│ #INIT#                                                                 │")
     print("├────────────────────────────────────────────────────────────────────────┘")
-    print_agendas_states(g_static_agents, with_static=True)
+    print_agendas_states(get_context().static_agents, with_static=True)
 
 def str_init():
     out_str = ""
     out_str += "┌────────────────────────────────────────────────────────────────────────┐\n"
     out_str += "│ #INIT#                                                                 │\n"
     out_str += "├────────────────────────────────────────────────────────────────────────┘\n"
-    out_str += str_agendas_states(g_static_agents, with_static=True)
+    out_str += str_agendas_states(get_context().static_agents, with_static=True)
     return out_str
 
 def str_agents(agents):
@@ -737,6 +1173,128 @@ def sort_dict_recursive(data):
             sorted_data[key] = value
     return sorted_data
 
+def get_data_fingerprint(data, renaming=None):
+    """
+    Hashable version of a fluent value, dicts and sets are made order independent
+    renaming: dict of object names to replace, in keys and values (see declare_symmetric_objects())
+    """
+    if isinstance(data, dict):
+        if renaming == None:
+            items = ((key, get_data_fingerprint(value)) for key, value in dict.items(data))
+        else:
+            items = ((get_data_fingerprint(key, renaming), get_data_fingerprint(value, renaming)) for key, value in dict.items(data))
+        return tuple(sorted(items, key=lambda x: str(x[0])))
+    elif isinstance(data, (list, tuple)):
+        return tuple(get_data_fingerprint(value, renaming) for value in data)
+    elif isinstance(data, (set, frozenset)):
+        return frozenset(get_data_fingerprint(value, renaming) for value in data)
+    elif renaming != None and isinstance(data, str):
+        return renaming.get(data, data)
+    elif isinstance(data, FluentView):
+        return get_data_fingerprint(data.data, renaming)
+    return data
+
+def get_state_fingerprint(state, with_static=False, renaming=None):
+    """Hashable key of the state, two states with the same key are equal w.r.t. compare_states"""
+    fingerprint = []
+    for f in state.fluents:
+        if state.fluents[f].is_dyn or with_static:
+            fingerprint.append( (f, get_data_fingerprint(state.read_fluent(f), renaming)) )
+    return tuple(sorted(fingerprint, key=lambda x: x[0]))
+
+def get_agenda_fingerprint(agenda, renaming=None):
+    """Hashable key of an agenda, task ids are ignored"""
+    return tuple((t.is_abstract, t.name, get_data_fingerprint(t.parameters, renaming)) for t in agenda)
+
+def get_renamed_data(data, renaming):
+    """ Copy of a fluent value (or of task parameters) with the object names replaced as in renaming, in keys and values """
+    if isinstance(data, dict):
+        return {get_renamed_data(key, renaming): get_renamed_data(value, renaming) for key, value in dict.items(data)}
+    elif isinstance(data, FluentView):
+        return get_renamed_data(data.data, renaming)
+    elif isinstance(data, (list, tuple, set, frozenset)):
+        return type(data)(get_renamed_data(value, renaming) for value in data)
+    elif isinstance(data, str):
+        return renaming.get(data, data)
+    return data
+
+def get_renamed_task(task: Task, renaming):
+    """ Copy of the task (or action) with its parameters renamed, see get_renamed_data() """
+    renamed = copy(task)
+    renamed.parameters = get_renamed_data(task.parameters, renaming)
+    return renamed
+
+def get_renamed_agents(agents: Agents, renaming):
+    """
+    Copy of the agents in the symmetric situation given by renaming (see declare_symmetric_objects()):
+    their dynamic fluents and agendas refer to the renamed objects, the static fluents are unchanged.
+    """
+    renamed = deepcopy(agents)
+    for f in agents.state.fluents:
+        if agents.state.fluents[f].is_dyn:
+            renamed.state.set_shared_fluent(f, get_renamed_data(agents.state.read_fluent(f), renaming))
+    for agent in renamed.agents.values():
+        agent.agenda = [get_renamed_task(t, renaming) for t in agent.agenda]
+    return renamed
+
+def get_compared_data_fingerprint(data, sort_lists=False):
+    """Hashable version of a fluent value, equal for values found equal by compare_data() (lists nested in dicts are sorted)"""
+    if isinstance(data, dict):
+        return tuple(sorted(((key, get_compared_data_fingerprint(value, True)) for key, value in dict.items(data)), key=lambda x: str(x[0])))
+    elif isinstance(data, list):
+        return tuple(get_data_fingerprint(value) for value in (sorted(data) if sort_lists else data))
+    return get_data_fingerprint(data)
+
+def get_compared_fluent_fingerprint(data):
+    """Hashable version of the value of a fluent, equal for values found equal by compare_data()"""
+    if isinstance(data, dict):
+        # as in compare_data(), only the values of the fluent dict are sorted
+        return tuple(sorted(((key, get_compared_data_fingerprint(value)) for key, value in dict.items(data)), key=lambda x: str(x[0])))
+    return get_data_fingerprint(data)
+
+def get_compared_state_fingerprint(state, with_static=False):
+    """Hashable key of the state, two states have the same key iff compare_states() finds them equal"""
+    fingerprint = []
+    for f in state.fluents:
+        if state.fluents[f].is_dyn or with_static:
+            fingerprint.append( (f, get_compared_fluent_fingerprint(state.read_fluent(f))) )
+    return tuple(sorted(fingerprint, key=lambda x: x[0]))
+
+DELTA_MISSING = object()
+
+def get_state_delta(state, reference, fluents=None):
+    """
+    Sparse delta of the dynamic fluents of the state w.r.t. the reference state: frozenset of ((fluent, key), value)
+    for the entries which differ (key is None for a fluent which isn't a dict, value is DELTA_MISSING for a removed key).
+    Two states have the same delta w.r.t. a reference iff compare_states() finds them equal.
+    The values still shared with the reference (see CowDict) are skipped without being compared.
+    It's only used as a key: the states themselves stay whole, sharing their unchanged values (see CowDict).
+    fluents: if given, only these fluents are compared (see get_relevant_fluents())
+    """
+    delta = []
+    for f in (state.fluents if fluents == None else fluents):
+        if state.fluents[f].is_dyn:
+            data = state.read_fluent(f)
+            ref_data = reference.read_fluent(f)
+            if data is ref_data:
+                continue
+            if isinstance(data, dict) and isinstance(ref_data, dict):
+                for key, value in dict.items(data):
+                    ref_value = dict.get(ref_data, key, DELTA_MISSING)
+                    if value is ref_value:
+                        continue
+                    value = get_compared_data_fingerprint(value)
+                    if ref_value is DELTA_MISSING or value != get_compared_data_fingerprint(ref_value):
+                        delta.append( ((f, key), value) )
+                for key in dict.keys(ref_data):
+                    if not key in data:
+                        delta.append( ((f, key), DELTA_MISSING) )
+            else:
+                value = get_compared_fluent_fingerprint(data)
+                if value != get_compared_fluent_fingerprint(ref_data):
+                    delta.append( ((f, None), value) )
+    return frozenset(delta)
+
 def print_state(state, indent=4, with_static=False):
     """Print each variable in state, indented by indent spaces."""
     if state != False:
@@ -775,6 +1333,166 @@ def print_solutions(begin_action: Action):
             print(plan[n], end=" - ") if x!=plan[-1] else print(plan[n])
 
 
+###############
+## RELEVANCE ##
+###############
+# names which let a function read any fluent, its reads can't be known from its code
+DYNAMIC_ACCESS_NAMES = {"getattr", "vars", "__dict__", "fluents", "read_fluent"}
+
+# modules of the planner, the fluents named in their code are relevant anyway (see ConcurrentModule.get_worlds_relevant_fluents())
+PLANNER_MODULES = {"CommonModule", "ConcurrentModule"}
+
+def get_const_names(const, names):
+    if isinstance(const, str):
+        names.add(const)
+    elif isinstance(const, (tuple, frozenset)):
+        for c in const:
+            get_const_names(c, names)
+    elif isinstance(const, types.CodeType):
+        get_code_names(const, names)
+
+def get_code_names(code, names):
+    """Adds to names the names and the string constants used in the code object and its nested code objects"""
+    names.update(code.co_names)
+    for const in code.co_consts:
+        get_const_names(const, names)
+    return names
+
+def get_module_names(module):
+    """Names used in the code of the functions and classes of the module"""
+    names = set()
+    for value in vars(module).values():
+        if isinstance(value, type) and value.__module__ == module.__name__:
+            for attribute in vars(value).values():
+                if isinstance(attribute, types.FunctionType):
+                    get_code_names(attribute.__code__, names)
+        elif isinstance(value, types.FunctionType) and value.__module__ == module.__name__:
+            get_code_names(value.__code__, names)
+    return names
+
+def is_planner_value(value):
+    return getattr(value, "__module__", None) in PLANNER_MODULES or getattr(value, "__name__", None) in PLANNER_MODULES
+
+def get_global_names(code, function_globals, names, visited):
+    """
+    Adds to names the names used by the functions the code (and its nested code objects) uses as globals,
+    directly or as attributes of a module. Returns False if a global can't be followed: unresolved name,
+    or anything callable but a plain function, a builtin or a part of the planner.
+    """
+    instructions = list(dis.get_instructions(code))
+    for i, instruction in enumerate(instructions):
+        if instruction.opname == "IMPORT_NAME" and not instruction.argval in PLANNER_MODULES:
+            return False
+        if instruction.opname != "LOAD_GLOBAL":
+            continue
+        name = instruction.argval
+        if not name in function_globals:
+            if hasattr(builtins, name):
+                continue
+            return False
+        value = function_globals[name]
+        if is_planner_value(value):
+            continue
+        if isinstance(value, types.ModuleType):
+            # mod.helper(state): the attribute of the module is followed instead
+            if i + 1 == len(instructions) or not instructions[i + 1].opname in ("LOAD_ATTR", "LOAD_METHOD"):
+                return False
+            value = getattr(value, instructions[i + 1].argval, None)
+            if is_planner_value(value):
+                continue
+        if isinstance(value, types.FunctionType):
+            if not get_function_names(value, names, visited):
+                return False
+        elif callable(value) or isinstance(value, types.ModuleType):
+            return False
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType) and not get_global_names(const, function_globals, names, visited):
+            return False
+    return True
+
+def get_function_names(function, names, visited):
+    """
+    Adds to names the names used by a domain function and by the functions it calls (see get_global_names()).
+    Returns False if they can't be known: not a plain function, closure, fluents read by name or unknown call.
+    """
+    if function == None or function in visited:
+        return True
+    if not isinstance(function, types.FunctionType) or function.__closure__ != None:
+        return False
+    visited.add(function)
+    code_names = get_code_names(function.__code__, set())
+    if not code_names.isdisjoint(DYNAMIC_ACCESS_NAMES):
+        return False
+    names.update(code_names)
+    return get_global_names(function.__code__, function.__globals__, names, visited)
+
+def get_declared_names(element, state):
+    """
+    Fluents and subtasks declared by a method, operator or trigger (reads and subtasks), None if it declares neither.
+    A declaration must be complete: a method or trigger declaring reads must declare subtasks, and the other way around.
+    """
+    subtasks = element.subtasks if not isinstance(element, Operator) else None if element.reads == None else []
+    if element.reads == None and subtasks == None:
+        return None
+    if element.reads == None or subtasks == None:
+        raise Exception(f"{get_element_name(element)} declares only one of reads and subtasks")
+    for f in element.reads:
+        if not f in state.fluents:
+            raise Exception(f"{get_element_name(element)} reads an unknown fluent {f}")
+    return set(element.reads).union(subtasks)
+
+def get_element_name(element):
+    if isinstance(element, Method):
+        return f"method of {element.AT_name}"
+    if isinstance(element, Operator):
+        return f"operator {element.PT_name}"
+    return "trigger"
+
+def get_relevant_fluents(task_names):
+    """
+    Dynamic fluents which can be read while refining the given tasks: the fluents used by the methods and operators
+    of these tasks, of their subtasks and of the triggers. Two states equal on these fluents can't be told apart by
+    the refinement of the tasks.
+    Each method, operator or trigger gives them with its reads and subtasks arguments, otherwise they are found by
+    scanning its code if set_relevance_scan() allows it.
+    Returns None if they aren't known for one of them (nothing declared, scan not allowed or failed).
+    """
+    context = get_context()
+    key = frozenset(task_names)
+    if key in context.relevant_fluents:
+        return context.relevant_fluents[key]
+
+    state = context.static_agents.state
+    names = set(task_names)
+    to_analyse = [trigger for agent in context.static_agents.agents.values() for trigger in agent.triggers]
+    analysed_tasks = set()
+    visited = set()
+    while True:
+        for task_name in names - analysed_tasks:
+            analysed_tasks.add(task_name)
+            for agent in context.static_agents.agents.values():
+                to_analyse += agent.methods.get(task_name, [])
+                if task_name in agent.operators:
+                    to_analyse.append(agent.operators[task_name])
+        if to_analyse == []:
+            break
+        element = to_analyse.pop()
+        declared_names = get_declared_names(element, state)
+        if declared_names != None:
+            names.update(declared_names)
+            continue
+        if not context.relevance_scan:
+            context.relevant_fluents[key] = None
+            return None
+        for function in vars(element).values():
+            if not isinstance(function, str) and not get_function_names(function, names, visited):
+                context.relevant_fluents[key] = None
+                return None
+
+    relevant_fluents = frozenset(f for f in state.fluents if state.fluents[f].is_dyn and f in names)
+    context.relevant_fluents[key] = relevant_fluents
+    return relevant_fluents
+
 ############
 ## HELPER ##
 ############
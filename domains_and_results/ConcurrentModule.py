@@ -1,7 +1,8 @@
 from typing import Any, Dict, List, Tuple
 from copy import deepcopy, copy
 import CommonModule as CM
-from anytree import RenderTree, NodeMixin
+from anytree import RenderTree
+from array import array
 import pickle
 import dill
 import logging as lg
@@ -12,6 +13,13 @@ from statistics import mean
 import numpy as np
 import concurrent.futures
 import time
+import heapq
+import resource
+import gzip
+import os
+import functools
+from collections import deque
+from abc import ABC, abstractmethod
 import graphviz
 import simplexml
 
@@ -22,13 +30,18 @@ logging.config.fileConfig(CM.path + 'log.conf')
 
 import pstats
 
-max_number_of_worlds_evaluated = 0
+g_planner_names = None # see get_planner_names()
 
 
 #############
 ## CLASSES ##
 #############
 class ActionPair:
+    __slots__ = ("human_action", "robot_action", "previous", "next", "end_agents", "worlds", "belief", "world_pool", "in_human_option",
+                 "node_type", "node_done", "node_pass", "copresence", "partial_metrics", "nb_unsolved_children",
+                 "solved_listeners", "cancelled", "robot_children", "unexplored", "situation_fingerprint",
+                 "cycle_fingerprint", "transposition_of", "transpositions", "symmetry_renaming", "transposition_renaming",
+                 "aostar_value", "best_child", "best_rank_r", "best_rank_h", "branch_metrics", "branch_rank_r", "branch_rank_h")
     def __init__(self, human_action: CM.Action, robot_action: CM.Action, end_agents: CM.Agents, input_possible_worlds_for_h):
         self.human_action = human_action    #type: CM.Action
         self.robot_action = robot_action    #type: CM.Action
@@ -38,6 +51,8 @@ class ActionPair:
         self.end_agents = end_agents        #type: CM.Agents
 
         # for simplicity we assume it is empty in the beginning
+        # once the pair is assessed, the worlds are interned in a WorldPool and only their bitset is kept
+        self.world_pool = None              #type: WorldPool | None
         self.possible_worlds_for_h = input_possible_worlds_for_h #type Set:{CM.Agents}
 
         self.in_human_option = None         #type: HumanOption | None
@@ -48,6 +63,31 @@ class ActionPair:
         self.node_pass = None
         self.copresence = False
 
+        # metrics of the branch from the root pair up to this pair, see get_partial_metrics()
+        self.partial_metrics = None
+
+        # number of children not DONE/pass yet, set once expanded, see regress_new_status_backward()
+        self.nb_unsolved_children = None
+        self.solved_listeners = []          # called with the pair when it becomes DONE, see set_solved()
+        self.cancelled = False              # can't be part of the policy anymore, agents/worlds released, see is_cancelled()
+        self.robot_children = None          #type: RobotChildren | None # children not generated yet (lazy OR expansion)
+        self.unexplored = False             # still to expand when the exploration stopped, see ExplorationBudget
+
+        # situation reached once assessed, and key of the expanded pair checked by is_cycle()
+        self.situation_fingerprint = None
+        self.cycle_fingerprint = None
+
+        # transposition table, see get_transposition()
+        self.transposition_of = None        #type: ActionPair | None # already expanded pair in the same situation
+        self.transpositions = []            #type: List[ActionPair] # pairs sharing the sub-tree of this pair
+        # symmetric objects, see get_canonical_fingerprint()
+        self.symmetry_renaming = None       # renaming giving the canonical situation_fingerprint
+        self.transposition_renaming = None  # objects of this pair to the ones of transposition_of, if they differ
+
+        # AO* search, see fun_AND_OR_search_aostar()
+        self.aostar_value = None            # metrics tuple of the best sub-policy (lower bound if not solved)
+        self.best_child = None              #type: ActionPair | None # child chosen by the robot (OR pair)
+
         # OLD #
         self.best_rank_r = None
         self.best_rank_h = None
@@ -60,6 +100,25 @@ class ActionPair:
         # self.best_rank = None # r rank
         # self.branch_metrics = None # if != None then it is final pair
 
+    __setstate__ = CM.set_slots_state
+
+    @property
+    def possible_worlds_for_h(self):
+        if self.belief == None:
+            return self.worlds
+        return self.world_pool.get_worlds(self.belief)
+
+    @possible_worlds_for_h.setter
+    def possible_worlds_for_h(self, worlds):
+        self.worlds = worlds
+        self.belief = None
+
+    def intern_worlds(self, world_pool):
+        """ Replaces the possible worlds by their bitset in world_pool, the pair must not change them afterwards """
+        self.belief = world_pool.get_belief(self.worlds)
+        self.world_pool = world_pool
+        self.worlds = None
+
     def set_it_as_and_node(self, node_t):
         self.node_type = node_t
         
@@ -99,12 +158,29 @@ class ActionPair:
         return f"{self.human_action.short_str()}{self.robot_action.short_str()}"
 
     def get_in_step(self):
+        if self.in_human_option == None:
+            return None
         return self.in_human_option.in_step
 
+    def snapshot(self):
+        """
+        Copy of the pair detached from the explored tree, to use instead of deepcopy(pair).
+        Only end_agents and the possible worlds are copied (together, to keep shared worlds shared),
+        the actions are shared and previous is reduced to its two actions (enough for is_final/is_passive).
+        """
+        end_agents, possible_worlds_for_h = deepcopy((self.end_agents, self.possible_worlds_for_h))
+        copy = ActionPair(self.human_action, self.robot_action, end_agents, possible_worlds_for_h)
+        if self.previous != None:
+            copy.previous = ActionPair(self.previous.human_action, self.previous.robot_action, None, [])
+        copy.node_type = self.node_type
+        copy.copresence = self.copresence
+        return copy
+
     def __repr__(self):
         return f"H{self.human_action.id}-{self.human_action.name}{self.human_action.parameters}|R{self.robot_action.id}-{self.robot_action.name}{self.robot_action.parameters}"
 
 class HumanOption:
+    __slots__ = ("action_pairs", "in_step", "human_action", "robot_actions", "best_robot_pair", "best_human_pair")
     def __init__(self, pairs: List[ActionPair]):
         self.action_pairs = pairs                   #type: List[ActionPair]
         self.in_step = None                         #type: Step | None
@@ -116,7 +192,8 @@ class HumanOption:
         for p in pairs:
             self.robot_actions.append(p.robot_action)
             p.in_human_option = self
-        self.robot_choice = None
+
+    __setstate__ = CM.set_slots_state
 
     def add_robot_passive(self, type):
         # If robot already has a passive action, add type in params
@@ -130,7 +207,7 @@ class HumanOption:
             self.robot_actions.append(passive_action)
             selected_pair = self.in_step.from_pair
             new_agents = get_agents_after_action(selected_pair.end_agents, self.human_action)
-            passive_pair = ActionPair(self.human_action, passive_action, new_agents)
+            passive_pair = ActionPair(self.human_action, passive_action, new_agents, selected_pair.possible_worlds_for_h)
             passive_pair.in_human_option = self
             passive_pair.previous = selected_pair
             selected_pair.next.append(passive_pair)
@@ -185,19 +262,19 @@ class HumanOption:
         print(str_2)
         print(str_3)
 
-G_CRITERIA = None
 class BaseStep:
-    __ID = 0 #type: int
-    
+    __slots__ = ("id", "human_options", "best_robot_pair", "best_human_pair", "CRA", "from_pair", "stopped_by")
 
     def __init__(self):
-        self.id = BaseStep.__ID
-        BaseStep.__ID += 1
+        self.id = CM.get_context().new_step_id()
         self.human_options = []  #type: List[HumanOption]
         self.best_robot_pair = None
         self.best_human_pair = None
         self.CRA = []                       #type: List[CM.Action] # Common Robot Actions
         self.from_pair = None
+        self.stopped_by = None              # initial step only, limit that stopped the exploration (see ExplorationBudget)
+
+    __setstate__ = CM.set_slots_state
 
     def init(self, human_options: List[HumanOption], from_pair: ActionPair):
         self.human_options = human_options  #type: List[HumanOption]
@@ -232,6 +309,25 @@ class BaseStep:
 
     def is_passive(self):
         return self.isRInactive() and self.isHInactive()
+
+    def add_pairs(self, pairs: List[ActionPair]):
+        """ Adds pairs to the already initialized step, used when its from_pair is expanded lazily """
+        for p in pairs:
+            ho = check_list(self.human_options, lambda x: x.human_action == p.human_action)
+            if ho == None:
+                ho = HumanOption([p])
+                ho.in_step = self
+                self.human_options.append(ho)
+            else:
+                ho.action_pairs.append(p)
+                ho.robot_actions.append(p.robot_action)
+                p.in_human_option = ho
+            self.from_pair.next.append(p)
+            p.previous = self.from_pair
+            if self.from_pair.node_type == "AND":
+                p.node_type = "OR"
+            else:
+                p.node_type = "AND"
     
     def is_final(self):
         pairs = self.get_pairs()
@@ -241,7 +337,7 @@ class BaseStep:
         return False
 
     def __lt__(self, other):
-        return compare_metrics(self.get_f_leaf().branch_metrics, other.get_f_leaf().branch_metrics, G_CRITERIA)
+        return compare_metrics(self.get_f_leaf().branch_metrics, other.get_f_leaf().branch_metrics, CM.get_context().criteria)
 
     def get_nb_states(self):
         begin_pair = self.get_pairs()[0]
@@ -327,13 +423,181 @@ class BaseStep:
     def __repr__(self) -> str:
         return self.get_str()
 
-class Step(BaseStep, NodeMixin):  # Add Node feature
+class StepTree:
+    """
+    Topology of a forest of steps in parallel arrays indexed by step.index: parent index (-1 for a root),
+    depth and children indexes. A step is attached in O(1) and its depth is stored, only moving a step
+    with descendants updates their depths.
+    """
+    def __init__(self):
+        self.steps = []             #type: List[Step | None] # None once moved to another tree
+        self.parents = array("i")
+        self.depths = array("i")
+        self.children = []          #type: List[List[int]]
+
+    def add(self, step):
+        step.tree = self
+        step.index = len(self.steps)
+        self.steps.append(step)
+        self.parents.append(-1)
+        self.depths.append(0)
+        self.children.append([])
+
+    def detach(self, i):
+        self.children[self.parents[i]].remove(i)
+        self.parents[i] = -1
+        self.shift_depths(i, -self.depths[i])
+
+    def attach(self, i, parent_i):
+        self.parents[i] = parent_i
+        self.children[parent_i].append(i)
+        self.shift_depths(i, self.depths[parent_i] + 1 - self.depths[i])
+
+    def shift_depths(self, i, delta):
+        if delta == 0:
+            return
+        to_visit = [i]
+        while to_visit != []:
+            j = to_visit.pop()
+            self.depths[j] += delta
+            to_visit += self.children[j]
+
+    def take_subtree(self, step):
+        """ Moves the root step and its descendants from their tree to this one """
+        old_tree = step.tree
+        root_i = step.index
+        new_indexes = {}
+        to_visit = [root_i]
+        while to_visit != []:
+            j = to_visit.pop()
+            s = old_tree.steps[j]
+            self.add(s)
+            new_indexes[j] = s.index
+            if j != root_i:
+                self.attach(s.index, new_indexes[old_tree.parents[j]])
+            to_visit += reversed(old_tree.children[j])
+            old_tree.steps[j] = None
+            old_tree.children[j] = []
+
+    def preorder(self, i):
+        """ Indexes of the step i and its descendants, in depth-first order """
+        order = []
+        to_visit = [i]
+        while to_visit != []:
+            j = to_visit.pop()
+            order.append(j)
+            to_visit += reversed(self.children[j])
+        return order
+
+class Step(BaseStep):
+    """ Step of the exploration tree, its parent and children are kept in a StepTree (same API as anytree's NodeMixin) """
+    __slots__ = ("tree", "index", "legacy_links")
     def __init__(self, *params, parent=None, children=None):
         super(Step, self).__init__(*params)
-        self.parent = parent
+        if parent != None:
+            parent.tree.add(self)
+            parent.tree.attach(self.index, parent.index)
+        else:
+            StepTree().add(self)
         if children:
             self.children = children
 
+    def __setstate__(self, state):
+        # step pickled when Step was an anytree NodeMixin, its tree is built on first access
+        if isinstance(state, dict):
+            self.legacy_links = (state.get("_NodeMixin__parent"), state.get("_NodeMixin__children", []))
+        CM.set_slots_state(self, state)
+
+    def __getattr__(self, name):
+        if (name == "tree" or name == "index") and hasattr(self, "legacy_links"):
+            load_legacy_step_tree(self)
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    @property
+    def parent(self):
+        parent_i = self.tree.parents[self.index]
+        return None if parent_i == -1 else self.tree.steps[parent_i]
+
+    @parent.setter
+    def parent(self, parent):
+        if self.tree.parents[self.index] != -1:
+            if parent != None and self.tree.steps[self.tree.parents[self.index]] is parent:
+                return
+            self.tree.detach(self.index)
+        if parent != None:
+            if parent.tree is not self.tree:
+                parent.tree.take_subtree(self)
+            parent.tree.attach(self.index, parent.index)
+
+    @property
+    def children(self):
+        steps = self.tree.steps
+        return tuple(steps[i] for i in self.tree.children[self.index])
+
+    @children.setter
+    def children(self, children):
+        tree = self.tree
+        kept = set()
+        for c in children:
+            if c.tree is tree and tree.parents[c.index] == self.index:
+                kept.add(c.index)
+        for i in list(tree.children[self.index]):
+            if not i in kept:
+                tree.detach(i)
+        tree.children[self.index] = []
+        for c in children:
+            if c.index in kept and c.tree is tree:
+                tree.children[self.index].append(c.index)
+            else:
+                c.parent = self
+
+    @property
+    def depth(self):
+        return self.tree.depths[self.index]
+
+    @property
+    def is_root(self):
+        return self.tree.parents[self.index] == -1
+
+    @property
+    def is_leaf(self):
+        return self.tree.children[self.index] == []
+
+    @property
+    def root(self):
+        step = self
+        while not step.is_root:
+            step = step.parent
+        return step
+
+    @property
+    def descendants(self):
+        steps = self.tree.steps
+        return tuple(steps[i] for i in self.tree.preorder(self.index)[1:])
+
+    @property
+    def leaves(self):
+        steps = self.tree.steps
+        children = self.tree.children
+        return tuple(steps[i] for i in self.tree.preorder(self.index) if children[i] == [])
+
+def load_legacy_step_tree(step: Step):
+    """ Builds the StepTree of a step tree pickled when Step was an anytree NodeMixin """
+    root = step
+    while root.legacy_links[0] != None:
+        root = root.legacy_links[0]
+    tree = StepTree()
+    to_visit = [(root, None)]
+    while to_visit != []:
+        s, parent = to_visit.pop()
+        tree.add(s)
+        if parent != None:
+            tree.attach(s.index, parent.index)
+        children = s.legacy_links[1]
+        del s.legacy_links
+        to_visit += [(c, s) for c in reversed(children)]
+
 def simplify_solution(s: Step):
     # simplify step
     for p in s.get_pairs():
@@ -347,15 +611,521 @@ def simplify_solution(s: Step):
     for c in s.children:
         simplify_solution(c)
 
+##############
+## FRONTIER ##
+##############
+class Frontier(ABC):
+    """
+    Pairs waiting to be expanded.
+    The strategy of the frontier decides which pair is popped next, push/pop are O(1) or O(log n).
+    """
+    @abstractmethod
+    def push(self, pair: ActionPair):
+        pass
+
+    @abstractmethod
+    def pop(self) -> ActionPair:
+        pass
+
+    def extend(self, pairs: List[ActionPair]):
+        for p in pairs:
+            self.push(p)
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def __iter__(self):
+        """ Pairs in the order they would be popped, used to mark them unexplored or to save them in a checkpoint """
+        pass
+
+class BFSFrontier(Frontier):
+    def __init__(self):
+        self.pairs = deque() #type: deque[ActionPair]
+
+    def push(self, pair: ActionPair):
+        self.pairs.append(pair)
+
+    def pop(self) -> ActionPair:
+        return self.pairs.popleft()
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+class DFSFrontier(Frontier):
+    def __init__(self):
+        self.pairs = [] #type: List[ActionPair]
+
+    def push(self, pair: ActionPair):
+        self.pairs.append(pair)
+
+    def extend(self, pairs: List[ActionPair]):
+        # reversed, so that the first given pair is the next one popped
+        self.pairs += pairs[::-1]
+
+    def pop(self) -> ActionPair:
+        return self.pairs.pop()
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        return iter(self.pairs[::-1])
+
+class BestFirstFrontier(Frontier):
+    def __init__(self, key):
+        self.key = key # lowest key popped first
+        self.heap = [] # (key, insertion_nb, pair)
+        self.nb_pushed = 0 # FIFO among pairs with the same key
+
+    def push(self, pair: ActionPair):
+        heapq.heappush(self.heap, (self.key(pair), self.nb_pushed, pair))
+        self.nb_pushed += 1
+
+    def pop(self) -> ActionPair:
+        return heapq.heappop(self.heap)[2]
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return (entry[2] for entry in sorted(self.heap, key=lambda e: e[:2]))
+
+def depth_key(pair: ActionPair):
+    return get_partial_metrics(pair)["TimeTaskCompletion"]
+
+def nb_worlds_key(pair: ActionPair):
+    return len(pair.possible_worlds_for_h)
+
+def get_metrics_key(criteria):
+    def metrics_key(pair: ActionPair):
+        return get_metrics_tuple(get_partial_metrics(pair), criteria)
+    return metrics_key
+
+def create_frontier(strategy="BFS", criteria=None) -> Frontier:
+    """
+    strategy:
+        "BFS"       : breadth-first
+        "DFS"       : depth-first
+        "DEPTH"     : best-first, shallowest pair first
+        "WORLDS"    : best-first, pair with the fewest possible worlds for H first
+        "METRICS"   : best-first, pair with the best partial branch metrics w.r.t. criteria
+                      (default criteria: get_exec_prefs()["task_end_early"])
+    """
+    if strategy == "BFS":
+        return BFSFrontier()
+    elif strategy == "DFS":
+        return DFSFrontier()
+    elif strategy == "DEPTH":
+        return BestFirstFrontier(depth_key)
+    elif strategy == "WORLDS":
+        return BestFirstFrontier(nb_worlds_key)
+    elif strategy == "METRICS":
+        if criteria == None:
+            criteria = get_exec_prefs()["task_end_early"]
+        return BestFirstFrontier(get_metrics_key(criteria))
+    else:
+        raise Exception("Unknown frontier strategy {}".format(strategy))
+
+#############
+## CONTEXT ##
+#############
+def in_context(explore_function):
+    """
+    Adds a context argument to the exploration function, the exploration then runs in this CM.ExplorationContext
+    (see CM.use_context()), by default in the current one
+    """
+    @functools.wraps(explore_function)
+    def explore_in_context(*args, context=None, **kwargs):
+        with CM.use_context(context):
+            return explore_function(*args, **kwargs)
+    return explore_in_context
+
+############
+## BUDGET ##
+############
+class ExplorationBudget:
+    """
+    Limits of an exploration, checked before each expansion (None: no limit)
+        max_states  : number of expanded pairs
+        time_budget : wall-clock time in seconds
+        max_rss     : peak resident memory of the (main) process in MB
+    Once a limit is reached the exploration stops, the name of the limit is kept in triggered
+    """
+    def __init__(self, max_states=None, time_budget=None, max_rss=None):
+        self.max_states = max_states
+        self.time_budget = time_budget
+        self.max_rss = max_rss
+        self.start_time = time.time()
+        self.nb_expanded = 0
+        self.triggered = None
+
+    def is_exhausted(self) -> bool:
+        if self.triggered == None:
+            if self.max_states != None and self.nb_expanded >= self.max_states:
+                self.triggered = "max_states"
+            elif self.time_budget != None and time.time() - self.start_time >= self.time_budget:
+                self.triggered = "time_budget"
+            elif self.max_rss != None and get_peak_rss() >= self.max_rss:
+                self.triggered = "max_rss"
+        return self.triggered != None
+
+def get_peak_rss():
+    """ Peak resident memory of the process in MB (ru_maxrss is in bytes on macOS, in KB otherwise) """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / 2**20
+    return rss / 2**10
+
+def mark_unexplored(pairs):
+    """ Pairs left to expand when the exploration stopped """
+    for p in pairs:
+        if not p.cancelled:
+            p.unexplored = True
+
+def report_budget(init_step: Step, budget: ExplorationBudget):
+    init_step.stopped_by = budget.triggered
+    if budget.triggered != None:
+        print("exploration stopped by " + budget.triggered + " after " + str(budget.nb_expanded) + " expanded pairs")
+
+################
+## CHECKPOINT ##
+################
+class Checkpointer:
+    """
+    Writes a checkpoint of the exploration in CM.path + file_name every `every` seconds, see resume_exploration()
+    A checkpoint holds the Step tree, the frontier, the transposition table, the options of explore_ANDOR and
+    the counters of the context (ids of tasks and steps, max_number_of_worlds_evaluated) and the WorldPool, dumped with dill and gzip.
+    When possible it is written by a forked process, thus the exploration goes on meanwhile.
+    """
+    def __init__(self, file_name=None, every=600, options=None):
+        self.file_name = file_name # None: no checkpoint
+        self.every = every
+        self.options = options
+        self.last_time = time.time()
+        self.writer_pid = None
+
+    def tick(self, init_step: Step, goal_test, frontier, transposition_table, budget: ExplorationBudget, force=False):
+        """ Writes a checkpoint if the last one is old enough (or if forced), to call between two expansions """
+        if self.file_name != None and (force or time.time() - self.last_time >= self.every):
+            self.write(init_step, goal_test, frontier, transposition_table, budget)
+            self.last_time = time.time()
+
+    def write(self, init_step: Step, goal_test, frontier, transposition_table, budget: ExplorationBudget):
+        context = CM.get_context()
+        checkpoint = {
+            "domain_name" : context.domain_name,
+            "options" : self.options,
+            "init_step" : init_step,
+            "goal_test" : goal_test,
+            "frontier" : frontier,
+            "transposition_table" : transposition_table,
+            "nb_expanded" : budget.nb_expanded,
+            "task_next_id" : context.task_next_id,
+            "step_next_id" : context.step_next_id,
+            "max_number_of_worlds_evaluated" : context.max_number_of_worlds_evaluated,
+            "world_pool" : context.world_pool,
+        }
+        if not hasattr(os, "fork"):
+            write_checkpoint(CM.path + self.file_name, checkpoint)
+            return
+        self.wait_writer()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                write_checkpoint(CM.path + self.file_name, checkpoint)
+            except Exception as e:
+                print("checkpoint failed: " + str(e))
+            finally:
+                os._exit(0)
+        self.writer_pid = pid
+
+    def wait_writer(self):
+        """ Waits for the previous checkpoint to be written """
+        if self.writer_pid != None:
+            os.waitpid(self.writer_pid, 0)
+            self.writer_pid = None
+
+def write_checkpoint(file_path, checkpoint):
+    # written next to the previous checkpoint, which is replaced only once complete
+    sys.setrecursionlimit(100000)
+    with gzip.open(file_path + ".tmp", "wb", compresslevel=3) as f:
+        dill.dump(checkpoint, f, protocol=dill.HIGHEST_PROTOCOL)
+    os.replace(file_path + ".tmp", file_path)
+
+@in_context
+def resume_exploration(checkpoint, max_states = None, time_budget = None, max_rss = None, checkpoint_every = 600):
+    """
+    Continues the exploration saved in the checkpoint file CM.path + checkpoint (see Checkpointer), with the same
+    options, and keeps writing checkpoints in it. The domain has to be initialized first, as for explore_ANDOR().
+    max_states counts the pairs expanded before the checkpoint too.
+    Returns the initial step, as explore_ANDOR()
+    context: CM.ExplorationContext to resume the exploration in, by default the current one (see CM.get_context())
+    """
+    sys.setrecursionlimit(100000)
+    with gzip.open(CM.path + checkpoint, "rb") as f:
+        saved = dill.load(f)
+    context = CM.get_context()
+    if saved["domain_name"] != context.domain_name:
+        raise Exception("Checkpoint of domain {} while domain {} is initialized".format(saved["domain_name"], context.domain_name))
+
+    context.task_next_id = saved["task_next_id"]
+    context.step_next_id = saved["step_next_id"]
+    context.max_number_of_worlds_evaluated = saved["max_number_of_worlds_evaluated"]
+    context.world_pool = saved.get("world_pool", WorldPool())
+
+    init_step = saved["init_step"]
+    # the listener of the interrupted search
+    init_step.get_pairs()[0].solved_listeners = []
+
+    budget = ExplorationBudget(max_states, time_budget, max_rss)
+    budget.nb_expanded = saved["nb_expanded"]
+    checkpointer = Checkpointer(checkpoint, checkpoint_every, saved["options"])
+
+    return run_AND_OR_search(init_step, saved["goal_test"], saved["options"], budget, checkpointer, saved["frontier"], saved["transposition_table"])
+
+################
+## WORLD POOL ##
+################
+class WorldPool:
+    """
+    Possible worlds of an exploration, each unique world (see get_world_fingerprint()) is stored once, and a set of
+    worlds (belief of H in a pair) is an int bitset of their indexes. The worlds of the pool are frozen
+    (see CM.freeze_agents()), code changing the worlds of a pair works on a snapshot() of it.
+    """
+    def __init__(self):
+        self.worlds = [] #type: List[CM.FrozenAgents]
+        self.indexes = {} # world fingerprint -> index in worlds
+        self.decoded = {} # belief -> tuple of its worlds, see get_worlds()
+
+    def intern(self, world: CM.Agents):
+        """ Index of the world in the pool, a copy of it is added if it isn't in yet """
+        key = get_world_fingerprint(world)
+        i = self.indexes.get(key)
+        if i == None:
+            i = len(self.worlds)
+            self.indexes[key] = i
+            world = deepcopy(world)
+            CM.freeze_agents(world)
+            self.worlds.append(world)
+        return i
+
+    def get_belief(self, worlds):
+        belief = 0
+        for w in worlds:
+            belief |= 1 << self.intern(w)
+        return belief
+
+    def get_worlds(self, belief):
+        """ Tuple of the worlds of the belief, decoded once per belief """
+        worlds = self.decoded.get(belief)
+        if worlds == None:
+            worlds = []
+            bits = belief
+            while bits:
+                bit = bits & -bits
+                worlds.append(self.worlds[bit.bit_length() - 1])
+                bits ^= bit
+            worlds = tuple(worlds)
+            self.decoded[belief] = worlds
+        return worlds
+
+def get_world_pool():
+    """ WorldPool of the current exploration """
+    context = CM.get_context()
+    if context.world_pool == None:
+        context.world_pool = WorldPool()
+    return context.world_pool
+
+####################
+## TRANSPOSITIONS ##
+####################
+def get_world_fingerprint(agents: CM.Agents, renaming=None):
+    return (CM.get_state_fingerprint(agents.state, renaming=renaming),
+            CM.get_agenda_fingerprint(agents["R"].agenda, renaming),
+            CM.get_agenda_fingerprint(agents["H"].agenda, renaming))
+
+def get_action_fingerprint(action: CM.Action):
+    # only passive actions change how the next pair is expanded (acting agent, final/double passive pairs)
+    if action.is_passive():
+        return tuple(action.parameters)
+    return "GET_SIGNAL" in action.name
+
+def get_situation_fingerprint(pair: ActionPair, acting_agent):
+    """
+    Key of the situation reached by the pair (designated world, possible worlds for H, acting agent),
+    to be computed once the situation assessment is done. Computed once and kept in the pair.
+    """
+    if pair.situation_fingerprint == None:
+        if CM.get_context().symmetry_renamings != []:
+            pair.situation_fingerprint, pair.symmetry_renaming = get_canonical_fingerprint(pair.end_agents,
+                pair.possible_worlds_for_h, (acting_agent, pair.copresence))
+        else:
+            # same belief bitset iff same set of world fingerprints (see WorldPool)
+            pair.situation_fingerprint = (get_world_fingerprint(pair.end_agents),
+                                          pair.belief if pair.belief != None else frozenset(get_world_fingerprint(w) for w in pair.possible_worlds_for_h),
+                                          acting_agent,
+                                          pair.copresence)
+    return pair.situation_fingerprint
+
+def get_pair_fingerprint(pair: ActionPair, acting_agent):
+    """
+    Key of the situation reached by the pair, to be computed once the situation assessment is done.
+    Two pairs with the same key are expanded identically.
+    """
+    return get_situation_fingerprint(pair, acting_agent) + (pair.node_type,
+            get_action_fingerprint(pair.human_action),
+            get_action_fingerprint(pair.robot_action))
+
+def is_ancestor(ancestor: ActionPair, pair: ActionPair):
+    while pair != None:
+        if pair == ancestor:
+            return True
+        pair = pair.previous
+    return False
+
+def get_transposition(transposition_table, pair: ActionPair, acting_agent):
+    """
+    Returns the already expanded pair in the same situation as the given one, and links them, or None.
+    Otherwise the pair is registered in the table as expanded.
+    A situation reached again in its own branch (cycle) is expanded again.
+    """
+    key = get_pair_fingerprint(pair, acting_agent)
+    canonical = transposition_table.get(key)
+    if canonical == None or canonical.cancelled:
+        transposition_table[key] = pair
+        return None
+    if is_ancestor(canonical, pair):
+        return None
+    link_transposition(pair, canonical)
+    return canonical
+
+def link_transposition(pair: ActionPair, canonical: ActionPair):
+    pair.transposition_of = canonical
+    pair.transposition_renaming = get_renaming_between(pair.symmetry_renaming, canonical.symmetry_renaming)
+    canonical.transpositions.append(pair)
+
+#######################
+## SYMMETRIC OBJECTS ##
+#######################
+def get_ordering_key(data):
+    """ Key of a fingerprint for a total order which, unlike hash(), is the same in every process """
+    data_type = type(data)
+    if data_type is tuple:
+        return (0, tuple(map(get_ordering_key, data)))
+    if data_type is frozenset:
+        return (1, tuple(sorted(map(get_ordering_key, data))))
+    if data_type is str:
+        return (2, "str", data)
+    return (2, data_type.__name__, repr(data))
+
+def get_canonical_fingerprint(agents: CM.Agents, possible_worlds, other):
+    """
+    Fingerprint of a situation (designated world, possible worlds, other) up to the symmetric objects declared
+    by the domain (see CM.declare_symmetric_objects()): among the fingerprints of the situation with the objects
+    permuted, the lowest one w.r.t. get_ordering_key(), so that a resumed exploration gets the same canonical form.
+    The designated worlds are compared first, the possible worlds only for the renamings tied on it.
+    Returns it with the renaming giving it.
+    """
+    keys = {} # ordering key of each distinct fingerprint, many renamings give the same one
+    def get_key(fingerprint):
+        if not fingerprint in keys:
+            keys[fingerprint] = get_ordering_key(fingerprint)
+        return keys[fingerprint]
+
+    best_key, candidates = None, []
+    for renaming in CM.get_context().symmetry_renamings:
+        world_fingerprint = get_world_fingerprint(agents, renaming)
+        key = get_key(world_fingerprint)
+        if best_key == None or key < best_key:
+            best_key, candidates = key, [(renaming, world_fingerprint)]
+        elif key == best_key:
+            candidates.append((renaming, world_fingerprint))
+
+    best, best_key, best_renaming = None, None, None
+    for renaming, world_fingerprint in candidates:
+        worlds_fingerprint = frozenset(get_world_fingerprint(w, renaming) for w in possible_worlds)
+        key = get_key(worlds_fingerprint) if len(candidates) > 1 else None
+        if best == None or key < best_key:
+            best, best_key, best_renaming = (world_fingerprint, worlds_fingerprint) + other, key, renaming
+    return best, best_renaming
+
+def get_renaming_between(renaming, canonical_renaming):
+    """ Objects of a situation to the ones of a symmetric situation, given the renamings giving their common fingerprint """
+    if renaming == None or canonical_renaming == None:
+        return None
+    inverse = {new_o: o for o, new_o in canonical_renaming.items()}
+    between = {}
+    for o in set(renaming) | set(inverse):
+        new_o = inverse.get(renaming.get(o, o), renaming.get(o, o))
+        if new_o != o:
+            between[o] = new_o
+    return between if between != {} else None
+
+def collapse_symmetric_pairs(pairs: List[ActionPair]) -> List[ActionPair]:
+    """
+    Among sibling pairs, a pair reaching the same situation as a previous one up to the symmetric objects
+    isn't explored but linked to it as a transposition (see link_transposition())
+    Only for the AND/OR search with transpositions, which gives the linked pairs the status and policy of the other one
+    Returns the pairs to explore
+    """
+    if CM.get_context().symmetry_renamings == []:
+        return pairs
+    first_pairs = {}
+    to_explore = []
+    for p in pairs:
+        key, p.symmetry_renaming = get_canonical_fingerprint(p.end_agents, p.possible_worlds_for_h,
+            (p.node_type, get_action_fingerprint(p.human_action), get_action_fingerprint(p.robot_action)))
+        if key in first_pairs:
+            link_transposition(p, first_pairs[key])
+        else:
+            first_pairs[key] = p
+            to_explore.append(p)
+    return to_explore
+
+############
+## CYCLES ##
+############
+def is_cycle(pair: ActionPair, acting_agent):
+    """
+    Whether the assessed pair reaches a situation already reached in its branch and would be expanded the same way
+    (same key as in the transposition table, see get_pair_fingerprint()). Each expanded pair keeps its key,
+    the branch is walked up to the root, no per-branch set is copied.
+    """
+    fingerprint = get_pair_fingerprint(pair, acting_agent)
+    p = pair.previous
+    while p != None:
+        if p.cycle_fingerprint == fingerprint:
+            return True
+        p = p.previous
+    pair.cycle_fingerprint = fingerprint
+    return False
+
 #############
 ## EXPLORE ##
 #############
-def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, ""]):
+@in_context
+def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, ""], frontier_strategy = "DFS", criteria = None, n_workers = 1,
+            max_states = None, time_budget = None, max_rss = None):
+    """
+    frontier_strategy: order in which pairs are explored, see create_frontier()
+    criteria: only used by the "METRICS" frontier strategy
+    n_workers: if > 1, pairs are expanded by this number of processes (only with tt_explore)
+    max_states, time_budget, max_rss: limits of the exploration, see ExplorationBudget. If one is reached, the partial
+        tree is returned, pairs left to expand are marked unexplored and the limit is given in init_step.stopped_by
+    context: CM.ExplorationContext to run the exploration in, by default the current one (see CM.get_context())
+    """
+    budget = ExplorationBudget(max_states, time_budget, max_rss)
+    CM.get_context().world_pool = WorldPool()
     # lg.info(CM.str_init())
 
     # Generate initial step
     # init agents
-    initial_agents = deepcopy(CM.g_static_agents)
+    initial_agents = deepcopy(CM.get_context().static_agents)
 
     # if we need to signal apart from communication
     # allowed_to_signal = False
@@ -373,7 +1143,7 @@ def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, "
     init_pair = ActionPair(begin_action_H, begin_action_R, initial_agents, initial_possible_worlds_for_h)
     
     # shashank for the AND-OR search
-    if(CM.g_starting_agent == "H"):
+    if(CM.get_context().starting_agent == "H"):
         init_pair.set_it_as_and_node("AND")
         init_pair.set_it_done("NOT_DONE")
     else:
@@ -389,26 +1159,27 @@ def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, "
     lg.debug(f"{init_step.str()}")
 
     # Several exploration steps
-    MULTI_THREADING = False
-    if  MULTI_THREADING:
-        e = concurrent.futures.ThreadPoolExecutor(max_workers=10)
-        pairs_to_explore = [init_pair]
-        e.submit(recursive_loop_explo_para, e, pairs_to_explore)
-        e.shutdown(wait=True)
-        print("done")
+    if n_workers > 1:
+        if not tt_explore:
+            raise Exception("Parallel exploration is only available with tt_explore")
+        fun_AND_OR_search_parallel([init_pair], allowed_to_signal, goal_test, create_frontier(frontier_strategy, criteria), n_workers, and_or=False, budget=budget)
     else:
-        pairs_to_explore = [] # order=priority
-        pairs_to_explore.append(init_pair)
+        pairs_to_explore = create_frontier(frontier_strategy, criteria)
+        pairs_to_explore.push(init_pair)
         bar = IncrementalBar("Exploring", max=len(pairs_to_explore), width=60, suffix='%(index)d/%(max)d - %(elapsed_td)s')
 
         ## need to understand this
         # already_explored = []
-        while pairs_to_explore != []:
-            lg.debug(f"\nNEW STEP:\npairs to explore:\n\t{pairs_to_explore}")
+        while len(pairs_to_explore) > 0:
+            if budget.is_exhausted():
+                mark_unexplored(pairs_to_explore)
+                break
+            lg.debug(f"\nNEW STEP:\npairs to explore:\n\t{list(pairs_to_explore)}")
             if tt_explore:
-                pairs_to_explore = exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test)                
+                pairs_to_explore = exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test)
             else:
                 pairs_to_explore = exploration_step(pairs_to_explore)
+            budget.nb_expanded += 1
             lg.debug(RenderTree(init_step))
             
             # progress bar #
@@ -417,10 +1188,10 @@ def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, "
             ##########
         bar.finish()
 
-        global max_number_of_worlds_evaluated
-        print("maximum numbers of world evaluated: " + str(max_number_of_worlds_evaluated))
+        print("maximum numbers of world evaluated: " + str(CM.get_context().max_number_of_worlds_evaluated))
 
     # print(f"Number of leaves: {len(init_step.get_final_leaves())}")
+    report_budget(init_step, budget)
 
     compute_metrics(init_step.get_final_leaves())
 
@@ -429,15 +1200,47 @@ def explore(tt_explore = False, allowed_to_signal = False, goal_test = [False, "
 ################################
 ## EXPLORE for an AND/OR TREE ##
 ################################
-def explore_ANDOR(tt_explore = False, allowed_to_signal = False, goal_test = []):
-    
+@in_context
+def explore_ANDOR(tt_explore = False, allowed_to_signal = False, goal_test = [], frontier_strategy = "BFS", criteria = None, transpositions = False, n_workers = 1, lazy_or = False,
+                  max_states = None, time_budget = None, max_rss = None, checkpoint_file = None, checkpoint_every = 600):
+    """
+    frontier_strategy: order in which pairs are explored, see create_frontier()
+    criteria: only used by the "METRICS" frontier strategy
+    transpositions: pairs reaching an already expanded situation are not expanded again
+                    but share the sub-tree of the first one (see get_transposition()), which is copied under
+                    each of them in the returned policy (see copy_shared_policy())
+                    If the domain declares symmetric objects (see CM.declare_symmetric_objects()), situations
+                    equal up to a permutation of them are transpositions, and symmetric sibling pairs are collapsed
+    n_workers: if > 1, pairs are expanded by this number of processes, see fun_AND_OR_search_parallel()
+    lazy_or: the children of OR pairs are generated one at a time, the next one only when the previous
+             ones are pass or FAILED (see RobotChildren), not available with n_workers > 1
+    With frontier_strategy="AOSTAR", the AO* search returns the optimal policy w.r.t. criteria
+    (default criteria: get_exec_prefs()["task_end_early"]), see fun_AND_OR_search_aostar()
+    max_states, time_budget, max_rss: limits of the exploration, see ExplorationBudget. If one is reached, the policy
+        found so far is returned, pairs left to expand are marked unexplored and the limit is given in init_step.stopped_by
+    checkpoint_file: if given, the exploration is saved in CM.path + checkpoint_file every checkpoint_every seconds,
+        and can be continued with resume_exploration() (not available with n_workers > 1)
+    context: CM.ExplorationContext to run the exploration in, by default the current one (see CM.get_context())
+    """
+    budget = ExplorationBudget(max_states, time_budget, max_rss)
+    options = {
+        "allowed_to_signal" : allowed_to_signal,
+        "frontier_strategy" : frontier_strategy,
+        "criteria" : criteria,
+        "transpositions" : transpositions,
+        "n_workers" : n_workers,
+        "lazy_or" : lazy_or,
+    }
+    checkpointer = Checkpointer(checkpoint_file, checkpoint_every, options)
+    CM.get_context().world_pool = WorldPool()
+
     goal_test = [False, ""]
 
     # lg.info(CM.str_init())
 
     # Generate initial step
     # init agents
-    initial_agents = deepcopy(CM.g_static_agents)      
+    initial_agents = deepcopy(CM.get_context().static_agents)      
 
     # the idea is to maintain possibe worlds that do not exist in reality however the human cannot differentiate 
     # them with the real designated world -- I.e. initial/end_agent 
@@ -449,7 +1252,7 @@ def explore_ANDOR(tt_explore = False, allowed_to_signal = False, goal_test = [])
     init_pair = ActionPair(begin_action_H, begin_action_R, initial_agents, initial_possible_worlds_for_h)
     
     # shashank for the AND-OR search
-    if(CM.g_starting_agent == "H"):
+    if(CM.get_context().starting_agent == "H"):
         init_pair.set_it_as_and_node("AND")
         init_pair.set_it_done("NOT_DONE")
     else:
@@ -464,64 +1267,212 @@ def explore_ANDOR(tt_explore = False, allowed_to_signal = False, goal_test = [])
     init_step.CRA = begin_action_R
     lg.debug(f"{init_step.str()}")
 
+    return run_AND_OR_search(init_step, goal_test, options, budget, checkpointer)
+
+def run_AND_OR_search(init_step: Step, goal_test, options, budget: ExplorationBudget, checkpointer: Checkpointer, frontier=None, transposition_table=None):
+    """
+    Exploration from init_step with the options of explore_ANDOR(), then metrics and policy extraction
+    frontier and transposition_table are given when resuming an exploration, see resume_exploration()
+    """
+    init_pair = init_step.get_pairs()[0]
+    allowed_to_signal = options["allowed_to_signal"]
+    frontier_strategy = options["frontier_strategy"]
+    criteria = options["criteria"]
+    transpositions = options["transpositions"]
+    n_workers = options["n_workers"]
+    lazy_or = options["lazy_or"]
+
     # Several exploration steps
-    MULTI_THREADING = False
-    if  MULTI_THREADING:
-        e = concurrent.futures.ThreadPoolExecutor(max_workers=10)
-        pairs_to_explore = [init_pair]
-        e.submit(recursive_loop_explo_para, e, pairs_to_explore)
-        e.shutdown(wait=True)
-        print("done")
+    if frontier_strategy == "AOSTAR":
+        if n_workers > 1 or transpositions or lazy_or or CM.get_context().symmetric_objects != []:
+            raise Exception("AOSTAR is not available with n_workers > 1, transpositions, lazy_or or symmetric objects")
+        if criteria == None:
+            criteria = get_exec_prefs()["task_end_early"]
+        fun_AND_OR_search_aostar([init_pair], allowed_to_signal, goal_test, criteria, budget, checkpointer)
+    elif n_workers > 1:
+        if lazy_or:
+            raise Exception("lazy_or is not available with n_workers > 1")
+        if checkpointer.file_name != None:
+            raise Exception("Checkpoints are not available with n_workers > 1")
+        frontier = create_frontier(frontier_strategy, criteria)
+        fun_AND_OR_search_parallel([init_pair], allowed_to_signal, goal_test, frontier, n_workers, transpositions, budget=budget)
     else:               
         pairs_to_explore = [] # order=priority
         pairs_to_explore.append(init_pair)
 
         # NOTE: for now allowing the robot to choose PASS first when using AND/OR search will not work
-        fun_AND_OR_search_new(pairs_to_explore, allowed_to_signal, goal_test)
+        if frontier == None:
+            frontier = create_frontier(frontier_strategy, criteria)
+        if transposition_table == None and transpositions:
+            transposition_table = {}
+        fun_AND_OR_search_new(pairs_to_explore, allowed_to_signal, goal_test, frontier, transposition_table, lazy_or, budget, checkpointer)
         # fun_AND_OR_search(pairs_to_explore, allowed_to_signal, goal_test)
 
         # if(pairs_to_explore[0].node_done != "DONE"):
         #     print("ERROR!!")
 
     # print(f"Number of leaves: {len(init_step.get_final_leaves())}")   
+    report_budget(init_step, budget)
 
-    compute_metrics(init_step.get_final_leaves())    
-
+    remove_cancelled_pairs(init_step)
+    # after the extraction, which copies the sub-policies shared by transpositions
     extract_complete_andor_policy (init_step)
+    check_policy_leaves(init_step)
+
+    compute_metrics(init_step.get_final_leaves())    
 
     return init_step
 
 # extract policy:
-def extract_complete_andor_policy(init_step):
+# the sub-policy of a pair shared by transpositions is copied under each of them (see copy_shared_policy()),
+# thus every branch of the policy ends with its own final leaf
+def extract_complete_andor_policy(init_step, extracted=None, in_progress=None):
+    """
+    Keeps in the step tree only the policy: every DONE child of an AND pair, the best (or first) DONE child of an OR pair.
+    Returns False if the policy from init_step goes through the sub-policy of a transposition being extracted (cycle),
+    the OR pair above then takes another DONE child.
+    """
+    if extracted == None:
+        extracted, in_progress = set(), set()
+    if init_step in extracted:
+        return True
     if init_step.from_pair != None or init_step.depth == 0:
         policy = init_step.from_pair
         if policy == None:
             print()
         if policy == None and init_step.depth == 0:   
-            extract_complete_andor_policy(init_step.children[0])
-            return 
+            # nothing expanded if the exploration was stopped right away
+            if init_step.children != ():
+                extract_complete_andor_policy(init_step.children[0], extracted, in_progress)
+            return True
+        in_progress.add(init_step)
+        children = []
         if policy.node_type == "AND":
-            children = []
-            for child in init_step.children:
-                if child.from_pair.node_done == "DONE":
+            for pair, child in get_policy_candidates(init_step):
+                if pair.node_done == "DONE":
+                    child = extract_policy_child(pair, child, extracted, in_progress)
+                    if child == None:
+                        in_progress.remove(init_step)
+                        return False
                     children.append(child)
-                    extract_complete_andor_policy(child)
-            init_step.children = children
         elif policy.node_type == "OR":
-            children = []
-            for child in init_step.children:
-                if child.from_pair.node_done == "DONE":
-                    children.append(child)
-                    extract_complete_andor_policy(child)
-                    break
-            init_step.children = children
-        
-        return init_step
+            for pair, child in get_policy_candidates(init_step):
+                if pair.node_done == "DONE" and (policy.best_child == None or pair == policy.best_child):
+                    child = extract_policy_child(pair, child, extracted, in_progress)
+                    if child != None:
+                        children.append(child)
+                        break
+            if children == [] and policy.node_done == "DONE":
+                in_progress.remove(init_step)
+                return False
+        in_progress.remove(init_step)
+        init_step.children = children
+        extracted.add(init_step)
+    return True
+
+def check_policy_leaves(init_step: Step):
+    """ Every branch of a solved policy ends with a final leaf, not e.g. with a transposition without its shared sub-policy """
+    if init_step.get_pairs()[0].node_done != "DONE":
+        return
+    for leaf in init_step.leaves:
+        if not leaf.is_final():
+            raise Exception("Branch of the policy ending with the non final step {}".format(leaf))
+
+def get_policy_candidates(step: Step):
+    """ (pair, step following it) for the pairs of the step which can be in the policy, the step is None for a transposition """
+    candidates = [(c.from_pair, c) for c in step.children]
+    for p in step.get_pairs():
+        if p.next == [] and p.transposition_of != None and get_shared_policy_pair(p).next != []:
+            candidates.append((p, None))
+    return candidates
+
+def get_shared_policy_pair(pair: ActionPair):
+    """ Expanded pair whose sub-tree is shared by the given transposition """
+    canonical = pair.transposition_of
+    while canonical.next == [] and canonical.transposition_of != None:
+        canonical = canonical.transposition_of
+    return canonical
+
+def extract_policy_child(pair: ActionPair, child, extracted, in_progress):
+    """
+    Extracts the policy from the child step of the pair, or from the step shared by the pair as a transposition
+    and copies it as the child step of the pair. Returns the child step, or None if it makes a cycle.
+    """
+    if child != None:
+        return child if extract_complete_andor_policy(child, extracted, in_progress) else None
+    shared_step = get_shared_policy_pair(pair).next[0].get_in_step()
+    if shared_step in in_progress or not extract_complete_andor_policy(shared_step, extracted, in_progress):
+        return None
+    return copy_shared_policy(shared_step, pair, pair.get_in_step(), get_shared_policy_renaming(pair))
+
+def get_shared_policy_renaming(pair: ActionPair):
+    """
+    Objects of the pair sharing its sub-policy (see get_shared_policy_pair()) to the ones of the given transposition,
+    None if they are the same. Inverse of the transposition_renaming of each transposition up to this pair.
+    """
+    renaming = None
+    while pair.next == [] and pair.transposition_of != None:
+        if pair.transposition_renaming != None:
+            inverse = {new_o: o for o, new_o in pair.transposition_renaming.items()}
+            renaming = get_composed_renaming(inverse, renaming)
+        pair = pair.transposition_of
+    return renaming
+
+def get_composed_renaming(first, then):
+    """ Renaming applying first then then (either may be None for no renaming), None if it renames nothing """
+    first = {} if first == None else first
+    then = {} if then == None else then
+    composed = {}
+    for o in set(first) | set(then):
+        new_o = then.get(first.get(o, o), first.get(o, o))
+        if new_o != o:
+            composed[o] = new_o
+    return composed if composed != {} else None
+
+def copy_shared_policy(step: Step, from_pair: ActionPair, parent: Step, renaming=None):
+    """
+    Copies the extracted policy from step as the step following from_pair, a transposition of step.from_pair.
+    The copied pairs share the actions, agents and possible worlds of the original ones, unless the transposition
+    is symmetric (see get_canonical_fingerprint()): they are then renamed for the objects of from_pair.
+    """
+    new_step = Step(parent=parent)
+    copies = {}
+    human_options = []
+    for ho in step.human_options:
+        pairs = []
+        for p in ho.action_pairs:
+            copies[p] = copy_policy_pair(p, renaming)
+            pairs.append(copies[p])
+        human_options.append(HumanOption(pairs))
+    new_step.init(human_options, from_pair)
+    new_step.CRA = step.CRA if renaming == None else [CM.get_renamed_task(a, renaming) for a in step.CRA]
+    for child in step.children:
+        copy_shared_policy(child, copies[child.from_pair], new_step, renaming)
+    return new_step
+
+def copy_policy_pair(pair: ActionPair, renaming=None):
+    """
+    Pair of a copied sub-policy (see copy_shared_policy()), its status, agents and possible worlds are shared,
+    or renamed copies if renaming is given
+    """
+    if renaming != None:
+        copy = ActionPair(CM.get_renamed_task(pair.human_action, renaming), CM.get_renamed_task(pair.robot_action, renaming),
+                          CM.get_renamed_agents(pair.end_agents, renaming),
+                          [CM.get_renamed_agents(w, renaming) for w in pair.possible_worlds_for_h])
+    else:
+        copy = ActionPair(pair.human_action, pair.robot_action, pair.end_agents, pair.worlds)
+        copy.belief = pair.belief
+        copy.world_pool = pair.world_pool
+    copy.copresence = pair.copresence
+    copy.node_done = pair.node_done
+    copy.node_pass = pair.node_pass
+    copy.situation_fingerprint = pair.situation_fingerprint
+    return copy
     
 
 ##############
 def is_goal_node(pair_to_explore, allowed_to_signal):
-    children = exploration_step_tt(pair_to_explore, allowed_to_signal) 
+    children = expand_pair_tt(pair_to_explore, allowed_to_signal, [False, ""])
     if children == []:
         return True
     else:
@@ -537,86 +1488,209 @@ def is_root_solved(root):
     return False
 
 
-def regress_new_status_backward(element):
-    if element.node_done == "DONE" or element.node_pass == "pass":
+def set_solved(pair: ActionPair):
+    """ Sets the pair DONE and notifies its listeners (e.g. the search loop when the root is solved) """
+    pair.node_done = "DONE"
+    for listener in pair.solved_listeners:
+        listener(pair)
+
+def is_resolved(pair: ActionPair):
+    """ Whether the status of the pair is known: DONE, FAILED or pass """
+    return pair.node_done == "DONE" or pair.node_done == "FAILED" or pair.node_pass == "pass"
+
+def set_status_from(pair: ActionPair, other: ActionPair):
+    """ The pair gets the known status of other """
+    if other.node_done == "DONE":
+        set_solved(pair)
+    elif other.node_done == "FAILED":
+        pair.node_done = "FAILED"
+    pair.node_pass = other.node_pass
+
+def regress_new_status_backward(element, frontier=None):
+    """
+    Propagates the new status of element (DONE, FAILED or pass) to its ancestors.
+    Each pair counts its children not solved yet (set in attach_pairs_tt), so the update is O(1)
+    for each ancestor and stops at the first one whose status doesn't change.
+    An AND pair fails with any of its children. A lazily expanded OR pair (see RobotChildren) generates
+    its next child, added in the frontier, when the explored one is pass or FAILED, and fails once it has no more children.
+    """
+    if is_resolved(element):
+        regress_to_transpositions(element, frontier)
         parent = element.previous
-        if parent.node_done == "DONE":
-            return
-        while parent != None:
+        while parent != None and not is_resolved(parent):
+            if element.node_done != "FAILED":
+                parent.nb_unsolved_children -= 1
             if(parent.node_type == "OR"):
-                for child in parent.next:
-                    if child.node_pass == "pass":
-                        continue
-                    if child.node_done == "DONE":
-                        parent.node_done = "DONE"
-                        break
-                if parent.previous != None:
-                    parent = parent.previous    
-                    if parent.node_done == "DONE":
-                        return     
-                else:
-                    return
-            elif(parent.node_type == "AND"):
-                for child in parent.next:
-                    if child.node_pass == "pass":
-                        continue
-                    if child.node_done != "DONE":
+                if element.node_done != "DONE":
+                    if parent.robot_children == None:
                         return
-                # if len(parent.next) > 1:
-                parent.node_done = "DONE"
-                # else:
-                #     parent.node_pass = "pass"
-                if parent.previous != None:
-                    parent = parent.previous
-                    if parent.node_done == "DONE":
-                        return       
+                    children = pull_robot_children(parent)
+                    if children != []:
+                        frontier.extend(children)
+                        return
+                    parent.node_done = "FAILED"
                 else:
+                    set_solved(parent)
+                    parent.robot_children = None
+                    cancel_pending_children(parent)
+            elif(parent.node_type == "AND"):
+                if element.node_done == "FAILED":
+                    parent.node_done = "FAILED"
+                elif parent.nb_unsolved_children > 0:
                     return
+                else:
+                    set_solved(parent)
+            regress_to_transpositions(parent, frontier)
+            element = parent
+            parent = parent.previous
+
+def cancel_pair(pair: ActionPair):
+    """
+    The pair won't be explored, its agents, possible worlds and children not generated yet are released.
+    It is removed from the tree once the exploration is over, see remove_cancelled_pairs()
+    """
+    pair.cancelled = True
+    pair.end_agents = None
+    pair.possible_worlds_for_h = []
+    pair.robot_children = None
+
+def cancel_pending_children(pair: ActionPair):
+    """ Once the OR pair is solved, its children still waiting to be expanded are cancelled """
+    for c in pair.next:
+        if (c.node_done != "DONE" and c.node_pass != "pass" and c.nb_unsolved_children == None 
+            and c.transposition_of == None and c.transpositions == [] and not c.is_final()):
+            cancel_pair(c)
+
+def remove_cancelled_pairs(init_step: Step):
+    """
+    Removes the cancelled pairs from the next lists and human options of the tree, with the steps following them.
+    A step left without pairs is removed too.
+    """
+    to_visit = [init_step]
+    while to_visit != []:
+        step = to_visit.pop()
+        if step.from_pair != None:
+            step.from_pair.next = [p for p in step.from_pair.next if not p.cancelled]
+        human_options = []
+        for ho in step.human_options:
+            pairs = [p for p in ho.action_pairs if not p.cancelled]
+            if pairs != []:
+                ho.action_pairs = pairs
+                ho.robot_actions = [p.robot_action for p in pairs]
+                human_options.append(ho)
+        step.human_options = human_options
+        children = []
+        for c in step.children:
+            if not c.from_pair.cancelled and check_list(c.get_pairs(), lambda p: not p.cancelled) != None:
+                children.append(c)
+        step.children = children
+        to_visit += children
+
+def is_cancelled(pair: ActionPair):
+    """
+    Whether the pair can't be part of the policy anymore since one of its ancestors is already DONE or FAILED.
+    Checked when the pair is popped, every pair of the branch up to this ancestor is then cancelled.
+    A pair whose sub-tree is shared by transpositions is kept.
+    """
+    branch = []
+    p = pair
+    while not p.cancelled:
+        if p.transpositions != []:
+            return False
+        branch.append(p)
+        p = p.previous
+        if p == None:
+            return False
+        if p.node_done == "DONE" or p.node_done == "FAILED":
+            break
+    for b in branch:
+        cancel_pair(b)
+    return True
+
+def regress_to_transpositions(element, frontier=None):
+    """ The pairs sharing the sub-tree of element get its new status """
+    for t in element.transpositions:
+        if is_resolved(t):
+            continue
+        set_status_from(t, element)
+        regress_new_status_backward(t, frontier)
+
+def get_status_from_transposition(element, frontier=None):
+    """ Not expanded pair, gets the status of the already expanded pair if known (otherwise through regression later) """
+    canonical = element.transposition_of
+    if is_resolved(canonical):
+        set_status_from(element, canonical)
+        regress_new_status_backward(element, frontier)
 
 # NOTE: for now allowing the robot to choose PASS first when using AND/OR search will not work
 # currently it does not allow to find a solution in a breadth-first search manner 
-def fun_AND_OR_search_new(pair_to_explore, allowed_to_signal, goal_test):
+def fun_AND_OR_search_new(pair_to_explore, allowed_to_signal, goal_test, frontier=None, transposition_table=None, lazy_or=False, budget=None, checkpointer=None):
     # pair_to_explore: it is the initial pair we begin with
+    # transposition_table: dict to detect transpositions (see get_transposition()), None to not use them
     root = pair_to_explore
     # explored = []
-    frontier = [] 
-    frontier.append(root[0])
-    while frontier != []:
-        element = frontier.pop(0)
+    if frontier == None:
+        frontier = BFSFrontier()
+    if budget == None:
+        budget = ExplorationBudget()
+    if checkpointer == None:
+        checkpointer = Checkpointer()
+    # root already expanded when resuming
+    if root[0].nb_unsolved_children == None:
+        frontier.push(root[0])
+    # the search stops as soon as the root is solved
+    root_solved = []
+    def on_root_solved(pair):
+        root_solved.append(pair)
+    root[0].solved_listeners.append(on_root_solved)
+    nb_cancelled = 0
+    # leaves are classified while expanded (see attach_pairs_tt)
+    goal_test[0] = True
+    while len(frontier) > 0 and root_solved == []:
+        # when stopped, the exploration can be resumed from a last checkpoint
+        stopped = budget.is_exhausted()
+        checkpointer.tick(root[0].get_in_step(), goal_test, frontier, transposition_table, budget, force=stopped)
+        if stopped:
+            mark_unexplored(frontier)
+            break
+        element = frontier.pop()
+        if is_cancelled(element):
+            nb_cancelled += 1
+            continue
         # explored += [element]
-        element_copy = deepcopy(element)
         # forward search
-        children = exploration_step_tt([element], allowed_to_signal, goal_test)          
+        goal_test[1] = ""
+        children = expand_pair_tt(element, allowed_to_signal, goal_test, transposition_table, lazy_or)
+        budget.nb_expanded += 1
 
-        if children == []:
-            goal_test[0] = True      
-            # if we can save things here
-            verify_cycle([element_copy], allowed_to_signal, goal_test)
+        if element.transposition_of != None:
+            get_status_from_transposition(element, frontier)
+        elif children == []:
             # if goal_test[1] == "goal" or goal_test[1] == "pass":
             if goal_test[1] == "goal":
-                element.node_done = "DONE"
+                set_solved(element)
             elif goal_test[1] == "pass":
                 element.node_pass = "pass"
                 
             # backward search: update solved node  
-            regress_new_status_backward(element) 
+            regress_new_status_backward(element, frontier) 
             print() 
-        if is_root_solved(root[0]):
-            break
-        frontier = frontier + children
-        # frontier = children + frontier 
+        if root_solved == []:
+            frontier.extend(children)
+    root[0].solved_listeners.remove(on_root_solved)
+    checkpointer.wait_writer()
     ##############
-    global max_number_of_worlds_evaluated
-    print("maximum numbers of world evaluated: " + str(max_number_of_worlds_evaluated))
+    print("maximum numbers of world evaluated: " + str(CM.get_context().max_number_of_worlds_evaluated))
+    print("number of cancelled pairs: " + str(nb_cancelled))
     
     
 # NOTE: for now allowing the robot to choose PASS first when using AND/OR search will not work
 # currently it does not allow to find a solution in a breadth-first search manner 
 def fun_AND_OR_search(pair_to_explore, allowed_to_signal, goal_test):
-    pair_to_explore_loc = deepcopy(pair_to_explore)    
-    pair_to_explore_goal_test = deepcopy(pair_to_explore)    
+    pair_to_explore_loc = [pair_to_explore[0].snapshot()]
+    pair_to_explore_goal_test = [pair_to_explore[0].snapshot()]
     goal_test = [False, ""]
-    children = exploration_step_tt(pair_to_explore, allowed_to_signal, goal_test) 
+    children = expand_pair_tt(pair_to_explore[0], allowed_to_signal, goal_test)
     if children == []:  
         goal_test[0] = True      
         verify_cycle(pair_to_explore_goal_test, allowed_to_signal, goal_test)
@@ -642,44 +1716,346 @@ def fun_AND_OR_search(pair_to_explore, allowed_to_signal, goal_test):
 ##############
 
 def verify_cycle(pair_to_explore, allowed_to_signal, goal_test):
-    return exploration_step_tt(pair_to_explore, allowed_to_signal, goal_test)
-
-#####################
-## MULTI_THREADING ##
-#####################
-def recursive_loop_explo_para(e: concurrent.futures.ThreadPoolExecutor, pairs_to_explore: List[ActionPair]):
-    jobs = [] # type: List[concurrent.futures.Future]
-    for p in pairs_to_explore:
-        jobs.append(e.submit(new_exploration_step, p))
-
-    i = 0
-    while jobs!=[]:
-        if jobs[i].done():
-            job = jobs.pop(i)
-            e.submit(recursive_loop_explo_para, e, job.result())
+    return expand_pair_tt(pair_to_explore[0], allowed_to_signal, goal_test)
+
+#########
+## AO* ##
+#########
+AOSTAR_DEAD = (float("inf"),) # value of a pair that can't be solved, worse than any metrics tuple
+
+def fun_AND_OR_search_aostar(pair_to_explore, allowed_to_signal, goal_test, criteria, budget=None, checkpointer=None):
+    """
+    AO* search: expands a tip of the best partial policy until the root is solved (or can't be).
+    The value of a pair is the metrics tuple (see get_metrics_tuple()) of the worst branch of its best sub-policy:
+    the human may choose any of their options (AND pair) while the robot chooses the best one (OR pair, best_child).
+    Pairs not expanded yet are valued with get_aostar_bound(), a lower bound, thus the policy is optimal w.r.t. criteria.
+    The bound is weak (the domains' agendas mostly hold abstract tasks), so AO* pays off against a full exploration
+    followed by the choice of the best policy, whose result is the same, but expands more pairs than the BFS search,
+    which stops at the first solution found and isn't optimal.
+    """
+    for m, maxi in criteria:
+        if maxi:
+            raise Exception("AO* needs metrics to minimize, {} is maximized".format(m))
+    if budget == None:
+        budget = ExplorationBudget()
+    if checkpointer == None:
+        checkpointer = Checkpointer()
+    root = pair_to_explore[0]
+    # already valued when resuming
+    if root.aostar_value == None:
+        root.aostar_value = get_aostar_bound(root, criteria)
+    nb_expanded = 0
+    # leaves are classified while expanded (see attach_pairs_tt)
+    goal_test[0] = True
+    while root.node_done != "DONE" and root.node_pass != "pass" and root.aostar_value != AOSTAR_DEAD:
+        stopped = budget.is_exhausted()
+        checkpointer.tick(root.get_in_step(), goal_test, None, None, budget, force=stopped)
+        if stopped:
+            mark_unexplored(get_aostar_open_pairs(root))
+            break
+        element = get_aostar_tip(root)
+        goal_test[1] = ""
+        children = expand_pair_tt(element, allowed_to_signal, goal_test)
+        nb_expanded += 1
+        budget.nb_expanded += 1
+        if children == []:
+            if goal_test[1] == "goal":
+                set_solved(element)
+            elif goal_test[1] == "pass":
+                element.node_pass = "pass"
+        for c in children:
+            c.aostar_value = get_aostar_bound(c, criteria)
+        backup_aostar_values(element, criteria)
+    checkpointer.wait_writer()
+    print("number of pairs expanded by AO*: " + str(nb_expanded))
+
+def get_nb_due_actions(agents: CM.Agents, agent_name):
+    """
+    Number of actions the agent still has to do: primitive tasks of its agenda without done-condition, each one
+    can only leave the agenda by being executed (abstract tasks can refine into nothing and are not counted)
+    """
+    operators = CM.get_context().static_agents[agent_name].operators
+    nb = 0
+    for task in agents[agent_name].agenda:
+        if not task.is_abstract and task.name in operators and operators[task.name].done_cond == None:
+            nb += 1
+    return nb
+
+def get_aostar_bound(pair: ActionPair, criteria):
+    """
+    Lower bound of the metrics of the branches below the not expanded pair: the metrics never decrease
+    along a branch, and a branch can only end right after the pair if one of its actions is IDLE.
+    Moreover each action still due by an agent (see get_nb_due_actions()) takes a step of its own before the end.
+    """
+    metrics = dict(get_partial_metrics(pair))
+    nb_steps = 1 if not pair.human_action.is_idle() and not pair.robot_action.is_idle() else 0
+    if pair.end_agents != None:
+        nb_h = get_nb_due_actions(pair.end_agents, "H")
+        nb_r = get_nb_due_actions(pair.end_agents, "R")
+        nb_steps = max(nb_steps, nb_h, nb_r)
+        if nb_h > 0:
+            metrics["TimeEndHumanDuty"] = metrics["TimeTaskCompletion"] + nb_h
+        metrics["HumanEffort"] += nb_h
+        metrics["GlobalEffort"] += nb_h + nb_r
+    metrics["TimeTaskCompletion"] += nb_steps
+    return get_metrics_tuple(metrics, criteria)
+
+def get_aostar_tip(root: ActionPair) -> ActionPair:
+    """ Not expanded pair of the best partial policy (best child of OR pairs, every unsolved child of AND pairs) """
+    pair = root
+    while pair.nb_unsolved_children != None:
+        if pair.node_type == "OR":
+            pair = pair.best_child
         else:
-            i = i+1 if i+1<len(jobs) else 0
-        time.sleep(0.01)    
+            pair = check_list(pair.next, lambda c: c.node_done != "DONE" and c.node_pass != "pass")
+    return pair
+
+def get_aostar_open_pairs(root: ActionPair) -> List[ActionPair]:
+    """ Pairs of the tree not expanded yet (final and pass pairs excluded) """
+    open_pairs = []
+    to_visit = [root]
+    while to_visit != []:
+        pair = to_visit.pop()
+        if pair.nb_unsolved_children != None:
+            to_visit += pair.next
+        elif not pair.is_final() and pair.node_pass != "pass":
+            open_pairs.append(pair)
+    return open_pairs
+
+def update_aostar_value(pair: ActionPair, criteria):
+    """ Value of the expanded pair from the values of its children, the pair is DONE once its best sub-policy is """
+    if pair.node_pass == "pass":
+        return
+    candidates = [c for c in pair.next if c.node_pass != "pass"]
+    # leaf solved or not by the goal test, or AND pair whose children are all pass
+    if all(c.is_final() for c in candidates) and (candidates != [] or pair.node_type == "AND"):
+        if candidates == []:
+            set_solved(pair)
+        if pair.node_done == "DONE":
+            pair.aostar_value = get_metrics_tuple(get_partial_metrics(pair), criteria)
+        else:
+            pair.aostar_value = AOSTAR_DEAD
+    elif candidates == []:
+        pair.aostar_value = AOSTAR_DEAD
+    # final pairs are never DONE, thus never chosen by the robot and never solved for the human
+    elif pair.node_type == "OR":
+        candidates = [c for c in candidates if not c.is_final()]
+        pair.best_child = min(candidates, key=lambda c: (c.aostar_value, c.node_done != "DONE"))
+        pair.aostar_value = pair.best_child.aostar_value
+        if pair.best_child.node_done == "DONE" and pair.aostar_value != AOSTAR_DEAD:
+            set_solved(pair)
+    else:
+        if any(c.is_final() for c in candidates):
+            pair.aostar_value = AOSTAR_DEAD
+        else:
+            pair.aostar_value = max(c.aostar_value for c in candidates)
+            if all(c.node_done == "DONE" for c in candidates):
+                set_solved(pair)
+
+def backup_aostar_values(element: ActionPair, criteria):
+    """ Updates the values of element and its ancestors, stops at the first one whose value and status don't change """
+    update_aostar_value(element, criteria)
+    parent = element.previous
+    while parent != None:
+        old = (parent.aostar_value, parent.node_done, parent.best_child)
+        update_aostar_value(parent, criteria)
+        if (parent.aostar_value, parent.node_done, parent.best_child) == old:
+            return
+        parent = parent.previous
 
-def new_exploration_step(selected_pair):
-    parallel_pairs = compute_parallel_pairs(selected_pair)
-    human_options = arrange_pairs_in_HumanOption(parallel_pairs)
-    new_step = Step(parent=selected_pair.get_in_step())
-    new_step.init(human_options, selected_pair)
-    new_step.CRA = identify_CRA(new_step)
-    lg.info(f"{new_step.str()}")
+######################
+## MULTI_PROCESSING ##
+######################
+# Pairs are expanded by worker processes (situation assessment, filtering of the possible worlds and refinement, 
+# see compute_pairs_tt()) while the master process adds the new pairs in the tree and updates the solved status.
+# The domain is sent once to each worker, when it starts, then only the dynamic part of the agents is sent.
 
-    return new_get_pairs_to_explore(new_step)
+WORKER_FIRST_ID = 10**12 # ids of the tasks created by workers start here, they are given again by the master
 
-def new_get_pairs_to_explore(new_step: Step):
-    new_explo_pairs = []
-    
-    # add all pairs except double passive
-    for pair in new_step.get_pairs():
-        if not pair.is_passive():
-            new_explo_pairs.append(pair)
+def fun_AND_OR_search_parallel(pair_to_explore, allowed_to_signal, goal_test, frontier: Frontier, n_workers, transpositions=False, and_or=True, budget=None):
+    """
+    Same search as fun_AND_OR_search_new() but pairs are expanded by n_workers processes, goal_test is used as there
+    With and_or=False the whole tree is explored, as in explore(), and goal_test as given
+    Only the refinement and the situation assessment run in the workers, the master sends each pair with its possible
+    worlds and merges back the new agents: on small domains (e.g. prepare_dinner_k, about 1ms per expansion) this
+    costs more than the expansion and the search is slower than with one process, it only pays off when expanding
+    a pair takes much longer than sending it.
+    """
+    if budget == None:
+        budget = ExplorationBudget()
+    root = pair_to_explore
+    transposition_table = {} if transpositions else None
+    frontier.push(root[0])
+    if and_or:
+        # leaves are classified while expanded (see attach_pairs_tt)
+        goal_test[0] = True
+    # the search stops as soon as the root is solved
+    root_solved = []
+    def on_root_solved(pair):
+        root_solved.append(pair)
+    root[0].solved_listeners.append(on_root_solved)
+    running_jobs = {} # future: (pair, list of the possible worlds sent)
+    nb_cancelled = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, initializer=init_exploration_worker, initargs=(get_domain_dump(CM.get_context()),)) as e:
+        while (len(frontier) > 0 or running_jobs != {}) and root_solved == []:
+            if budget.is_exhausted():
+                mark_unexplored(list(frontier) + [element for element, _ in running_jobs.values()])
+                break
+            # a few pairs in advance for each worker
+            while len(frontier) > 0 and len(running_jobs) < 2*n_workers:
+                element = frontier.pop()
+                if and_or and is_cancelled(element):
+                    nb_cancelled += 1
+                    continue
+                worlds = list(element.possible_worlds_for_h)
+                running_jobs[e.submit(expand_pair_in_worker, pack_pair(element, worlds), allowed_to_signal)] = (element, worlds)
+
+            done_jobs, _ = concurrent.futures.wait(running_jobs, return_when=concurrent.futures.FIRST_COMPLETED)
+            for job in done_jobs:
+                element, worlds = running_jobs.pop(job)
+                if and_or and is_cancelled(element):
+                    nb_cancelled += 1
+                    continue
+                acting_agent, pairs = merge_worker_expansion(element, worlds, job.result())
+                budget.nb_expanded += 1
 
-    return new_explo_pairs
+                if is_cycle(element, acting_agent):
+                    element.node_pass = "pass"
+                    if and_or:
+                        regress_new_status_backward(element)
+                    continue
+
+                if transposition_table != None and get_transposition(transposition_table, element, acting_agent) != None:
+                    if and_or:
+                        get_status_from_transposition(element)
+                    continue
+
+                goal_test[1] = ""
+                children = attach_pairs_tt(element, pairs, acting_agent, goal_test, transposition_table != None)
+                if and_or and children == []:
+                    if goal_test[1] == "goal":
+                        set_solved(element)
+                    elif goal_test[1] == "pass":
+                        element.node_pass = "pass"
+                    regress_new_status_backward(element)
+                frontier.extend(children)
+
+        for job in running_jobs:
+            job.cancel()
+    root[0].solved_listeners.remove(on_root_solved)
+    ##############
+    print("maximum numbers of world evaluated: " + str(CM.get_context().max_number_of_worlds_evaluated))
+    if and_or:
+        print("number of cancelled pairs: " + str(nb_cancelled))
+
+def get_domain_dump(context: CM.ExplorationContext):
+    """ Domain of the context, for the workers (see init_exploration_worker()) """
+    return dill.dumps((context.domain_name, context.static_agents, context.starting_agent, context.symmetric_objects,
+                       context.symmetry_renamings, context.observability_rules), recurse=True)
+
+def init_exploration_worker(domain_dump):
+    """ The worker runs in a context with the domain of the exploration """
+    context = CM.ExplorationContext()
+    (context.domain_name, context.static_agents, context.starting_agent, context.symmetric_objects,
+     context.symmetry_renamings, context.observability_rules) = dill.loads(domain_dump)
+    CM.g_current_context.set(context)
+
+def pack_agents(agents: CM.Agents):
+    """ Dynamic part of the agents, the static part is taken again from CM.get_context().static_agents when unpacked """
+    return (agents.state, [(name, a.agenda, a.planned_actions) for name, a in agents.agents.items()])
+
+def unpack_agents(packed_agents) -> CM.Agents:
+    state, dyn_agents = packed_agents
+    agents = CM.Agents()
+    agents.state = state
+    for name, agenda, planned_actions in dyn_agents:
+        agents[name] = deepcopy(CM.get_context().static_agents[name])
+        agents[name].agenda = agenda
+        agents[name].planned_actions = planned_actions
+    return agents
+
+def pack_pair(pair: ActionPair, worlds):
+    previous_actions = None if pair.previous == None else (pair.previous.human_action, pair.previous.robot_action)
+    return (pair.human_action, pair.robot_action, previous_actions, pair.node_type, pair.copresence,
+            pack_agents(pair.end_agents), [pack_agents(w) for w in worlds])
+
+def unpack_pair(packed_pair) -> ActionPair:
+    human_action, robot_action, previous_actions, node_type, copresence, end_agents, worlds = packed_pair
+    pair = ActionPair(human_action, robot_action, unpack_agents(end_agents), [unpack_agents(w) for w in worlds])
+    if previous_actions != None:
+        pair.previous = ActionPair(previous_actions[0], previous_actions[1], None, [])
+    pair.node_type = node_type
+    pair.copresence = copresence
+    return pair
+
+def expand_pair_in_worker(packed_pair, allowed_to_signal):
+    """
+    Worker side of the expansion of a pair
+    The agents of the new pairs are given as references, to avoid sending back the ones the master already has:
+        ("SELECTED",) end_agents of the selected pair, ("WORLD", i) i-th possible world sent, ("NEW", i) i-th new agents
+    """
+    CM.get_context().task_next_id = WORKER_FIRST_ID
+    selected_pair = unpack_pair(packed_pair)
+    sent_worlds = selected_pair.possible_worlds_for_h
+
+    refs = {id(selected_pair.end_agents) : ("SELECTED",)}
+    for i, w in enumerate(sent_worlds):
+        refs[id(w)] = ("WORLD", i)
+    new_agents = []
+    def get_ref(agents):
+        if not id(agents) in refs:
+            refs[id(agents)] = ("NEW", len(new_agents))
+            new_agents.append(pack_agents(agents))
+        return refs[id(agents)]
+
+    # the worker's worlds aren't interned, the master does it in merge_worker_expansion()
+    selected_pair, acting_agent = assess_pair_tt(selected_pair, intern=False)
+    nb_worlds = len(selected_pair.possible_worlds_for_h)
+    pairs = compute_pairs_tt(selected_pair, acting_agent, allowed_to_signal)
+
+    new_pairs = [(p.human_action, p.robot_action, get_ref(p.end_agents), [get_ref(w) for w in p.possible_worlds_for_h]) for p in pairs]
+    kept_worlds = [get_ref(w) for w in selected_pair.possible_worlds_for_h]
+    return acting_agent, selected_pair.copresence, nb_worlds, kept_worlds, new_agents, new_pairs
+
+def merge_worker_expansion(selected_pair: ActionPair, sent_worlds, result):
+    """
+    Master side of the expansion of a pair, the selected pair is updated as done by assess_pair_tt()
+    Returns the acting agent and the new pairs (not yet added in the tree)
+    """
+    acting_agent, copresence, nb_worlds, kept_worlds, packed_new_agents, new_pairs = result
+    new_agents = [unpack_agents(a) for a in packed_new_agents]
+    def get_agents(ref):
+        if ref[0] == "SELECTED":
+            return selected_pair.end_agents
+        elif ref[0] == "WORLD":
+            return sent_worlds[ref[1]]
+        return new_agents[ref[1]]
+
+    # tasks created by the worker get the next ids of the master, in the same order
+    new_tasks = {}
+    for human_action, robot_action, _, _ in new_pairs:
+        for t in [human_action, robot_action]:
+            if t.id >= WORKER_FIRST_ID:
+                new_tasks[id(t)] = t
+    for agents in new_agents:
+        for agent in agents.agents.values():
+            for t in agent.agenda + agent.planned_actions:
+                if t.id >= WORKER_FIRST_ID:
+                    new_tasks[id(t)] = t
+    for t in sorted(new_tasks.values(), key=lambda t: t.id):
+        t.assign_next_id()
+
+    selected_pair.possible_worlds_for_h = set(get_agents(ref) for ref in kept_worlds)
+    selected_pair.intern_worlds(get_world_pool())
+    selected_pair.copresence = copresence
+    context = CM.get_context()
+    if nb_worlds > context.max_number_of_worlds_evaluated:
+        context.max_number_of_worlds_evaluated = nb_worlds
+
+    pairs = []
+    for human_action, robot_action, end_agents, worlds in new_pairs:
+        pairs.append(ActionPair(human_action, robot_action, get_agents(end_agents), [get_agents(w) for w in worlds]))
+    return acting_agent, pairs
 
 ################
 ## EXPLO STEP ##
@@ -713,174 +2089,202 @@ def exploration_when_HR_insame_context(selected_pair):
     # 5. for updating/keeping the possible worlds: retain all possible worlds from "possible_worlds_for_h" in which
     # 6. at least one decomposition, e.g. r1 allows to execute a1 next in it -- it create new worlds using only those decompositions 
     """
+    return RobotChildren(selected_pair, True).get_all()
 
-    ## this gets us all possible designated refinements to be applied in reality
-    selected_pair_loc = deepcopy(selected_pair)
-    ref = get_applied_refinement("R", selected_pair, selected_pair.end_agents)
-    pairs = []
-    h_pass = CM.Action.create_passive("H", "WAIT_TURN")
-    
 
-    # If in reality the robot cannot act i.e. ref is None 
-    # Means agents might still have to achieve the shared goal but due to lack of resources 
-    # the robot cannot act at this stage -- so it has option to be PASSIVE & WAIT 
-    no_next_real_action_r = False
-    for dec in ref.applied_decomps:
-        if dec.next_action.name == "PASSIVE" and dec.next_action.parameters[0] == "WAIT":
-            no_next_real_action_r = True
+def exploration_when_HR_not_insame_context(selected_pair):       
+    # Case 1: (when H and R are not co-present) 
+    # Then, foreach non-designated worlds of the selected_pair ds
+    # bring all possible refinements -- updated next action, the agent agendas etc.
+    # each possible refinement is the possible next world for the human as they are not co-present   
+    #    
+    return RobotChildren(selected_pair, False).get_all()
+
+class RobotChildren:
+    """
+    Pairs of the robot's turn (see exploration_when_HR_insame_context() and exploration_when_HR_not_insame_context())
+    generated one at a time with next(), so that an OR pair can be expanded lazily.
+    The pairs come in the order of the refinement, with heuristic_order the non-passive decompositions come first.
+    The PASS pair is always the last one.
+    """
+    def __init__(self, selected_pair: ActionPair, are_HR_in_the_same_context, heuristic_order=False):
+        self.selected_pair = selected_pair
+        self.are_HR_in_the_same_context = are_HR_in_the_same_context
+        if are_HR_in_the_same_context:
+            self.init_insame_context()
+        else:
+            self.init_not_insame_context()
+
+        self.order = list(range(len(self.decomps)))
+        if heuristic_order:
+            self.order.sort(key=lambda i: self.decomps[i].next_action.is_passive())
+        self.next_index = 0
+        self.passive_found = False
+        self.pass_pair_needed = True
+        # do not allow PASS when human is waiting for signal
+        if are_HR_in_the_same_context and "GET_SIGNAL" in selected_pair.human_action.name:
+            self.pass_pair_needed = False
+
+    def next(self) -> ActionPair:
+        """ Returns the next pair, None once every pair has been generated """
+        if self.next_index < len(self.order):
+            dec = self.decomps[self.order[self.next_index]]
+            self.next_index += 1
+            if self.are_HR_in_the_same_context:
+                pair = self.get_insame_context_pair(dec)
+            else:
+                pair = self.get_not_insame_context_pair(dec)
+            if pair.robot_action.is_passive() and not self.passive_found:
+                pair.robot_action.parameters.append("PASS")
+                self.passive_found = True
+                self.pass_pair_needed = False
+            return pair
+        if self.pass_pair_needed:
+            self.pass_pair_needed = False
+            if self.are_HR_in_the_same_context:
+                return self.get_insame_context_pass_pair()
+            return self.get_not_insame_context_pass_pair()
+        return None
+
+    def get_all(self) -> List[ActionPair]:
+        pairs = []
+        pair = self.next()
+        while pair != None:
+            pairs.append(pair)
+            pair = self.next()
+        return pairs
+
+    ## CO-PRESENT ##
+    def init_insame_context(self):
+        ## this gets us all possible designated refinements to be applied in reality
+        self.selected_pair_loc = self.selected_pair.snapshot()
+        ref = get_applied_refinement("R", self.selected_pair, self.selected_pair.end_agents)
+        self.h_pass = CM.Action.create_passive("H", "WAIT_TURN")
+
+        # If in reality the robot cannot act i.e. ref is None 
+        # Means agents might still have to achieve the shared goal but due to lack of resources 
+        # the robot cannot act at this stage -- so it has option to be PASSIVE & WAIT 
+        no_next_real_action_r = False
+        for dec in ref.applied_decomps:
+            if dec.next_action.name == "PASSIVE" and dec.next_action.parameters[0] == "WAIT":
+                no_next_real_action_r = True
+        self.decomps = [] if no_next_real_action_r else ref.applied_decomps
 
-    if not no_next_real_action_r:
+    def get_insame_context_pair(self, dec):
         # when H and R are co-present, R's actions affect the beliefs of the human
         # human can deduce/infer new set of possible world, which would be subset of the possible worlds before 
         # for this deduction, human consideres all possible worlds and possible agendas
-        for dec in ref.applied_decomps:  
-            _after_refuting_impossible_worlds_wrt_designated_refinements = [] 
-            # as per the new refinements wrt a possible world (that human is uncertain about) and robot as 
-            # an acting agent
-            # if there is an action in a refinement applicable in this world which is exactly what the robot 
-            # applies in the designated world, then, 
-            # human will still not be able to distinguish the next possible world generated with the 
-            # next designated world 
-            for each_possible_world in selected_pair_loc.possible_worlds_for_h:
-                possible_ref = get_applied_refinement("R", selected_pair_loc, each_possible_world)
-                for possible_dec in possible_ref.applied_decomps:          
-                    # for now, consider their names and the parameter lists  
-                    if (dec.next_action.name == possible_dec.next_action.name):
-                        same_param_list = True
-                        for par in range(len(dec.next_action.parameters)):
-                            if dec.next_action.parameters[par] != possible_dec.next_action.parameters[par]: 
-                                same_param_list = False
-                        for par in range(len(possible_dec.next_action.parameters)):
-                            if dec.next_action.parameters[par] != possible_dec.next_action.parameters[par]: 
-                                same_param_list = False 
-
-                        ## Robot's next designated action will be assessed by the human in the current context
-                        ## It may reduce the overall uncertainty the human is carrying by seeing this action 
-                        ## This is INFERENCE -- if human sees the robot taking next actions
-                        ## What human does is they refers to all possible worlds (states+agendas)
-                        ## Based on that, human knows for which all possible worlds robot can take this action        
-                        if same_param_list:
-                            _after_refuting_impossible_worlds_wrt_designated_refinements.append(possible_dec.end_agents)  
-
-            # print("\nNumber of possible worlds as per H = ", len(_after_refuting_impossible_worlds_wrt_designated_refinements))
-            pairs.append(ActionPair(h_pass, dec.next_action, dec.end_agents, _after_refuting_impossible_worlds_wrt_designated_refinements)) 
-    # else:
-
-    pass_added = False
-    for p in pairs:
-        if p.robot_action.is_passive():
-            p.robot_action.parameters.append("PASS")
-            pass_added = True
-            break
-    
-    # do not allow PASS when human is waiting for signal
-    if "GET_SIGNAL" in selected_pair.human_action.name:
-        pass_added = True
-
-    if not pass_added:
+        _after_refuting_impossible_worlds_wrt_designated_refinements = [] 
+        # as per the new refinements wrt a possible world (that human is uncertain about) and robot as 
+        # an acting agent
+        # if there is an action in a refinement applicable in this world which is exactly what the robot 
+        # applies in the designated world, then, 
+        # human will still not be able to distinguish the next possible world generated with the 
+        # next designated world 
+        for each_possible_world in self.selected_pair_loc.possible_worlds_for_h:
+            possible_ref = get_applied_refinement("R", self.selected_pair_loc, each_possible_world)
+            for possible_dec in possible_ref.applied_decomps:          
+                # for now, consider their names and the parameter lists  
+                if (dec.next_action.name == possible_dec.next_action.name):
+                    same_param_list = True
+                    for par in range(len(dec.next_action.parameters)):
+                        if dec.next_action.parameters[par] != possible_dec.next_action.parameters[par]: 
+                            same_param_list = False
+                    for par in range(len(possible_dec.next_action.parameters)):
+                        if dec.next_action.parameters[par] != possible_dec.next_action.parameters[par]: 
+                            same_param_list = False 
+
+                    ## Robot's next designated action will be assessed by the human in the current context
+                    ## It may reduce the overall uncertainty the human is carrying by seeing this action 
+                    ## This is INFERENCE -- if human sees the robot taking next actions
+                    ## What human does is they refers to all possible worlds (states+agendas)
+                    ## Based on that, human knows for which all possible worlds robot can take this action        
+                    if same_param_list:
+                        _after_refuting_impossible_worlds_wrt_designated_refinements.append(possible_dec.end_agents)  
+
+        # print("\nNumber of possible worlds as per H = ", len(_after_refuting_impossible_worlds_wrt_designated_refinements))
+        return ActionPair(self.h_pass, dec.next_action, dec.end_agents, _after_refuting_impossible_worlds_wrt_designated_refinements)
+
+    def get_insame_context_pass_pair(self):
         # I have updated it:  
         # list_param = "WAIT", "PASS" signifies that nothing to do for the robot and the goal is not achieved yet.
         # whether this "selected_pair.possible_worlds_for_h" should go or not -- should retain all possible "agents" ds   
-        possible_worlds_h = selected_pair_loc.possible_worlds_for_h        
+        possible_worlds_h = self.selected_pair_loc.possible_worlds_for_h        
         act = CM.Action.create_passive("R", "WAIT")
         act.parameters.append("PASS")
-        
-        pairs.append(ActionPair(h_pass, act, selected_pair_loc.end_agents, possible_worlds_h))
-        # pairs.insert(0, ActionPair(h_pass, act, selected_pair_loc.end_agents, possible_worlds_h))
-        
-        # pairs.append(ActionPair(h_pass, CM.Action.create_passive("R", "PASS"), selected_pair_loc.end_agents, possible_worlds_h))
-        # pairs.insert(0, ActionPair(h_pass, CM.Action.create_passive("R", "PASS"), selected_pair_loc.end_agents, possible_worlds_h))
-    return pairs
+        return ActionPair(self.h_pass, act, self.selected_pair_loc.end_agents, possible_worlds_h)
 
+    ## NOT CO-PRESENT ##
+    def init_not_insame_context(self):
+        self.possible_worlds_post_possible_non_designated_refinements = []
+        # print("\nNumber of possible worlds as per H = ", len(selected_pair.possible_worlds_for_h))
 
-def exploration_when_HR_not_insame_context(selected_pair):       
-    # Case 1: (when H and R are not co-present) 
-    # Then, foreach non-designated worlds of the selected_pair ds
-    # bring all possible refinements -- updated next action, the agent agendas etc.
-    # each possible refinement is the possible next world for the human as they are not co-present   
-    #    
-
-    possible_worlds_post_possible_non_designated_refinements = []
-    # print("\nNumber of possible worlds as per H = ", len(selected_pair.possible_worlds_for_h))
+        selected_pair_loc = self.selected_pair.snapshot()
 
-    selected_pair_loc = deepcopy(selected_pair)
+        # this portion is validated now!
+        for each_possible_world in selected_pair_loc.possible_worlds_for_h:
+            # for the robot to apply actions w.r.t. given possible designated world when 
+            # human is not in context
+            selected_pair_loc_for = selected_pair_loc.snapshot()
+            selected_pair_loc_for.possible_worlds_for_h = []
+            each_possible_world_for = deepcopy(each_possible_world)
 
-    # this portion is validated now!
-    for each_possible_world in selected_pair_loc.possible_worlds_for_h:
-        # for the robot to apply actions w.r.t. given possible designated world when 
-        # human is not in context
-        selected_pair_loc_for = deepcopy(selected_pair_loc)
-        selected_pair_loc_for.possible_worlds_for_h = []
-        each_possible_world_for = deepcopy(each_possible_world)
-
-        ref = get_applied_refinement("R", selected_pair_loc_for, each_possible_world_for)
-        # pairs = []
-        # h_pass = CM.Action.create_passive("H", "WAIT_TURN")
-    
-        for dec in ref.applied_decomps:            
-            # pairs.append(ActionPair(dec.next_action, r_pass, dec.end_agents, selected_pair.worlds_uncertainty))
-            possible_worlds_post_possible_non_designated_refinements.append(dec.end_agents)
+            ref = get_applied_refinement("R", selected_pair_loc_for, each_possible_world_for)
         
-        does_robot_wait = False
-        for dec in ref.applied_decomps:
-            if dec.next_action.is_passive():
-                does_robot_wait = True
+            for dec in ref.applied_decomps:            
+                self.possible_worlds_post_possible_non_designated_refinements.append(dec.end_agents)
+            
+            does_robot_wait = False
+            for dec in ref.applied_decomps:
+                if dec.next_action.is_passive():
+                    does_robot_wait = True
 
-        # and to the original world itself -- when robot does not apply an action
-        if(not does_robot_wait):
-            possible_worlds_post_possible_non_designated_refinements.append(each_possible_world_for)
+            # and to the original world itself -- when robot does not apply an action
+            if(not does_robot_wait):
+                self.possible_worlds_post_possible_non_designated_refinements.append(each_possible_world_for)
 
-    # now for the real/designated world -- look for all possible decompositions
-    # for each possible decomposition --- give NOOP for the second agent (NOOP, act_i) -- bring the next designated world
-    # Note that: even out of these real decompositions, only one decomposition will be adopted in real time by the robot
-    # the others will still form state uncertainity in that plan trace: I.e., end_agent ds
+        # now for the real/designated world -- look for all possible decompositions
+        # for each possible decomposition --- give NOOP for the second agent (NOOP, act_i) -- bring the next designated world
+        # Note that: even out of these real decompositions, only one decomposition will be adopted in real time by the robot
+        # the others will still form state uncertainity in that plan trace: I.e., end_agent ds
 
-    # this gets us all possible designated refinements
-    selected_pair_loc.possible_worlds_for_h = []
-    ref_glob = get_applied_refinement("R", selected_pair_loc, selected_pair_loc.end_agents)
-    ref = deepcopy(ref_glob)
-    pairs = []
-    h_pass = CM.Action.create_passive("H", "WAIT_TURN")
+        # this gets us all possible designated refinements
+        selected_pair_loc.possible_worlds_for_h = []
+        self.ref_glob = get_applied_refinement("R", selected_pair_loc, selected_pair_loc.end_agents)
+        self.decomps = deepcopy(self.ref_glob).applied_decomps
+        self.h_pass = CM.Action.create_passive("H", "WAIT_TURN")
 
-    selected_pair_loc_another = deepcopy(selected_pair)
+        self.selected_pair_loc_another = self.selected_pair.snapshot()
 
-    # testing for passive action
-    does_robot_wait = False
-    for dec in ref.applied_decomps:
-        if dec.next_action.is_passive():
-            does_robot_wait = True
+        # testing for passive action
+        self.does_robot_wait = False
+        for dec in self.decomps:
+            if dec.next_action.is_passive():
+                self.does_robot_wait = True
 
-    for dec in ref.applied_decomps:            
+    def get_not_insame_context_pair(self, dec):
         _worlds_from_designated_refinements_not_selected = []
-        for dec1 in ref.applied_decomps:
+        for dec1 in self.decomps:
             if dec != dec1: #there should be a better way to compare dec and dec1
                 _worlds_from_designated_refinements_not_selected.append(dec1.end_agents)
         
-        if not does_robot_wait:
-            _worlds_from_designated_refinements_not_selected.append(selected_pair_loc_another.end_agents)
+        if not self.does_robot_wait:
+            _worlds_from_designated_refinements_not_selected.append(self.selected_pair_loc_another.end_agents)
 
-        possible_worlds_h = possible_worlds_post_possible_non_designated_refinements + _worlds_from_designated_refinements_not_selected
-        pairs.append(ActionPair(h_pass, dec.next_action, dec.end_agents, possible_worlds_h))
+        possible_worlds_h = self.possible_worlds_post_possible_non_designated_refinements + _worlds_from_designated_refinements_not_selected
+        return ActionPair(self.h_pass, dec.next_action, dec.end_agents, possible_worlds_h)
 
-    pass_added = False
-    for p in pairs:
-        if p.robot_action.is_passive():
-            p.robot_action.parameters.append("PASS")
-            pass_added = True
-            break
-    if not pass_added:
+    def get_not_insame_context_pass_pair(self):
         # need to verify this! whether this "selected_pair.possible_worlds_for_h" should go or the one provided below
         _worlds_from_designated_refinements_not_selected = []
 
         # even if the robot is not taking an action: reason(s): it passes as it cannot act next 
-        ref = deepcopy(ref_glob)
+        ref = deepcopy(self.ref_glob)
         for dec in ref.applied_decomps: 
             _worlds_from_designated_refinements_not_selected.append(dec.end_agents)
 
-        possible_worlds_h = possible_worlds_post_possible_non_designated_refinements + _worlds_from_designated_refinements_not_selected
-        pairs.append(ActionPair(h_pass, CM.Action.create_passive("R", "PASS"), selected_pair.end_agents, possible_worlds_h))
-        # pairs.insert(0, ActionPair(h_pass, CM.Action.create_passive("R", "PASS"), selected_pair.end_agents, possible_worlds_h)) 
-    return pairs
+        possible_worlds_h = self.possible_worlds_post_possible_non_designated_refinements + _worlds_from_designated_refinements_not_selected
+        return ActionPair(self.h_pass, CM.Action.create_passive("R", "PASS"), self.selected_pair.end_agents, possible_worlds_h)
 
 def update_dlgp_fact_list_GRAAL(file_path, start_text, end_text, state):
     # Read the content of the file
@@ -1222,36 +2626,59 @@ def utilizeContextForAppropriateSituAssessment_wrt_designated_state_old(state, w
 
 
 # all important comments appear where the original function is written  
-def utilizeContextForAppropriateSituAssessment_wrt_designated_state(state, w_the_possible_state_to_keep):
+def get_observable_entries(state):
+    """
+    Index paths (fluent, key, sub keys...) of the designated state that H observes, given by the observability rules
+    of the domain which apply in this state (see CM.declare_observability_rules()).
+    A possible world where one of them differs is refuted. None if H observes nothing.
+    """
+    state = CM.get_state_view(state)
+    copresent = (state.agent_in_context["R"] == state.agent_in_context["H"] and state.agent_at["R"] == state.agent_at["H"])
+    paths = []
+    for rule in CM.get_context().observability_rules:
+        if rule.is_applicable(state, copresent):
+            paths += rule.get_paths(state)
+    return paths if paths != [] else None
+
+def get_observed_projection(state, paths):
+    """ Tuple of the values of the state at the observed paths, worlds with the projection of the designated state are kept """
+    return tuple(CM.get_observed_value(state, path) for path in paths)
+
+def utilizeContextForAppropriateSituAssessment_wrt_designated_state(state, w_the_possible_state_to_keep, paths=None, projection=None):
     ######
-    # state_post_sa = None #appropriate ds?        
-    if (state.agent_in_context["R"] == state.agent_in_context["H"] and state.agent_at["R"] == state.agent_at["H"]):
-        
-        # focus: food_ready is originally inferable
-        if (state.cooking_done["food_ready"] != w_the_possible_state_to_keep.cooking_done["food_ready"]):
-            return None
-                
-        ## we need to play with these properties 
-        # if (state.washed["vegetable"] != w_the_possible_state_to_keep.washed["vegetable"]):
-        #     return None
-        if (state.cut["vegetable"] != w_the_possible_state_to_keep.cut["vegetable"]):
-            return None
-        # if (state.seasoned["vegetable"] != w_the_possible_state_to_keep.seasoned["vegetable"]):
-        #     return None
-        if (state.boiling["vegetable"] != w_the_possible_state_to_keep.boiling["vegetable"]):
-            return None
-        if (state.cooking_done["food_ready"] != w_the_possible_state_to_keep.cooking_done["food_ready"]):
+    # state_post_sa = None #appropriate ds?
+    # the paths and the projection of the designated state can be given when the same state is compared to several worlds
+    if paths == None:
+        paths = get_observable_entries(state)
+    if paths != None:
+        if projection == None:
+            projection = get_observed_projection(state, paths)
+        if get_observed_projection(w_the_possible_state_to_keep, paths) != projection:
             return None
+    return "keep"
 
-        if state.observability_washed_vegetable["washed"]:
-            if (state.washed["vegetable"] != w_the_possible_state_to_keep.washed["vegetable"]):
-                return None
+# from this number of possible worlds they are filtered at once (see get_observed_worlds_mask()), the loop is faster below
+SA_VECTORIZED_MIN_WORLDS = 32
 
-        if state.observability_seasoned_vegetable["seasoned"]:
-            if (state.seasoned["vegetable"] != w_the_possible_state_to_keep.seasoned["vegetable"]):
-                return None
-            
-    return "keep"
+def get_observed_worlds_mask(designated_state, worlds, paths):
+    """
+    Same as utilizeContextForAppropriateSituAssessment_wrt_designated_state() for all the worlds at once:
+    the observed values of the worlds are gathered in a matrix (one row per world, one column per path)
+    compared with the row of the designated state. Values which aren't immutable (see CM.IMMUTABLE_TYPES) are
+    encoded first, equal values having the same code. Returns the boolean array of the worlds to keep.
+    """
+    matrix = np.empty((len(worlds), len(paths)), dtype=object)
+    designated_row = np.empty(len(paths), dtype=object)
+    for j, path in enumerate(paths):
+        column = [CM.get_observed_value(w.state, path) for w in worlds]
+        value = CM.get_observed_value(designated_state, path)
+        if not all(type(v) in CM.IMMUTABLE_TYPES for v in column) or not type(value) in CM.IMMUTABLE_TYPES:
+            codes = {}
+            column = [codes.setdefault(CM.get_data_fingerprint(v), len(codes)) for v in column]
+            value = codes.setdefault(CM.get_data_fingerprint(value), len(codes))
+        matrix[:, j] = column
+        designated_row[j] = value
+    return (matrix == designated_row).all(axis=1)
 
 # we can be lazy on the evaluation of situation assessment 
 # to update truth values w.r.t. visible from the environment (in the current state), 
@@ -1259,68 +2686,134 @@ def utilizeContextForAppropriateSituAssessment_wrt_designated_state(state, w_the
 def situationAssessmentPostActionExecution(processed_pairs_to_explore):
     # processed_pairs_to_explore = deepcopy(pairs_to_explore)
     designated_state = processed_pairs_to_explore.end_agents.state
-
-    possible_world_state_to_keep = []
-    for world in processed_pairs_to_explore.possible_worlds_for_h:
-        res = utilizeContextForAppropriateSituAssessment_wrt_designated_state(designated_state, world.state)        
-        if(res != None):
-            possible_world_state_to_keep.append(world)
+    worlds = processed_pairs_to_explore.possible_worlds_for_h
+
+    # the observed paths of the designated state are computed once for all the worlds
+    paths = get_observable_entries(designated_state)
+    if paths == None:
+        possible_world_state_to_keep = list(worlds)
+    elif len(worlds) >= SA_VECTORIZED_MIN_WORLDS:
+        worlds = list(worlds)
+        mask = get_observed_worlds_mask(designated_state, worlds, paths)
+        possible_world_state_to_keep = [w for w, keep in zip(worlds, mask) if keep]
+    else:
+        projection = get_observed_projection(designated_state, paths)
+        possible_world_state_to_keep = []
+        for world in worlds:
+            res = utilizeContextForAppropriateSituAssessment_wrt_designated_state(designated_state, world.state, paths, projection)
+            if(res != None):
+                possible_world_state_to_keep.append(world)
     processed_pairs_to_explore.possible_worlds_for_h = possible_world_state_to_keep
     return processed_pairs_to_explore
 
-# in future: have this comparison appropriately
+def get_logical_world_fingerprint(world: CM.Agents, are_HR_in_the_same_context, designated_world: CM.Agents=None, fluents=None):
+    """
+    Hashable key of a possible world, two worlds have the same key iff they aren't logically different:
+    same dynamic fluents, same agenda of R and, when H and R are in the same context, same agenda of H
+    With a designated world, the state is keyed by its delta w.r.t. the designated state (see CM.get_state_delta()),
+    which only compares the entries the world doesn't share with it. The designated world then has an empty delta.
+    fluents: if given (with a designated world), only these fluents are compared, see get_worlds_relevant_fluents()
+    """
+    h_agenda = CM.get_agenda_fingerprint(world["H"].agenda) if are_HR_in_the_same_context else None
+    if designated_world == None:
+        state_key = CM.get_compared_state_fingerprint(world.state)
+    else:
+        state_key = CM.get_state_delta(world.state, designated_world.state, fluents)
+    return (state_key, CM.get_agenda_fingerprint(world["R"].agenda), h_agenda)
+
+def get_planner_names():
+    """Names used in the code of the planner (CommonModule and this module), computed once"""
+    global g_planner_names
+    if g_planner_names == None:
+        g_planner_names = CM.get_module_names(CM) | CM.get_module_names(sys.modules[__name__])
+    return g_planner_names
+
+def get_worlds_relevant_fluents(pair: ActionPair):
+    """
+    Dynamic fluents on which the possible worlds of the pair must be compared, None for all of them.
+    The worlds can only be told apart by the refinement of the tasks remaining in their agendas or in the designated
+    world (see CM.get_relevant_fluents()) and by the planner itself (situation assessment, signals...), whose code
+    can read any fluent it names and add the tasks it names to the agendas.
+    """
+    task_names = set()
+    for world in [pair.end_agents] + list(pair.possible_worlds_for_h):
+        for agent in world.agents.values():
+            task_names.update(t.name for t in agent.agenda)
+    planner_names = get_planner_names()
+    for agent in CM.get_context().static_agents.agents.values():
+        task_names.update(planner_names.intersection(agent.methods))
+        task_names.update(planner_names.intersection(agent.operators))
+    relevant_fluents = CM.get_relevant_fluents(task_names)
+    if relevant_fluents == None:
+        return None
+    state = pair.end_agents.state
+    relevant_fluents = relevant_fluents.union(rule.fluent for rule in CM.get_context().observability_rules)
+    return relevant_fluents.union(f for f in state.fluents if state.fluents[f].is_dyn and f in planner_names)
+
 def are_worlds_logically_different(are_HR_in_the_same_context, x, obj):
-    # return True
-    res = CM.compare_states(x.state, obj.state)
+    return get_logical_world_fingerprint(x, are_HR_in_the_same_context) != get_logical_world_fingerprint(obj, are_HR_in_the_same_context)
+ 
+def exploration_step_tt(pairs_to_explore: Frontier, allowed_to_signal, goal_test):
+    selected_pair = select_pair_to_explore(pairs_to_explore)
+    pairs_to_explore.extend( expand_pair_tt(selected_pair, allowed_to_signal, goal_test) )
+    return pairs_to_explore
 
-    # compare their agendas
-    new_agenda_r_x = x["R"].agenda
-    new_agenda_r_obj = obj["R"].agenda
+def expand_pair_tt(selected_pair_before_sa: ActionPair, allowed_to_signal, goal_test, transposition_table=None, lazy_or=False) -> List[ActionPair]:
+    """
+    Expands the given pair (situation assessment, refinement of the acting agent, new step)
+    Returns the new pairs that still have to be explored
+    If a transposition table is given and the situation has already been expanded, the pair is only
+    linked to the expanded one (pair.transposition_of) and nothing is returned
+    With lazy_or, the children of an OR pair are generated only until one has to be explored (see pull_robot_children())
+    A pair reaching a situation already reached in its branch isn't expanded but set pass (see is_cycle())
+    """
+    selected_pair, acting_agent = assess_pair_tt(selected_pair_before_sa)
 
-    # if are_HR_in_the_same_context != True:
-    #     print ("")
+    if is_cycle(selected_pair, acting_agent):
+        selected_pair.node_pass = "pass"
+        return []
 
-    if(len(new_agenda_r_x) != len(new_agenda_r_obj)):
-        return True
-    else:
-        for i in range(len(new_agenda_r_x)):
-            if new_agenda_r_x[i].is_abstract != new_agenda_r_obj[i].is_abstract:
-                return True
-            elif new_agenda_r_x[i].name != new_agenda_r_obj[i].name:
-                return True
-            elif len(new_agenda_r_x[i].parameters) != len(new_agenda_r_obj[i].parameters):
-                return True
-            else:
-                for j in range(len(new_agenda_r_x[i].parameters)):
-                    if new_agenda_r_x[i].parameters[j] != new_agenda_r_obj[i].parameters[j]:
-                        return True
-
-    # are_HR_in_the_same_context = False                        
-    # compare their agendas    
-    if are_HR_in_the_same_context:    
-        new_agenda_r_x = x["H"].agenda
-        new_agenda_r_obj = obj["H"].agenda
-        if(len(new_agenda_r_x) != len(new_agenda_r_obj)):
-            return True
+    if transposition_table != None and get_transposition(transposition_table, selected_pair, acting_agent) != None:
+        return []
+
+    pairs = compute_pairs_tt(selected_pair, acting_agent, allowed_to_signal, lazy_or and selected_pair.node_type == "OR")
+    new_explo_pairs = attach_pairs_tt(selected_pair, pairs, acting_agent, goal_test, transposition_table != None)
+    if selected_pair.robot_children != None:
+        new_explo_pairs = pull_robot_children(selected_pair, goal_test)
+    return new_explo_pairs
+
+def pull_robot_children(selected_pair: ActionPair, goal_test=[False, ""]) -> List[ActionPair]:
+    """
+    Generates and attaches the next children of a lazily expanded OR pair until one has to be explored
+    Returns it in a list, or [] once the OR pair has no more children
+    """
+    new_step = check_list(selected_pair.get_in_step().children, lambda s: s.from_pair == selected_pair)
+    p = selected_pair.robot_children.next()
+    while p != None:
+        new_step.add_pairs([p])
+        selected_pair.nb_unsolved_children += 1
+        # same tests as in attach_pairs_tt
+        if p.is_final():
+            if goal_test[0]:
+                goal_test[1] = "goal"
+        elif p.is_passive() and p.previous.is_passive() and not p.previous.is_begin():
+            p.node_pass = "pass"
+            selected_pair.nb_unsolved_children -= 1
+            if goal_test[0]:
+                goal_test[1] = "pass"
         else:
-            for i in range(len(new_agenda_r_x)):
-                if new_agenda_r_x[i].is_abstract != new_agenda_r_obj[i].is_abstract:
-                    return True
-                elif new_agenda_r_x[i].name != new_agenda_r_obj[i].name:
-                    return True
-                elif len(new_agenda_r_x[i].parameters) != len(new_agenda_r_obj[i].parameters):
-                    return True
-                else:
-                    for j in range(len(new_agenda_r_x[i].parameters)):
-                        if new_agenda_r_x[i].parameters[j] != new_agenda_r_obj[i].parameters[j]:
-                            return True
-    
-    return not res
- 
-def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
-    global g_current_agent
+            return [p]
+        p = selected_pair.robot_children.next()
+    selected_pair.robot_children = None
+    return []
 
-    selected_pair_before_sa = select_pair_to_explore(pairs_to_explore)
+def assess_pair_tt(selected_pair_before_sa: ActionPair, intern=True):
+    """
+    Situation assessment of the pair and filtering of the possible worlds for H
+    The kept worlds are interned in the WorldPool of the exploration, unless intern is False (then they are copied)
+    Returns the assessed pair and the acting agent
+    """
+    global g_current_agent
 
     # if selected_pair_before_sa.previous != None and selected_pair_before_sa.previous.node_done == "DONE":
     #     return pairs_to_explore
@@ -1349,7 +2842,7 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
 
     # identify last active agent, determine the current acting agent
     if selected_pair.is_begin():
-        acting_agent = CM.g_starting_agent
+        acting_agent = CM.get_context().starting_agent
     elif selected_pair.human_action.is_wait_turn():
         acting_agent = "H"
     elif selected_pair.robot_action.is_wait_turn():
@@ -1358,13 +2851,12 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
         raise Exception("Problem")    
 
     # '''
-    dup_world_list = deepcopy(selected_pair.possible_worlds_for_h)
-    
     # are_HR_in_the_same_context = True
 
     # checking the H-R context - copy        
-    are_HR_in_the_same_context = ((selected_pair.end_agents.state.agent_in_context["R"] == selected_pair.end_agents.state.agent_in_context["H"]) 
-            and (selected_pair.end_agents.state.agent_at["R"] == selected_pair.end_agents.state.agent_at["H"]))
+    end_state = CM.get_state_view(selected_pair.end_agents.state)
+    are_HR_in_the_same_context = ((end_state.agent_in_context["R"] == end_state.agent_in_context["H"]) 
+            and (end_state.agent_at["R"] == end_state.agent_at["H"]))
         
     # this feature is added to decompose the tree in the post processing
     if are_HR_in_the_same_context:
@@ -1373,44 +2865,57 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
         selected_pair.copresence = False
 
     # for debugging 
-    if(len(dup_world_list) >= 14):
+    if(len(selected_pair.possible_worlds_for_h) >= 14):
         print()
 
-    print("\nsize before: ", len(dup_world_list))
-    # filtered_world_list = list(filter(lambda x: any(are_objects_technically_different(x, obj) for obj in dup_world_list), dup_world_list))
-    unique_worlds_state_agenda = set()
+    print("\nsize before: ", len(selected_pair.possible_worlds_for_h))
 
     # CM.print_state(selected_pair.end_agents.state)
 
-    for virtual_world in dup_world_list:
-        if not are_worlds_logically_different(are_HR_in_the_same_context, virtual_world, selected_pair.end_agents):
-            continue
-        is_unique = True
-        for unique_obj in unique_worlds_state_agenda:
-            if not are_worlds_logically_different(are_HR_in_the_same_context, virtual_world, unique_obj):
-                is_unique = False
-                break
-        if is_unique:
-            unique_worlds_state_agenda.add(virtual_world)
+    # each world is fingerprinted once, a world is kept if no kept world nor the designated one has its fingerprint
+    # worlds which only differ on fluents nothing can read anymore are merged
+    relevant_fluents = get_worlds_relevant_fluents(selected_pair)
+    designated_fingerprint = get_logical_world_fingerprint(selected_pair.end_agents, are_HR_in_the_same_context, selected_pair.end_agents, relevant_fluents)
+    unique_worlds = {}
+    for virtual_world in selected_pair.possible_worlds_for_h:
+        fingerprint = get_logical_world_fingerprint(virtual_world, are_HR_in_the_same_context, selected_pair.end_agents, relevant_fluents)
+        if fingerprint != designated_fingerprint and not fingerprint in unique_worlds:
+            unique_worlds[fingerprint] = virtual_world
+    unique_worlds_state_agenda = list(unique_worlds.values())
 
     print("size after: ", len(unique_worlds_state_agenda))
 
     if(len(unique_worlds_state_agenda) > 14):
         print()
     
-    # set the global variable
-    global max_number_of_worlds_evaluated
-    if len(unique_worlds_state_agenda) > max_number_of_worlds_evaluated:
-        max_number_of_worlds_evaluated = len(unique_worlds_state_agenda)
-
-    selected_pair.possible_worlds_for_h = unique_worlds_state_agenda    
+    # set the maximum of the context
+    context = CM.get_context()
+    if len(unique_worlds_state_agenda) > context.max_number_of_worlds_evaluated:
+        context.max_number_of_worlds_evaluated = len(unique_worlds_state_agenda)
+
+    if intern:
+        selected_pair.possible_worlds_for_h = unique_worlds_state_agenda
+        selected_pair.intern_worlds(get_world_pool())
+    else:
+        # only the kept worlds are copied
+        selected_pair.possible_worlds_for_h = set(deepcopy(unique_worlds_state_agenda))
     # '''
+
+    return selected_pair, acting_agent
+
+def compute_pairs_tt(selected_pair: ActionPair, acting_agent, allowed_to_signal, lazy_or=False) -> List[ActionPair]:
+    """
+    Refinement of the acting agent, returns the new pairs (not yet added in the tree)
+    Only the given pair is used, thus it can be done on a snapshot in a worker process
+    With lazy_or, the robot's pairs are not computed but generated later from selected_pair.robot_children
+    """
+    are_HR_in_the_same_context = selected_pair.copresence
     
     # selected_pair = selected_pair_sa    
        
     if acting_agent == "H":        
         # this should not only change the end_states but also relevant propositions of all possible states
-        selected_pair_loc = deepcopy(selected_pair)
+        selected_pair_loc = selected_pair.snapshot()
         ref = get_applied_refinement("H", selected_pair_loc, selected_pair_loc.end_agents)
         pairs = []
         r_pass = CM.Action.create_passive("R", "WAIT_TURN")
@@ -1420,11 +2925,11 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
         ### To not allow robot to signal, disable allowed_to_signal in the main() 
         if allowed_to_signal:
             for dec in ref.applied_decomps:
-                if dec.PT != None and dec.PT.name == "passive_wait_for_signal":                
+                if dec.PT != None and dec.PT.name == "passive_wait_for_signal":
                     if "box_1" in dec.PT.parameters: 
                         # manual - which box contain cube(s) from the main table
                         which_cube = None
-                        state = selected_pair.end_agents.state
+                        state = CM.get_state_view(selected_pair.end_agents.state)
                         for c in state.cube_belongs_table:
                             if (c in state.box_containing["box_2"]["contains"]):
                                 which_cube = c
@@ -1434,7 +2939,7 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
                     else:
                         # manual - which box contain cube(s) from the main table
                         which_cube = None
-                        state = selected_pair.end_agents.state
+                        state = CM.get_state_view(selected_pair.end_agents.state)
                         for c in state.cube_belongs_table:
                             if (c in state.box_containing["box_1"]["contains"]):
                                 which_cube = c
@@ -1443,10 +2948,12 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
                         # at = CM.AbstractTask("Pick_n_place", [], None, 0, "R")
 
                     dec.end_agents["R"].agenda[:0] = [pt, at]
-                    for possible_world in selected_pair.possible_worlds_for_h:
+                    # the worlds of the pair are frozen (see WorldPool), the signal pair gets its own copies
+                    signal_worlds = deepcopy(selected_pair.possible_worlds_for_h)
+                    for possible_world in signal_worlds:
                         possible_world.agents["R"].agenda[:0] = [pt, at]
                         possible_world.agents["H"].agenda = dec.end_agents["H"].agenda
-                    pairs.append(ActionPair(dec.next_action, r_pass, dec.end_agents, selected_pair.possible_worlds_for_h))
+                    pairs.append(ActionPair(dec.next_action, r_pass, dec.end_agents, signal_worlds))
         ######       
         #############                  
         
@@ -1455,7 +2962,7 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
                 continue    ######## we do not allow PASS in this case ########
             pairs.append(ActionPair(dec.next_action, r_pass, dec.end_agents, selected_pair_loc.possible_worlds_for_h))
 
-        selected_pair_loc = deepcopy(selected_pair)
+        selected_pair_loc = selected_pair.snapshot()
         pass_added = False # to manage pair of actions (H:PASS, R:PASS)
         for p in pairs:
             if p.human_action.is_passive():
@@ -1489,8 +2996,9 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
         # we segregate it by selected_pair.possible_worlds_for_h and selected_pair.end_agents            
 
         # checking the H-R context        
-        are_HR_in_the_same_context = ((selected_pair.end_agents.state.agent_in_context["R"] == selected_pair.end_agents.state.agent_in_context["H"]) 
-            and (selected_pair.end_agents.state.agent_at["R"] == selected_pair.end_agents.state.agent_at["H"]))
+        end_state = CM.get_state_view(selected_pair.end_agents.state)
+        are_HR_in_the_same_context = ((end_state.agent_in_context["R"] == end_state.agent_in_context["H"]) 
+            and (end_state.agent_at["R"] == end_state.agent_at["H"]))
         
         # are_HR_in_the_same_context = ((selected_pair.end_agents.state.agent_in_context[acting_agent]["table_context"] == 
         #         selected_pair.end_agents.state.agent_in_context["H"]["table_context"]) 
@@ -1507,11 +3015,22 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
         # If they are in or same/different context -- the main exploration mechanism would change
         # are_HR_in_the_same_context = True
 
-        if not are_HR_in_the_same_context:
+        if lazy_or:
+            selected_pair.robot_children = RobotChildren(selected_pair, are_HR_in_the_same_context, heuristic_order=True)
+            pairs = []
+        elif not are_HR_in_the_same_context:
             pairs = exploration_when_HR_not_insame_context(selected_pair)          
         else:
             pairs = exploration_when_HR_insame_context(selected_pair)   
 
+    return pairs
+
+def attach_pairs_tt(selected_pair: ActionPair, pairs: List[ActionPair], acting_agent, goal_test, transpositions=False) -> List[ActionPair]:
+    """
+    Adds the new pairs in a new step after the selected pair
+    Returns the new pairs that still have to be explored
+    With transpositions, symmetric sibling pairs are collapsed (see collapse_symmetric_pairs())
+    """
     human_options = arrange_pairs_in_HumanOption(pairs)
     new_step = Step(parent=selected_pair.get_in_step())
     new_step.init(human_options, selected_pair)
@@ -1535,6 +3054,11 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
                     goal_test[1] = "pass"
                 continue            
         new_explo_pairs.append(p)
+    if transpositions:
+        new_explo_pairs = collapse_symmetric_pairs(new_explo_pairs)
+
+    # final pairs are never set DONE, only pass pairs are not waited for
+    selected_pair.nb_unsolved_children = len([p for p in selected_pair.next if p.node_pass != "pass"])
     
     # flag = False
     # if(pairs[0].human_action.parameters[0] == "WAIT_TURN" and pairs[0].robot_action.parameters[0] == "IDLE" and pairs[0].robot_action.parameters[1] == "PASS"):
@@ -1557,12 +3081,11 @@ def exploration_step_tt(pairs_to_explore, allowed_to_signal, goal_test):
     # if flag:
     #     return []    
     
-    return new_explo_pairs + pairs_to_explore       ## DFS - old
-    # return pairs_to_explore + new_explo_pairs       ## BFS - old
+    return new_explo_pairs
 
 ### 1 ###
-def select_pair_to_explore(pairs_to_explore) -> ActionPair:
-    selected_pair = pairs_to_explore.pop(0)
+def select_pair_to_explore(pairs_to_explore: Frontier) -> ActionPair:
+    selected_pair = pairs_to_explore.pop()
     # selected_pair = pairs_to_explore[0]
     # already_explored.append(selected_pair)
     # selected_pair = deepcopy(selected_pair_loc)
@@ -1575,40 +3098,64 @@ def select_pair_to_explore(pairs_to_explore) -> ActionPair:
 ### 2 ###
 def compute_parallel_pairs(selected_pair: ActionPair) -> List[ActionPair]:
     #2# Compute parallel pairs (and L.R.D. pairs)
-    
+    # An action writing nothing read by the refinement of the other agent doesn't change this refinement, which
+    # isn't computed again after the action, both orderings of such pairs being equivalent (see is_independent_of())
+    agents = selected_pair.end_agents
+    possible_worlds = selected_pair.possible_worlds_for_h
+    applied_ref_h, h_reads = get_traced_refinement("H", agents)
+    applied_ref_r, r_reads = get_traced_refinement("R", agents)
+    h_writes = [get_decomposition_writes("H", agents, d) for d in applied_ref_h.applied_decomps]
+    r_writes = [get_decomposition_writes("R", agents, d) for d in applied_ref_r.applied_decomps]
+    r_independent = [is_independent_of(writes, h_reads) for writes in r_writes]
+    # an agent written by R is replaced when merging (see merge_agents()), H must not have changed it
+    r_reads = r_reads.union(entry for writes in r_writes for entry in writes if entry[0] == AGENT_ENTRY)
+
     # Compute H starting pairs
     HS_pairs = []
-    HS_applied_ref_h = get_applied_refinement("H", selected_pair.end_agents)
-    for h_ap_dec in HS_applied_ref_h.applied_decomps:
-        HS_applied_ref_r = get_applied_refinement("R", h_ap_dec.end_agents)
-        for r_ap_dec in HS_applied_ref_r.applied_decomps:
-            pair = ActionPair(h_ap_dec.next_action, r_ap_dec.next_action, r_ap_dec.end_agents)
-            HS_pairs.append(pair)
-    
-    # Compute R starting pairs
-    RS_pairs = []
-    RS_applied_ref_r = get_applied_refinement("R", selected_pair.end_agents)
-    for r_ap_dec in RS_applied_ref_r.applied_decomps:
-        RS_applied_ref_h = get_applied_refinement("H", r_ap_dec.end_agents)
+    HS_pairs_in_RS = set()
+    for h_ap_dec, writes in zip(applied_ref_h.applied_decomps, h_writes):
+        if is_independent_of(writes, r_reads):
+            for r_ap_dec, r_w, independent in zip(applied_ref_r.applied_decomps, r_writes, r_independent):
+                pair = ActionPair(h_ap_dec.next_action, copy_action(r_ap_dec.next_action),
+                                  merge_agents(h_ap_dec.end_agents, r_ap_dec.end_agents, r_w), possible_worlds)
+                pair.end_agents["R"].planned_actions.append(pair.robot_action)
+                HS_pairs.append(pair)
+                if independent:
+                    HS_pairs_in_RS.add(pair)
+        else:
+            HS_applied_ref_r = get_concurrent_refinement("R", h_ap_dec.end_agents)
+            for r_ap_dec in HS_applied_ref_r.applied_decomps:
+                pair = ActionPair(h_ap_dec.next_action, r_ap_dec.next_action, r_ap_dec.end_agents, possible_worlds)
+                HS_pairs.append(pair)
+
+    # Compute R starting pairs, only the actions are needed
+    RS_pairs = [] # (human action, robot action decomposition)
+    for r_ap_dec, independent in zip(applied_ref_r.applied_decomps, r_independent):
+        if independent:
+            RS_applied_ref_h = applied_ref_h
+        else:
+            RS_applied_ref_h = get_concurrent_refinement("H", r_ap_dec.end_agents)
         for h_ap_dec in RS_applied_ref_h.applied_decomps:
-            pair = ActionPair(h_ap_dec.next_action, r_ap_dec.next_action, h_ap_dec.end_agents)
-            RS_pairs.append(pair)
+            RS_pairs.append( (h_ap_dec.next_action, r_ap_dec) )
+    RS_keys = set((get_similarity_key(h), get_similarity_key(r_ap_dec.next_action)) for h, r_ap_dec in RS_pairs)
     
     # Check if both agents are active
     h_active = check_list(HS_pairs, lambda x: not x.human_action.is_passive())!=None
-    r_active = check_list(RS_pairs, lambda x: not x.robot_action.is_passive())!=None
+    r_active = check_list(RS_pairs, lambda x: not x[1].next_action.is_passive())!=None
     agents_active = h_active and r_active
 
     # Create LRD pairs
     lrd_pairs = []
     if agents_active:
         lrd_action = CM.Action.create_passive("H", "PASS")
-        for RS_pair in RS_pairs:
-            already_exist = check_list(lrd_pairs, lambda x: CM.Action.are_similar(x.robot_action, RS_pair.robot_action))!=None
-            if not already_exist:
-                new_agents = get_agents_after_action(deepcopy(selected_pair.end_agents), RS_pair.robot_action) 
+        lrd_robot_keys = set()
+        for _, r_ap_dec in RS_pairs:
+            key = get_similarity_key(r_ap_dec.next_action)
+            if not key in lrd_robot_keys:
+                lrd_robot_keys.add(key)
+                new_agents = get_agents_after_decomposition(agents, r_ap_dec)
                 new_agents["H"].planned_actions.append( lrd_action )
-                new_lrd_pair = ActionPair(lrd_action, RS_pair.robot_action, new_agents)
+                new_lrd_pair = ActionPair(lrd_action, r_ap_dec.next_action, new_agents, possible_worlds)
                 lrd_pairs.append(new_lrd_pair)
 
     # Parallel pairs
@@ -1616,19 +3163,22 @@ def compute_parallel_pairs(selected_pair: ActionPair) -> List[ActionPair]:
     for HS_pair in HS_pairs:
         if not h_active:
             parallel_pairs.append(HS_pair)
-        elif check_list(RS_pairs, lambda x: CM.Action.are_similar(HS_pair.robot_action, x.robot_action)\
-                and CM.Action.are_similar(HS_pair.human_action, x.human_action))!=None:
+        elif HS_pair in HS_pairs_in_RS or\
+                (get_similarity_key(HS_pair.human_action), get_similarity_key(HS_pair.robot_action)) in RS_keys:
             # check shared resource
             if (HS_pair.human_action.shared_resource==None or HS_pair.robot_action.shared_resource==None)\
                 or (HS_pair.human_action.shared_resource != HS_pair.robot_action.shared_resource):
                 parallel_pairs.append(HS_pair)
 
     # check if one human action is missing, added with WAIT pair
-    for HS_pair in HS_pairs:
-        if check_list(parallel_pairs, lambda ppair: CM.Action.are_similar(ppair.human_action, HS_pair.human_action))==None:
+    parallel_human_keys = set(get_similarity_key(ppair.human_action) for ppair in parallel_pairs)
+    for h_ap_dec in applied_ref_h.applied_decomps:
+        key = get_similarity_key(h_ap_dec.next_action)
+        if not key in parallel_human_keys:
+            parallel_human_keys.add(key)
             r_wait_action = CM.Action.create_passive("R", "WAIT")
-            new_agents = get_agents_after_action(deepcopy(selected_pair.end_agents), HS_pair.human_action)
-            new_wait_pair = ActionPair(HS_pair.human_action, r_wait_action, new_agents)
+            new_agents = get_agents_after_decomposition(agents, h_ap_dec)
+            new_wait_pair = ActionPair(h_ap_dec.next_action, r_wait_action, new_agents, possible_worlds)
             parallel_pairs.append(new_wait_pair)
 
     return parallel_pairs + lrd_pairs
@@ -1691,7 +3241,7 @@ def add_robot_leaves(new_step: Step, selected_pair):
     pass
 
 ### 7 ###
-def get_pairs_to_explore(new_step: Step, previous_pairs_to_explore: List[ActionPair]):
+def get_pairs_to_explore(new_step: Step, previous_pairs_to_explore: Frontier):
     new_explo_pairs = []
     
     # add all pairs except double passive
@@ -1699,7 +3249,197 @@ def get_pairs_to_explore(new_step: Step, previous_pairs_to_explore: List[ActionP
         if not pair.is_passive():
             new_explo_pairs.append(pair)
 
-    return new_explo_pairs + previous_pairs_to_explore
+    previous_pairs_to_explore.extend(new_explo_pairs)
+    return previous_pairs_to_explore
+
+
+#############################
+## PARTIAL-ORDER REDUCTION ##
+#############################
+# pseudo fluent of the entries (AGENT_ENTRY, agent name) read and written by the refinements: the agendas of the agents
+AGENT_ENTRY = "#agent"
+
+class TracedDict(CM.CowDict):
+    """ Dict fluent recording the (fluent, key) entries read in it, (fluent, None) if read as a whole. Its copies record in the same set. """
+    def __init__(self, fluent, value, reads):
+        super().__init__(dict.items(value))
+        self.fluent = fluent
+        self.reads = reads
+
+    def __getitem__(self, key):
+        self.reads.add((self.fluent, key))
+        return super().__getitem__(key)
+
+    def peek(self, key):
+        self.reads.add((self.fluent, key))
+        return super().peek(key)
+
+    def get(self, key, default=None):
+        self.reads.add((self.fluent, key))
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.reads.add((self.fluent, key))
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self.reads.add((self.fluent, None))
+        return super().__iter__()
+
+    def __len__(self):
+        self.reads.add((self.fluent, None))
+        return super().__len__()
+
+    def __eq__(self, other):
+        self.reads.add((self.fluent, None))
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def keys(self):
+        self.reads.add((self.fluent, None))
+        return super().keys()
+
+    def values(self):
+        self.reads.add((self.fluent, None))
+        return super().values()
+
+    def items(self):
+        self.reads.add((self.fluent, None))
+        return super().items()
+
+    def popitem(self):
+        self.reads.add((self.fluent, None))
+        return super().popitem()
+
+    def copy(self):
+        self.reads.add((self.fluent, None))
+        return super().copy()
+
+    def __copy__(self):
+        return self.copy()
+
+    def __repr__(self):
+        self.reads.add((self.fluent, None))
+        return super().__repr__()
+
+    def __deepcopy__(self, memo):
+        return TracedDict(self.fluent, self, self.reads)
+
+def get_concurrent_refinement(agent_name, agents):
+    """ Applied refinement in the designated world only, the concurrent explorer doesn't keep possible worlds """
+    return get_applied_refinement(agent_name, ActionPair(None, None, agents, []), agents)
+
+def get_traced_refinement(agent_name, agents):
+    """
+    Applied refinement of the agent, with the entries of the dynamic fluents read while refining
+    (methods, operator conditions and effects, see TracedDict). Dynamic fluents which aren't dicts are always read,
+    and so is the agenda of the agent (AGENT_ENTRY, agent_name).
+    """
+    traced = deepcopy(agents)
+    reads = {(AGENT_ENTRY, agent_name)}
+    state = traced.state
+    for f in state.fluents:
+        if state.fluents[f].is_dyn:
+            value = state.read_fluent(f)
+            if isinstance(value, dict):
+                # shared, the copies made while refining copy it only if they access it
+                state.set_shared_fluent(f, TracedDict(f, value, reads))
+            else:
+                reads.add((f, None))
+    ap_ref = get_concurrent_refinement(agent_name, traced)
+    reads = set(reads)
+    for ap_dec in ap_ref.applied_decomps:
+        state = ap_dec.end_agents.state
+        for f in state.fluents:
+            if isinstance(state.read_fluent(f), TracedDict):
+                setattr(state, f, CM.CowDict(dict.items(state.read_fluent(f))))
+    return ap_ref, reads
+
+def get_state_writes(state, new_state):
+    """ Entries (fluent, key) of the dynamic fluents changed in new_state, (fluent, None) for fluents which aren't dicts """
+    writes = set()
+    missing = object()
+    for f in state.fluents:
+        if state.fluents[f].is_dyn:
+            value = state.read_fluent(f)
+            new_value = new_state.read_fluent(f)
+            if value is new_value:
+                # still shared, see CM.CowDict
+                continue
+            if isinstance(value, dict) and isinstance(new_value, dict):
+                for key in set(dict.keys(value)) | set(dict.keys(new_value)):
+                    if dict.get(value, key, missing) != dict.get(new_value, key, missing):
+                        writes.add((f, key))
+            elif value != new_value:
+                writes.add((f, None))
+    return writes
+
+def get_decomposition_writes(agent_name, agents: CM.Agents, ap_dec: CM.AppliedDecomposition):
+    """
+    Entries written by the decomposition of the agent: the ones of the state (see get_state_writes()),
+    and (AGENT_ENTRY, name) for the agent itself and for each other agent whose agenda it changed
+    """
+    writes = get_state_writes(agents.state, ap_dec.end_agents.state)
+    for name in agents.agents:
+        agenda = agents[name].agenda
+        new_agenda = ap_dec.end_agents[name].agenda
+        if name == agent_name or len(agenda) != len(new_agenda) or any(t is not new_t for t, new_t in zip(agenda, new_agenda)):
+            writes.add((AGENT_ENTRY, name))
+    return writes
+
+def is_independent_of(writes, reads):
+    """ Whether an action with these writes leaves unchanged the refinement having these reads """
+    read_fluents = {}
+    for f, key in reads:
+        read_fluents.setdefault(f, set()).add(key)
+    for f, key in writes:
+        if f in read_fluents and (key == None or key in read_fluents[f] or None in read_fluents[f]):
+            return False
+    return True
+
+def merge_agents(h_agents: CM.Agents, r_agents: CM.Agents, r_writes):
+    """
+    Agents after the H action then the independent R action, from the agents after each of them:
+    the entries written by R, agents included (see get_decomposition_writes()), are taken from r_agents
+    """
+    new_agents = deepcopy(h_agents)
+    state = new_agents.state
+    r_state = r_agents.state
+    for f, key in r_writes:
+        if f == AGENT_ENTRY:
+            new_agents[key] = deepcopy(r_agents[key])
+            continue
+        r_value = r_state.read_fluent(f)
+        if key == None:
+            setattr(state, f, deepcopy(r_value))
+        elif key in r_value:
+            getattr(state, f)[key] = deepcopy(dict.__getitem__(r_value, key))
+        else:
+            getattr(state, f).pop(key, None)
+    return new_agents
+
+def get_agents_after_decomposition(in_agents: CM.Agents, ap_dec: CM.AppliedDecomposition):
+    """ Same as get_agents_after_action() with the decomposition of the action already applied """
+    if ap_dec.next_action.is_passive():
+        return deepcopy(in_agents)
+    return ap_dec.end_agents
+
+def copy_action(action: CM.Action):
+    """ The same action in another pair, with its own id """
+    new_action = copy(action)
+    new_action.parameters = copy(action.parameters)
+    new_action.assign_next_id()
+    return new_action
+
+def get_similarity_key(action: CM.Action):
+    """ Two actions have the same key iff they are similar, see CM.Action.are_similar() """
+    if action.is_passive():
+        return "PASSIVE"
+    return (action.name, CM.get_data_fingerprint(action.parameters), action.cost, action.agent)
 
 
 #####################################################
@@ -1750,9 +3490,9 @@ def get_applied_refinement_wrt_a_possible_world(agent_name, agents):
         elif CM.DecompType.OK == ap_dec.type:
             # Apply the PT operator's effects to both beliefs
             # Get the PT operator
-            if not CM.g_static_agents[agent_name].has_operator_for(ap_dec.PT):
+            if not CM.get_context().static_agents[agent_name].has_operator_for(ap_dec.PT):
                 raise Exception("Agent {} doesn't have an operator for {}".format(agent_name, ap_dec.PT))
-            op = CM.g_static_agents[agent_name].operators[ap_dec.PT.name]
+            op = CM.get_context().static_agents[agent_name].operators[ap_dec.PT.name]
 
             # Shashank: apply operator to both beliefs
             result = op.apply(ap_dec.end_agents, ap_dec.PT)
@@ -1822,9 +3562,9 @@ def get_applied_refinement(agent_name, selected_pair, agents):
         elif CM.DecompType.OK == ap_dec.type:
             # Apply the PT operator's effects to both beliefs
             # Get the PT operator
-            if not CM.g_static_agents[agent_name].has_operator_for(ap_dec.PT):
+            if not CM.get_context().static_agents[agent_name].has_operator_for(ap_dec.PT):
                 raise Exception("Agent {} doesn't have an operator for {}".format(agent_name, ap_dec.PT))
-            op = CM.g_static_agents[agent_name].operators[ap_dec.PT.name]
+            op = CM.get_context().static_agents[agent_name].operators[ap_dec.PT.name]
 
             # Shashank: apply operator to both beliefs
             # verify this selected_pair.possible_worlds_for_h
@@ -1887,7 +3627,7 @@ def refine_agenda(agent_name, selected_pair, in_agents):
     Return a refinement, including decompositions for each applied different method.
     """
 
-    static_agent = CM.g_static_agents[agent_name]
+    static_agent = CM.get_context().static_agents[agent_name]
     state = deepcopy(in_agents.state)
     new_agenda = in_agents[agent_name].agenda[:]
 
@@ -1993,7 +3733,7 @@ def refine_agenda(agent_name, selected_pair, in_agents):
 
 def get_subtask_list(list_decomps, m, i, task_to_refine, selected_pair, state, new_agenda):
     agent_name = task_to_refine.agent
-    static_agent = CM.g_static_agents[agent_name]
+    static_agent = CM.get_context().static_agents[agent_name]
 
     # get methods
     # if not static_agent.has_method_for(task_to_refine):
@@ -2020,7 +3760,7 @@ def get_subtask_list(list_decomps, m, i, task_to_refine, selected_pair, state, n
 
 def refine_method(task_to_refine, selected_pair, state, new_agenda):
     agent_name = task_to_refine.agent
-    static_agent = CM.g_static_agents[agent_name]
+    static_agent = CM.get_context().static_agents[agent_name]
 
     # get methods
     if not static_agent.has_method_for(task_to_refine):
@@ -2066,12 +3806,13 @@ def refine_method(task_to_refine, selected_pair, state, new_agenda):
                 # the real world and) does not hold in that that human cannot distinguish it with the real world
                 
                 # this might not work if agents start from different contexts!
-                for world in selected_pair.possible_worlds_for_h:
-                    if not m.is_applicable(world.state, task_to_refine):
-                        flag_cannot_communicate = False; 
-                        # get all the variables that do not hold in "world" but in "state" -- the designated world 
-                        # communicate them all in a certain order 
-                        break
+                # the precondition is evaluated once in each world, the result is reused below
+                _, applicable_in_worlds = CM.evaluate_conditions(m, [world.state for world in selected_pair.possible_worlds_for_h], 
+                                                                 task_to_refine, with_done=False)
+                if not all(applicable_in_worlds):
+                    flag_cannot_communicate = False
+                    # get all the variables that do not hold in "world" but in "state" -- the designated world 
+                    # communicate them all in a certain order 
                     
                 if not flag_cannot_communicate:
                     # list_decomps = get_subtask_list(list_decomps, m, i, task_to_refine, selected_pair, state, new_agenda)
@@ -2114,11 +3855,8 @@ def refine_method(task_to_refine, selected_pair, state, new_agenda):
             # the following captures those methods that can be applied in the epistemic state: regardless of uncertainty the human carries
             # note that this is common to both human and the robot -- and basically robot knows the true world 
             if flag_cannot_communicate:
-                method_also_applicable_in_all_possible_states = True
-                for possible_world in selected_pair.possible_worlds_for_h:
-                    if not m.is_applicable(possible_world.state, task_to_refine): 
-                        method_also_applicable_in_all_possible_states = False 
-                        break
+                # only checked for H (see above), for whom the worlds are already evaluated
+                method_also_applicable_in_all_possible_states = agent_name != "H" or all(applicable_in_worlds)
                     
                 # dec_tuple = m.get_decomp(state, task_to_refine) # list(list(tuple(task_name: str, *params: Any)))
                 if not method_also_applicable_in_all_possible_states and agent_name == "H":
@@ -2157,7 +3895,7 @@ def check_triggers(agents):
 def get_agents_after_action(in_agents, action):
     if action.is_passive():
         return in_agents
-    ap_ref = get_applied_refinement(action.agent, in_agents)
+    ap_ref = get_concurrent_refinement(action.agent, in_agents)
     dec = check_list(ap_ref.applied_decomps, lambda x: CM.Action.are_similar(x.next_action, action))
     if dec==None:
         raise Exception("Corresponding decomposition not found!")
@@ -2210,6 +3948,55 @@ def compute_metrics(final_leaves: List[Step]):
         # set metrics
         leaf_pair.branch_metrics = current_metrics
 
+def get_partial_metrics(pair: ActionPair):
+    """
+    Metrics of the branch from the root pair up to the given pair (included), computed incrementally and cached.
+    Same metrics as compute_metrics() which, for a final leaf pair, gives the partial metrics of the pair before it.
+    """
+    branch = []
+    while pair.partial_metrics == None:
+        branch.append(pair)
+        if pair.previous == None:
+            break
+        pair = pair.previous
+
+    for p in branch[::-1]:
+        if p.previous == None:
+            p.partial_metrics = {
+                "TimeEndHumanDuty" : 0,
+                "HumanEffort" : 0.0,
+                "TimeTaskCompletion" : 0,
+                "GlobalEffort" : 0.0,
+                "RiskConflict" : 0.0,
+            }
+            continue
+        metrics = dict(p.previous.partial_metrics)
+        metrics["TimeTaskCompletion"] += 1
+        if not p.human_action.is_passive():
+            metrics["TimeEndHumanDuty"] = metrics["TimeTaskCompletion"]
+            metrics["HumanEffort"] += 1
+            metrics["GlobalEffort"] += 1
+        if not p.robot_action.is_passive():
+            metrics["GlobalEffort"] += 1
+
+        is_cra_or_skip = False
+        if p.robot_action.name == "SKIP":
+            is_cra_or_skip = True
+        else:
+            for CRA in p.in_human_option.in_step.CRA:
+                if CM.Action.are_similar(p.robot_action, CRA):
+                    is_cra_or_skip=True
+                    break
+        if not is_cra_or_skip:
+            metrics["RiskConflict"] += 1
+        p.partial_metrics = metrics
+
+    return branch[0].partial_metrics if branch!=[] else pair.partial_metrics
+
+def get_metrics_tuple(metrics, criteria):
+    """ Tuple ordered w.r.t. criteria such that a lower tuple means better metrics (see compare_metrics) """
+    return tuple(-metrics[m] if maxi else metrics[m] for m,maxi in criteria)
+
 def get_str_ranked_branches(ranked_leaves, robot=True):
     lines = []
     i=0
@@ -2233,8 +4020,7 @@ def get_str_ranked_branches(ranked_leaves, robot=True):
     return str
 
 def sorting_branches(final_leaves: List[Step], criteria, is_robot=True):
-    global G_CRITERIA
-    G_CRITERIA = criteria # used in np.sort
+    CM.get_context().criteria = criteria # used in np.sort
 
     # leaves_copy = deepcopy(final_leaves)
     x = np.array( final_leaves )
@@ -2474,7 +4260,7 @@ def check_list(list, cond):
 ## PRINT ##
 ###########
 def show_solution(init_step: Step):
-    lg.info(f"\n### SOLUTION ### [domain:{CM.g_domain_name}]")
+    lg.info(f"\n### SOLUTION ### [domain:{CM.get_context().domain_name}]")
     lg.info(RenderTree(init_step))
     for s in init_step.descendants:
         if not s.is_leaf:
@@ -2495,11 +4281,11 @@ def dumping_solution(init_step: Step, tt_explore = False):
     if tt_explore:
         file_name = file_name[:-2] + "_tt.p" 
 
-    dill.dump( (CM.g_domain_name, init_step) , open(CM.path + file_name, "wb"))
+    dill.dump( (CM.get_context().domain_name, init_step) , open(CM.path + file_name, "wb"))
     lg.info("Solution dumped! - %.2fs" %(time.time()-s_t))
 
     f = open(CM.path + "dom_name.p", "w")
-    f.write(f"domain_name: \"{CM.g_domain_name}\"")
+    f.write(f"domain_name: \"{CM.get_context().domain_name}\"")
     f.close()
 
 ################## DUMPING ##################
@@ -2561,7 +4347,7 @@ def xml_dump(begin_step, tt_explore = False):
     start_time = time.time()
 
     # Could be great to add initial_state and initial_agenda in it, solution would be self sufficient, problem included
-    sol_dic = {'sol':{'domain_name':CM.g_domain_name, 'initial_state':convert_state_to_dict(CM.g_static_agents.state), 'initial_agendas': {}, 'begin_step':{}}}
+    sol_dic = {'sol':{'domain_name':CM.get_context().domain_name, 'initial_state':convert_state_to_dict(CM.get_context().static_agents.state), 'initial_agendas': {}, 'begin_step':{}}}
     update_sol_dic(begin_step, sol_dic['sol']['begin_step'])
 
     f = open(CM.path + 'solution.xml', 'w')
@@ -0,0 +1,114 @@
+"""
+Runs many scenarios (variants of domains) in a process pool and writes their results in one results index.
+
+A scenario is a dict:
+    "domain" : domain module name, e.g. "sa_box_block_1"
+    "name" : name of the run, and of its results folder (default: <domain>-<starting agent>f[-sign]-<number>)
+    "state" : initial-state overrides {fluent: value}, set once initDomain() is done
+    "starting_agent" : "H" or "R" (default: the one of the domain)
+    "allowed_to_signal" : (default False)
+    "options" : other arguments of ConM.explore_ANDOR(), e.g. {"transpositions": true}
+
+Usage: python batch_runner.py <scenarios.json> [n_workers] [results folder]
+The default results folder is CM.path + "results/batch", each run writes in <results folder>/<name>/:
+dom_n_sol_tt.p (same as ConM.dumping_solution()) and log.txt (output of the run).
+<results folder>/index.json gives for each run its scenario, exploration time, number of states and leaves,
+root status, limit that stopped the exploration and solution file, or the error.
+"""
+
+import sys
+import os
+import time
+import json
+import importlib
+import contextlib
+import traceback
+import concurrent.futures
+import dill
+
+import CommonModule as CM
+import ConcurrentModule as ConM
+
+
+def get_run_name(scenario, number):
+    if "name" in scenario:
+        return scenario["name"]
+    name = scenario["domain"]
+    if "starting_agent" in scenario:
+        name += "-" + scenario["starting_agent"].lower() + "f"
+    if scenario.get("allowed_to_signal", False):
+        name += "-sign"
+    return name + "-" + str(number)
+
+def init_scenario(domain, scenario):
+    """ Domain initialization with the overrides of the scenario, to call in the context of the run """
+    domain.initDomain()
+    state = CM.get_context().static_agents.state
+    for f, value in scenario.get("state", {}).items():
+        if not f in state.fluents:
+            raise Exception("Fluent {} isn't in the initial state of {}".format(f, scenario["domain"]))
+        setattr(state, f, value)
+    if "starting_agent" in scenario:
+        CM.set_starting_agent(scenario["starting_agent"])
+
+def run_scenario(scenario, name, results_folder):
+    """ Runs the scenario (in a worker process) and returns its entry of the results index """
+    sys.setrecursionlimit(100000)
+    run_folder = os.path.join(results_folder, name)
+    os.makedirs(run_folder, exist_ok=True)
+    entry = {"name": name, "scenario": scenario}
+    with open(os.path.join(run_folder, "log.txt"), "w") as log, contextlib.redirect_stdout(log):
+        try:
+            domain = importlib.import_module(scenario["domain"])
+            context = CM.ExplorationContext(lambda: init_scenario(domain, scenario))
+            s_t = time.time()
+            sol = ConM.explore_ANDOR(True, scenario.get("allowed_to_signal", False), [False, ""], context=context,
+                                     **scenario.get("options", {}))
+            entry["time"] = time.time() - s_t
+            entry["nb_states"] = sol.get_nb_states()
+            entry["nb_leaves"] = len(sol.get_final_leaves(True))
+            entry["root"] = sol.get_pairs()[0].node_done
+            entry["stopped_by"] = sol.stopped_by
+            solution_file = os.path.join(run_folder, "dom_n_sol_tt.p")
+            with open(solution_file, "wb") as f:
+                dill.dump((context.domain_name, sol), f)
+            entry["solution"] = solution_file
+        except Exception:
+            entry["error"] = traceback.format_exc()
+            print(entry["error"])
+    return entry
+
+def run_batch(scenarios, n_workers=None, results_folder=None):
+    """ Runs the scenarios with n_workers processes (default: number of CPUs), returns the results index """
+    if results_folder == None:
+        results_folder = CM.path + "results/batch"
+    os.makedirs(results_folder, exist_ok=True)
+    names = [get_run_name(scenario, i) for i, scenario in enumerate(scenarios)]
+    if len(set(names)) != len(names):
+        raise Exception("Two scenarios have the same name")
+
+    index = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as e:
+        jobs = {e.submit(run_scenario, scenario, name, results_folder): name for scenario, name in zip(scenarios, names)}
+        for job in concurrent.futures.as_completed(jobs):
+            entry = job.result()
+            index.append(entry)
+            if "error" in entry:
+                print("{}: failed, see {}".format(entry["name"], os.path.join(results_folder, entry["name"], "log.txt")))
+            else:
+                print("{}: {:.2f}s, {} states, {} leaves".format(entry["name"], entry["time"], entry["nb_states"], entry["nb_leaves"]))
+    index.sort(key=lambda entry: names.index(entry["name"]))
+
+    with open(os.path.join(results_folder, "index.json"), "w") as f:
+        json.dump(index, f, indent=4, default=str)
+    return index
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python batch_runner.py <scenarios.json> [n_workers] [results folder]")
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        scenarios = json.load(f)
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    results_folder = sys.argv[3] if len(sys.argv) > 3 else None
+    run_batch(scenarios, n_workers, results_folder)
@@ -0,0 +1,21 @@
+import CommonModule as CM
+
+# observability rules shared by the prepare_dinner domains, see CM.declare_observability_rules()
+
+######################################################
+#################### Observability ###################
+######################################################
+# what H observes of the state when H and R are in the same context
+def is_washed_observable(state):
+    return state.observability_washed_vegetable["washed"]
+
+def is_seasoned_observable(state):
+    return state.observability_seasoned_vegetable["seasoned"]
+
+observability_rules = [
+    CM.ObservabilityRule("cooking_done", ["food_ready"]), # food_ready is originally inferable
+    CM.ObservabilityRule("cut", ["vegetable"]),
+    CM.ObservabilityRule("boiling", ["vegetable"]),
+    CM.ObservabilityRule("washed", ["vegetable"], antecedent=is_washed_observable),
+    CM.ObservabilityRule("seasoned", ["vegetable"], antecedent=is_seasoned_observable),
+]
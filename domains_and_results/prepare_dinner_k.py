@@ -8,6 +8,7 @@ import time
 import CommonModule as CM
 import ConcurrentModule as ConM
 import solution_checker
+from dinner_observability import observability_rules
 
 import cProfile
 import pstats
@@ -24,7 +25,7 @@ def o_change_focus_precond(state, agent, place_i, place_j):
             and state.agent_at[agent] == place_i) 
 def o_change_focus_effects(state, agent, place_i, place_j):
     state.agent_in_context[agent] = place_j
-o_change_focus = CM.Operator("change_focus_towards", pre_cond=o_change_focus_precond, effects=o_change_focus_effects)
+o_change_focus = CM.Operator("change_focus_towards", pre_cond=o_change_focus_precond, effects=o_change_focus_effects, reads=["agent_in_context", "agent_at"])
 
 ## operator - to move to the other table ##
 ## context for the agent to the table is required before moving close to it
@@ -35,7 +36,7 @@ def o_move_precond(state, agent, place_i, place_j):
 def o_move_effects(state, agent, place_i, place_j):
     state.agent_at[agent] = place_j
     state.agent_in_context[agent] = place_j
-o_move = CM.Operator("move", pre_cond=o_move_precond, effects=o_move_effects)
+o_move = CM.Operator("move", pre_cond=o_move_precond, effects=o_move_effects, reads=["agent_in_context", "agent_at"])
 
 
 def o_get_ingredient_precond(state, agent):
@@ -46,7 +47,7 @@ def o_get_ingredient_precond(state, agent):
 def o_get_ingredient_effects(state, agent):
     state.ingredient_at["ingredient"] = agent
 
-o_get_ingredient = CM.Operator("get_ingredient", pre_cond=o_get_ingredient_precond, effects=o_get_ingredient_effects)
+o_get_ingredient = CM.Operator("get_ingredient", pre_cond=o_get_ingredient_precond, effects=o_get_ingredient_effects, reads=["agent_at", "ingredient_at"])
 
 
 def o_put_ingredient_precond(state, agent):
@@ -57,28 +58,28 @@ def o_put_ingredient_precond(state, agent):
 def o_put_ingredient_effects(state, agent):
     state.ingredient_at["ingredient"] = "vegetable"    
 
-o_put_ingredient = CM.Operator("put_ingredient", pre_cond=o_put_ingredient_precond, effects=o_put_ingredient_effects)
+o_put_ingredient = CM.Operator("put_ingredient", pre_cond=o_put_ingredient_precond, effects=o_put_ingredient_effects, reads=["agent_at", "ingredient_at", "boiling"])
 
 
 def o_cut_precond(state, agent):
     return ( not state.cut["vegetable"] ) 
 def o_cut_effects(state, agent):
     state.cut["vegetable"] = True
-o_cut = CM.Operator("cut", pre_cond=o_cut_precond, effects=o_cut_effects)
+o_cut = CM.Operator("cut", pre_cond=o_cut_precond, effects=o_cut_effects, reads=["cut"])
 
 def o_wash_precond(state, agent):
     return ( (not state.washed["vegetable"])
             and state.cut["vegetable"] == True)
 def o_wash_effects(state, agent):
     state.washed["vegetable"] = True
-o_wash = CM.Operator("wash", pre_cond=o_wash_precond, effects=o_wash_effects)
+o_wash = CM.Operator("wash", pre_cond=o_wash_precond, effects=o_wash_effects, reads=["washed", "cut"])
 
 def o_seasoning_precond(state, agent):
     return ( (not state.seasoned["vegetable"])
             and state.washed["vegetable"]) 
 def o_seasoning_effects(state, agent):
     state.seasoned["vegetable"] = True
-o_seasoning = CM.Operator("seasoning", pre_cond=o_seasoning_precond, effects=o_seasoning_effects)
+o_seasoning = CM.Operator("seasoning", pre_cond=o_seasoning_precond, effects=o_seasoning_effects, reads=["seasoned", "washed"])
 
 
 def o_put_on_stove_precond(state, agent):
@@ -86,7 +87,7 @@ def o_put_on_stove_precond(state, agent):
             and not state.boiling["vegetable"] ) 
 def o_put_on_stove_effects(state, agent):
     state.boiling["vegetable"] = True
-o_put_on_stove = CM.Operator("put_on_stove", pre_cond=o_put_on_stove_precond, effects=o_put_on_stove_effects)
+o_put_on_stove = CM.Operator("put_on_stove", pre_cond=o_put_on_stove_precond, effects=o_put_on_stove_effects, reads=["washed", "boiling"])
 
 # auxiliary action
 def o_aux_done_cooking_precond(state, agent):
@@ -94,7 +95,7 @@ def o_aux_done_cooking_precond(state, agent):
             and state.ingredient_at["ingredient"] == "vegetable")
 def o_aux_done_cooking_effects(state, agent):
     state.cooking_done["food_ready"] = True
-o_aux_done_cooking = CM.Operator("aux_done_cooking", pre_cond=o_aux_done_cooking_precond, effects=o_aux_done_cooking_effects)
+o_aux_done_cooking = CM.Operator("aux_done_cooking", pre_cond=o_aux_done_cooking_precond, effects=o_aux_done_cooking_effects, reads=["cooking_done", "seasoned", "ingredient_at"])
 
 ## communicate the inspected status of the cube
 def o_get_effect(state, agent):        
@@ -104,7 +105,7 @@ def o_communicate_precond(state, agent):
     return True
 def o_communicate_effects(state, agent):
     True == True
-o_communicate = CM.Operator("communicate_status_of_seasoned", pre_cond=o_communicate_precond, effects=o_communicate_effects, get_effect=o_get_effect)
+o_communicate = CM.Operator("communicate_status_of_seasoned", pre_cond=o_communicate_precond, effects=o_communicate_effects, get_effect=o_get_effect, reads=["seasoned"])
 
 
 common_ops = [o_cut, o_wash, o_communicate]
@@ -124,7 +125,8 @@ def m_Communicate_decomp(state, agent):
     multi_subtasks = []
     multi_subtasks.append([("communicate_status_of_seasoned", )])    
     return multi_subtasks
-m_Communicate = CM.Method("Communicate", pre_cond=m_Communicate_precond, multi_decomp=m_Communicate_decomp)
+m_Communicate = CM.Method("Communicate", pre_cond=m_Communicate_precond, multi_decomp=m_Communicate_decomp,
+                          reads=[], subtasks=["communicate_status_of_seasoned"])
 
 
 # new main abstract task - Prepare_Dinner
@@ -155,7 +157,9 @@ def m_Prepare_Dinner_multi_decomp_h2(state, agent):
     # elif state.seasoned["vegetable"] and state.ingredient_at["ingredient"] == "vegetable":
     #     multi_subtasks.append([("Done_Cooking", ), ("Prepare_Dinner", )])    
     return multi_subtasks    
-m_Prepare_Dinner_h2 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_h2)
+m_Prepare_Dinner_h2 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_h2,
+                                reads=["cooking_done", "agent_at", "ingredient_at"],
+                                subtasks=["Bring_Ingredient_From_Pantry", "Put_Ingredient", "Done_Cooking", "Prepare_Dinner"])
 
 
 ################
@@ -171,7 +175,9 @@ def m_Bring_Ingredient_From_Pantry_multi_decomp(state, agent):
                                ("change_focus_towards", "pantry", "kitchen"),
                                ("move", "pantry", "kitchen")])
     return multi_subtasks
-m_Bring_Ingredient_From_Pantry_h1 = CM.Method("Bring_Ingredient_From_Pantry", pre_cond=m_Bring_Ingredient_From_Pantry_precond, multi_decomp=m_Bring_Ingredient_From_Pantry_multi_decomp)
+m_Bring_Ingredient_From_Pantry_h1 = CM.Method("Bring_Ingredient_From_Pantry", pre_cond=m_Bring_Ingredient_From_Pantry_precond, multi_decomp=m_Bring_Ingredient_From_Pantry_multi_decomp,
+                                              reads=["cooking_done", "ingredient_at", "agent_at", "agent_in_context"],
+                                              subtasks=["change_focus_towards", "move", "get_ingredient"])
 
 ################
 def m_Put_Ingredient_precond(state, agent):
@@ -183,7 +189,8 @@ def m_Put_Ingredient_multi_decomp(state, agent):
     if state.agent_at[agent] == "kitchen" and state.ingredient_at["ingredient"] == agent:
         multi_subtasks.append([("put_ingredient", ) ])
     return multi_subtasks
-m_Put_Ingredient_h1 = CM.Method("Put_Ingredient", pre_cond=m_Put_Ingredient_precond, multi_decomp=m_Put_Ingredient_multi_decomp)
+m_Put_Ingredient_h1 = CM.Method("Put_Ingredient", pre_cond=m_Put_Ingredient_precond, multi_decomp=m_Put_Ingredient_multi_decomp,
+                                reads=["cooking_done", "agent_at", "ingredient_at"], subtasks=["put_ingredient"])
 
 
 ######################################################
@@ -199,7 +206,8 @@ def m_Prepare_Dinner_multi_decomp_r1(state, agent):
     if state.agent_at[agent] == "kitchen" and (not state.cut["vegetable"] or not state.washed["vegetable"]):
         multi_subtasks.append([("Cut_n_Wash",), ("Prepare_Dinner",)])    
     return multi_subtasks
-m_Prepare_Dinner_r1 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r1, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r1)
+m_Prepare_Dinner_r1 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r1, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r1,
+                                reads=["cooking_done", "agent_at", "cut", "washed"], subtasks=["Cut_n_Wash", "Prepare_Dinner"])
 
 ###
 def m_Prepare_Dinner_precond_r2(state, agent):
@@ -213,7 +221,9 @@ def m_Prepare_Dinner_multi_decomp_r2(state, agent):
     # elif state.agent_at[agent] == "kitchen" and state.washed["vegetable"] and state.seasoned["vegetable"]:
     #     multi_subtasks.append([("put_on_stove", ), ("Prepare_Dinner", )])
     return multi_subtasks
-m_Prepare_Dinner_r2 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r2)
+m_Prepare_Dinner_r2 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r2,
+                                reads=["cooking_done", "agent_at", "washed", "seasoned", "boiling"],
+                                subtasks=["seasoning", "put_on_stove", "Prepare_Dinner"])
 
 def m_Prepare_Dinner_multi_decomp_r3(state, agent):
     multi_subtasks = []    
@@ -223,7 +233,9 @@ def m_Prepare_Dinner_multi_decomp_r3(state, agent):
     #     multi_subtasks.append([("seasoning",), ("Prepare_Dinner",)])
     ##        
     return multi_subtasks
-m_Prepare_Dinner_r3 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r3)
+m_Prepare_Dinner_r3 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r3,
+                                reads=["cooking_done", "agent_at", "washed", "seasoned", "boiling"],
+                                subtasks=["put_on_stove", "seasoning", "Prepare_Dinner"])
 
 def m_Done_Cooking_precond(state, agent):
     # whether the curry is seasoned and pan is on the stove
@@ -236,7 +248,8 @@ def m_Done_Cooking_multi_decomp(state, agent):
     # if not food_is_ready(state):
     multi_subtasks.append([("aux_done_cooking",) ])
     return multi_subtasks
-m_Done_Cooking_h3 = CM.Method("Done_Cooking", pre_cond=m_Done_Cooking_precond, multi_decomp=m_Done_Cooking_multi_decomp)
+m_Done_Cooking_h3 = CM.Method("Done_Cooking", pre_cond=m_Done_Cooking_precond, multi_decomp=m_Done_Cooking_multi_decomp,
+                              reads=["cooking_done", "seasoned", "ingredient_at"], subtasks=["aux_done_cooking"])
 
 
 ############## common abstract task ###########
@@ -254,7 +267,8 @@ def m_Cut_n_Wash_multi_decomp(state, agent):
     elif state.agent_at[agent] == "kitchen" and not state.washed["vegetable"]:
         multi_subtasks.append([("wash", ), ("Cut_n_Wash",)])
     return multi_subtasks
-m_Cut_n_Wash_comm = CM.Method("Cut_n_Wash", pre_cond=m_Cut_n_Wash_precond, done_cond=m_Cut_n_Wash_donecond, multi_decomp=m_Cut_n_Wash_multi_decomp)
+m_Cut_n_Wash_comm = CM.Method("Cut_n_Wash", pre_cond=m_Cut_n_Wash_precond, done_cond=m_Cut_n_Wash_donecond, multi_decomp=m_Cut_n_Wash_multi_decomp,
+                              reads=["cut", "washed", "agent_at"], subtasks=["cut", "wash", "Cut_n_Wash"])
 
 
 # m_Pick_n_place_ll,
@@ -355,6 +369,7 @@ def initDomain():
     })    
 
     CM.set_state(initial_state)
+    CM.declare_observability_rules(observability_rules)
 
     # Robot init #
     CM.declare_operators("R", robot_ops)
@@ -8,6 +8,7 @@ import time
 import CommonModule as CM
 import ConcurrentModule as ConM
 import solution_checker
+from dinner_observability import observability_rules
 
 import cProfile
 import pstats
@@ -355,6 +356,7 @@ def initDomain():
     })    
 
     CM.set_state(initial_state)
+    CM.declare_observability_rules(observability_rules)
 
     # Robot init #
     CM.declare_operators("R", robot_ops)
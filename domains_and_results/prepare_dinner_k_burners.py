@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+import sys
+import os
+from copy import deepcopy
+import time
+
+
+import CommonModule as CM
+import ConcurrentModule as ConM
+import solution_checker
+
+# same task as prepare_dinner_k, with two identical burners: the vegetable can be put on either of them (by the robot
+# or, before going to the pantry, by the human) and the human turns it off once the food is ready
+from prepare_dinner_k import (o_cut, o_wash, o_communicate, o_seasoning, o_change_focus, o_move, o_get_ingredient,
+                              o_put_ingredient, o_aux_done_cooking, m_Communicate, m_Cut_n_Wash_comm, m_Prepare_Dinner_r1,
+                              m_Prepare_Dinner_h2, m_Bring_Ingredient_From_Pantry_h1, m_Put_Ingredient_h1,
+                              m_Prepare_Dinner_donecond, food_is_ready)
+from dinner_observability import observability_rules
+
+# the burners are interchangeable (see CM.declare_symmetric_objects()),
+# only used by ConM.explore_ANDOR() with transpositions=True
+declare_symmetric_burners = True
+
+
+######################################################
+################### Primitive tasks ##################
+######################################################
+
+def o_put_on_stove_precond(state, agent, burner):
+    return ( state.washed["vegetable"]
+            and not state.boiling["vegetable"]
+            and not state.burner_on[burner] )
+def o_put_on_stove_effects(state, agent, burner):
+    state.boiling["vegetable"] = True
+    state.burner_on[burner] = True
+o_put_on_stove = CM.Operator("put_on_stove", pre_cond=o_put_on_stove_precond, effects=o_put_on_stove_effects, reads=["washed", "boiling", "burner_on"])
+
+def o_turn_off_precond(state, agent, burner):
+    return ( agent == "H"
+            and food_is_ready(state)
+            and state.burner_on[burner] )
+def o_turn_off_effects(state, agent, burner):
+    state.burner_on[burner] = False
+o_turn_off = CM.Operator("turn_off", pre_cond=o_turn_off_precond, effects=o_turn_off_effects, reads=["cooking_done", "burner_on"])
+
+
+common_ops = [o_cut, o_wash, o_communicate]
+robot_ops = common_ops + [o_seasoning, o_put_on_stove]
+human_ops = common_ops + [o_put_on_stove, o_change_focus, o_move, o_get_ingredient, o_put_ingredient, o_aux_done_cooking, o_turn_off]
+
+
+######################################################
+################### Abstract Tasks ###################
+######################################################
+
+def m_Prepare_Dinner_precond_r2(state, agent):
+    return (state.agent_at[agent] == "kitchen" and state.washed["vegetable"]
+            and not state.seasoned["vegetable"] and not state.boiling["vegetable"])
+
+def m_Prepare_Dinner_multi_decomp_r2(state, agent):
+    multi_subtasks = []
+    for burner in state.burner_at:
+        if not state.burner_on[burner]:
+            multi_subtasks.append([("seasoning", ), ("put_on_stove", burner), ("Prepare_Dinner", )])
+    return multi_subtasks
+m_Prepare_Dinner_r2 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r2,
+                                reads=["cooking_done", "agent_at", "washed", "seasoned", "boiling", "burner_on"],
+                                subtasks=["seasoning", "put_on_stove", "Prepare_Dinner"])
+
+def m_Prepare_Dinner_multi_decomp_r3(state, agent):
+    multi_subtasks = []
+    for burner in state.burner_at:
+        if not state.burner_on[burner]:
+            multi_subtasks.append([("put_on_stove", burner), ("seasoning",), ("Prepare_Dinner",)])
+    return multi_subtasks
+m_Prepare_Dinner_r3 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r2, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r3,
+                                reads=["cooking_done", "agent_at", "washed", "seasoned", "boiling", "burner_on"],
+                                subtasks=["put_on_stove", "seasoning", "Prepare_Dinner"])
+
+# the human already put the vegetable on a burner
+def m_Prepare_Dinner_precond_r4(state, agent):
+    return (state.agent_at[agent] == "kitchen" and state.washed["vegetable"]
+            and not state.seasoned["vegetable"] and state.boiling["vegetable"])
+
+def m_Prepare_Dinner_multi_decomp_r4(state, agent):
+    return [[("seasoning",), ("Prepare_Dinner",)]]
+m_Prepare_Dinner_r4 = CM.Method("Prepare_Dinner", pre_cond=m_Prepare_Dinner_precond_r4, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Prepare_Dinner_multi_decomp_r4,
+                                reads=["cooking_done", "agent_at", "washed", "seasoned", "boiling"],
+                                subtasks=["seasoning", "Prepare_Dinner"])
+
+def m_Put_On_Stove_precond_h(state, agent):
+    return (state.agent_at[agent] == "kitchen" and state.washed["vegetable"] and not state.boiling["vegetable"]
+            and state.ingredient_at["ingredient"] == "pantry")
+
+def m_Put_On_Stove_multi_decomp_h(state, agent):
+    multi_subtasks = []
+    for burner in state.burner_at:
+        if not state.burner_on[burner]:
+            multi_subtasks.append([("put_on_stove", burner), ("Prepare_Dinner", )])
+    return multi_subtasks
+m_Prepare_Dinner_h1 = CM.Method("Prepare_Dinner", pre_cond=m_Put_On_Stove_precond_h, done_cond=m_Prepare_Dinner_donecond, multi_decomp=m_Put_On_Stove_multi_decomp_h,
+                                reads=["cooking_done", "agent_at", "washed", "boiling", "ingredient_at", "burner_on"],
+                                subtasks=["put_on_stove", "Prepare_Dinner"])
+
+def m_Done_Cooking_precond(state, agent):
+    return ((not food_is_ready(state)) and state.seasoned["vegetable"]
+            and state.ingredient_at["ingredient"] == "vegetable")
+
+def m_Done_Cooking_multi_decomp(state, agent):
+    multi_subtasks = []
+    for burner in state.burner_at:
+        if state.burner_on[burner]:
+            multi_subtasks.append([("aux_done_cooking",), ("turn_off", burner)])
+    return multi_subtasks
+m_Done_Cooking_h3 = CM.Method("Done_Cooking", pre_cond=m_Done_Cooking_precond, multi_decomp=m_Done_Cooking_multi_decomp,
+                              reads=["cooking_done", "seasoned", "ingredient_at", "burner_on"], subtasks=["aux_done_cooking", "turn_off"])
+
+
+common_methods = [m_Cut_n_Wash_comm, m_Communicate]
+robot_methods = common_methods + [m_Prepare_Dinner_r1, m_Prepare_Dinner_r2, m_Prepare_Dinner_r3, m_Prepare_Dinner_r4]
+human_methods = common_methods + [m_Prepare_Dinner_h1, m_Prepare_Dinner_h2, m_Done_Cooking_h3, m_Bring_Ingredient_From_Pantry_h1, m_Put_Ingredient_h1]
+
+
+######################################################
+################## Goal Condition ####################
+######################################################
+def goal_condition(state):
+    if not food_is_ready(state):
+        return False
+    for burner in state.burner_on:
+        if state.burner_on[burner]:
+            return False
+    return True
+
+
+######################################################
+######################## MAIN ########################
+######################################################
+
+def initDomain():
+    # Set domain name
+    domain_name = os.path.basename(__file__)[:-3] # filename minus ".py"
+    CM.set_domain_name(domain_name)
+
+    # Initial state
+    initial_state = CM.State("init")
+
+    # Static properties
+    initial_state.create_static_fluent("self_name", "None")
+    initial_state.create_static_fluent("burner_at", {
+        "burner_1" : "kitchen",
+        "burner_2" : "kitchen"
+    })
+
+    initial_state.create_dyn_fluent("cooking_done", {
+        "food_ready" : False
+    })
+
+    initial_state.create_dyn_fluent("washed", {
+        "vegetable" : False
+    })
+
+    initial_state.create_dyn_fluent("cut", {
+        "vegetable" : False
+    })
+
+    initial_state.create_dyn_fluent("seasoned", {
+        "vegetable" : False
+    })
+
+    initial_state.create_dyn_fluent("boiling", {
+        "vegetable" : False
+    })
+
+    initial_state.create_dyn_fluent("burner_on", {
+        "burner_1" : False,
+        "burner_2" : False
+    })
+
+    initial_state.create_dyn_fluent("ingredient_at", {
+        "ingredient" : "pantry"
+    })
+
+    initial_state.create_dyn_fluent("agent_in_context", {
+        "H" : "kitchen",
+        "R" : "kitchen"
+    })
+
+    initial_state.create_dyn_fluent("agent_at", {
+        "H" : "kitchen",
+        "R" : "kitchen"
+    })
+
+    ## observability -- the variables not appearing here are all visible in the environment ##
+    initial_state.create_static_fluent("observability_washed_vegetable", {
+        "washed" : False
+    })
+
+    initial_state.create_static_fluent("observability_seasoned_vegetable", {
+        "seasoned" : False
+    })
+
+    CM.set_state(initial_state)
+    CM.declare_observability_rules(observability_rules + [CM.ObservabilityRule("burner_on", ["burner_1", "burner_2"])])
+    if declare_symmetric_burners:
+        CM.declare_symmetric_objects([list(initial_state.burner_at)])
+    else:
+        CM.declare_symmetric_objects([])
+
+    # Robot init #
+    CM.declare_operators("R", robot_ops)
+    CM.declare_methods("R", robot_methods)
+    CM.add_tasks("R", [("Prepare_Dinner",)])
+
+    # Human init #
+    CM.declare_operators("H", human_ops)
+    CM.declare_methods("H", human_methods)
+    CM.add_tasks("H", [("Prepare_Dinner",)])
+
+    CM.set_starting_agent("H")
+
+
+def main(tt_explore, allowed_to_signal):
+    goal_test = [False, ""]
+    sys.setrecursionlimit(100000)
+    initDomain()
+
+    s_t = time.time()
+
+    sol = ConM.explore_ANDOR(tt_explore, allowed_to_signal, goal_test, transpositions=True)
+
+    print("time to explore: %.2fs" %(time.time()-s_t))
+    print(f"Number of leaves: {len(sol.get_final_leaves(tt_explore))}")
+    print(f"Nb states = {sol.get_nb_states()}")
+
+    return sol
+
+if __name__ == "__main__":
+
+    tt_explore = True
+    allowed_to_signal = False
+
+    sol = main(tt_explore, allowed_to_signal)
+
+    solution_checker.check_solution(sol, goal_condition)
+
+    ConM.dumping_solution(sol, tt_explore)
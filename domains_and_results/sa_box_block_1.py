@@ -814,6 +814,9 @@ def initDomain():
 
     initial_state.create_dyn_fluent("holding", {"R":None, "H":None})
     CM.set_state(initial_state)
+    # no observability rules (see CM.declare_observability_rules()): H observes nothing, every possible world is kept.
+    # Rules for the cubes and transparent boxes (as in ConM.utilizeContextForAppropriateSituAssessment_wrt_designated_state_old)
+    # can't be checked yet, the exploration of this domain fails before any situation assessment
 
     # Robot init #
     CM.declare_operators("R", robot_ops)
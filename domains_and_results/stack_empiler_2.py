@@ -12,6 +12,10 @@ import solution_checker
 import cProfile
 import pstats
 
+# cubes of the same color are interchangeable (see CM.declare_symmetric_objects()),
+# only used by ConM.explore_ANDOR() with transpositions=True
+declare_symmetric_cubes = False
+
 
 ######################################################
 ################### Rules for SA #####################
@@ -695,6 +699,8 @@ def initDomain():
     # defined above 
     
     complete_color_cubes_info(initial_state)
+    if declare_symmetric_cubes:
+        CM.declare_symmetric_objects(CM.get_object_classes(initial_state.color_cubes, "color"))
     initial_state.create_dyn_fluent("locations", {})
     for l in initial_state.solution:
         # in the beginning there is nothing on those solution locations